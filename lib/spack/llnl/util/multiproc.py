@@ -8,9 +8,10 @@ This implements a parallel map operation but it can accept more values
 than multiprocessing.Pool.apply() can.  For example, apply() will fail
 to pickle functions if they're passed indirectly as parameters.
 """
+import multiprocessing
 from multiprocessing import Process, Pipe, Semaphore, Value
 
-__all__ = ['spawn', 'parmap', 'Barrier']
+__all__ = ['spawn', 'parmap', 'fork_map', 'Barrier']
 
 
 def spawn(f):
@@ -29,6 +30,46 @@ def parmap(f, elements):
     return [p.recv() for (p, c) in pipe]
 
 
+def _fork_context():
+    """Context whose pools fork their workers. Python 2 has no contexts,
+    but always forks on the platforms Spack runs on."""
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context('fork')
+    return multiprocessing
+
+
+#: Function and elements of the fork_map call a pool worker runs for.
+#: Set in the worker when it starts, never in the calling process.
+_fork_map_args = None
+
+
+def _fork_map_init(f, elements):
+    global _fork_map_args
+    _fork_map_args = (f, elements)
+
+
+def _fork_map_call(index):
+    f, elements = _fork_map_args
+    return f(elements[index])
+
+
+def fork_map(f, elements, jobs, chunksize=None):
+    """Map f over elements in a pool of ``jobs`` forked processes.
+
+    f and elements are handed to the workers when they are forked, so
+    neither has to be picklable, and workers see everything the calling
+    process has loaded or computed. Only the results are pickled, to be
+    sent back.
+    """
+    elements = list(elements)
+    pool = _fork_context().Pool(jobs, _fork_map_init, (f, elements))
+    try:
+        return pool.map(_fork_map_call, range(len(elements)), chunksize)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 class Barrier:
     """Simple reusable semaphore barrier.
 
@@ -3,35 +3,57 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import errno
 import os
 import re
+import multiprocessing
+import multiprocessing.pool
 import tarfile
 import shutil
 import tempfile
 import hashlib
+import stat
+import time
+import zlib
 from contextlib import closing
 
 import json
 
 from six.moves.urllib.error import URLError
 
+import llnl.util.multiproc as mp
 import llnl.util.tty as tty
-from llnl.util.filesystem import mkdirp, install_tree
+from llnl.util.filesystem import mkdirp
 
+import spack.caches
 import spack.cmd
+import spack.paths
 import spack.fetch_strategy as fs
+import spack.util.compression as compression
 import spack.util.gpg as gpg_util
 import spack.relocate as relocate
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 from spack.spec import Spec
 from spack.stage import Stage
 from spack.util.gpg import Gpg
-from spack.util.web import spider, read_from_url
+from spack.util.path import canonicalize_path
+from spack.util.web import spider, read_from_url, read_from_url_if_modified
+from spack.util.web import open_url
 from spack.util.executable import ProcessError
 
 
 _build_cache_relative_path = 'build_cache'
 
+#: Version of the format of the index.json file of build caches
+_index_version = 1
+
+#: Version of the format of the manifests of content-addressed packages
+_content_manifest_version = 1
+
+#: Where file contents of content-addressed packages are, in build caches
+_blobs_relative_path = 'blobs'
+
 
 class NoOverwriteException(Exception):
     """
@@ -76,6 +98,13 @@ class NoVerifyException(spack.error.SpackError):
     pass
 
 
+class BuildTarballError(spack.error.SpackError):
+    """
+    Raised when binary packages could not be created.
+    """
+    pass
+
+
 class NoChecksumException(spack.error.SpackError):
     """
     Raised if file fails checksum verification.
@@ -83,6 +112,14 @@ class NoChecksumException(spack.error.SpackError):
     pass
 
 
+class UnsafeArchiveError(spack.error.SpackError):
+    """
+    Raised if a member of a binary package would be written outside of
+    the directory it is extracted to.
+    """
+    pass
+
+
 class NewLayoutException(spack.error.SpackError):
     """
     Raised if directory layout is different from buildcache.
@@ -90,6 +127,13 @@ class NewLayoutException(spack.error.SpackError):
     pass
 
 
+class BlobFetchError(spack.error.SpackError):
+    """
+    Raised if file contents of a package are not found on any mirror.
+    """
+    pass
+
+
 def has_gnupg2():
     try:
         gpg_util.Gpg.gpg()('--version', output=os.devnull)
@@ -130,42 +174,12 @@ def write_buildinfo_file(prefix, workdir, rel=False):
     Create a cache file containing information
     required for the relocation
     """
-    text_to_relocate = []
-    binary_to_relocate = []
-    link_to_relocate = []
-    blacklist = (".spack", "man")
-    # Do this at during tarball creation to save time when tarball unpacked.
-    # Used by make_package_relative to determine binaries to change.
-    for root, dirs, files in os.walk(prefix, topdown=True):
-        dirs[:] = [d for d in dirs if d not in blacklist]
-        for filename in files:
-            path_name = os.path.join(root, filename)
-            m_type, m_subtype = relocate.mime_type(path_name)
-            if os.path.islink(path_name):
-                link = os.readlink(path_name)
-                if os.path.isabs(link):
-                    # Relocate absolute links into the spack tree
-                    if link.startswith(spack.store.layout.root):
-                        rel_path_name = os.path.relpath(path_name, prefix)
-                        link_to_relocate.append(rel_path_name)
-                    else:
-                        msg = 'Absolute link %s to %s ' % (path_name, link)
-                        msg += 'outside of stage %s ' % prefix
-                        msg += 'cannot be relocated.'
-                        tty.warn(msg)
-
-            #  Check if the file contains a string with the installroot.
-            #  This cuts down on the number of files added to the list
-            #  of files potentially needing relocation
-            elif relocate.strings_contains_installroot(
-                    path_name,
-                    spack.store.layout.root):
-                if relocate.needs_binary_relocation(m_type, m_subtype):
-                    rel_path_name = os.path.relpath(path_name, prefix)
-                    binary_to_relocate.append(rel_path_name)
-                elif relocate.needs_text_relocation(m_type, m_subtype):
-                    rel_path_name = os.path.relpath(path_name, prefix)
-                    text_to_relocate.append(rel_path_name)
+    # The files to relocate are classified once and recorded in the prefix,
+    # after that this only walks it to check that nothing changed since.
+    manifest = relocate.relocation_manifest(prefix, spack.store.layout.root)
+    text_to_relocate = manifest['textfiles']
+    binary_to_relocate = manifest['binaries']
+    link_to_relocate = manifest['links']
 
     # Create buildinfo data and write it to disk
     buildinfo = {}
@@ -265,7 +279,55 @@ def _generate_html_index(path_list, output_path):
     f.close()
 
 
+def _generate_json_index(build_cache_dir, file_list, output_path):
+    """Write an index of all the spec.yaml files in a build cache.
+
+    Node dicts are stored once, keyed by their hash, and each spec lists
+    the hashes of its nodes, root first.  Returns the sha256 of the index.
+    """
+    nodes = {}
+    specs = {}
+    for filename in file_list:
+        if not filename.endswith('.spec.yaml'):
+            continue
+        with open(os.path.join(build_cache_dir, filename)) as f:
+            spec_dict = syaml.load(f)
+
+        node_hashes = []
+        for node in spec_dict['spec']:
+            node_hash = node[next(iter(node))].get('hash')
+            if node_hash is None:
+                # Old spec.yaml files may not record node hashes
+                node_hash = hashlib.sha256(
+                    json.dumps(node, sort_keys=True).encode('utf-8')
+                ).hexdigest()
+            nodes[node_hash] = node
+            node_hashes.append(node_hash)
+
+        specs[filename] = {
+            'nodes': node_hashes,
+            'full_hash': spec_dict.get('full_hash'),
+            'binary_cache_checksum': spec_dict.get('binary_cache_checksum'),
+            'buildinfo': spec_dict.get('buildinfo'),
+        }
+
+    index = {'buildcache_index': {
+        'version': _index_version,
+        'nodes': nodes,
+        'specs': specs,
+    }}
+    contents = json.dumps(index, sort_keys=True, separators=(',', ':'))
+    with open(output_path, 'w') as f:
+        f.write(contents)
+    return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+
 def generate_package_index(build_cache_dir):
+    """Create the index.html and index.json files of a build cache.
+
+    Clients read index.json, and its sha256 in index.json.hash, instead of
+    fetching every spec.yaml in the build cache.
+    """
     yaml_list = os.listdir(build_cache_dir)
     path_list = [os.path.join(build_cache_dir, l) for l in yaml_list]
 
@@ -275,12 +337,215 @@ def generate_package_index(build_cache_dir):
     _generate_html_index(path_list, index_html_path_tmp)
     shutil.move(index_html_path_tmp, index_html_path)
 
+    index_json_path = os.path.join(build_cache_dir, 'index.json')
+    index_hash_path = index_json_path + '.hash'
+
+    index_hash = _generate_json_index(
+        build_cache_dir, yaml_list, index_json_path + '.tmp')
+    with open(index_hash_path + '.tmp', 'w') as f:
+        f.write(index_hash)
+
+    # The hash is moved last: a client that sees a hash not matching the
+    # index it read just falls back to reading the spec.yaml files.
+    shutil.move(index_json_path + '.tmp', index_json_path)
+    shutil.move(index_hash_path + '.tmp', index_hash_path)
+
+
+def copy_files_to_relocate(prefix, workdir):
+    """
+    Copy the binaries and links listed in the buildinfo file of workdir
+    from prefix to workdir, so they can be relocated there
+    """
+    buildinfo = read_buildinfo_file(workdir)
+    for filename in buildinfo['relocate_binaries']:
+        mkdirp(os.path.dirname(os.path.join(workdir, filename)))
+        shutil.copy2(os.path.join(prefix, filename),
+                     os.path.join(workdir, filename))
+    for filename in buildinfo.get('relocate_links', []):
+        mkdirp(os.path.dirname(os.path.join(workdir, filename)))
+        # like install_tree, redirect links into prefix to workdir
+        target = os.readlink(os.path.join(prefix, filename))
+        if target.startswith(prefix + os.sep):
+            target = workdir + target[len(prefix):]
+        os.symlink(target, os.path.join(workdir, filename))
+
+
+class _HashingWriter(object):
+    """Write-only file object that computes the sha256 of what it writes."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.fileobj.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+def _prefix_members(prefix, workdir):
+    """
+    Paths of what is in prefix, relative to it, and where to read them
+    from: workdir for the files that are also in workdir, prefix for the
+    others. Directories come before what they contain.
+    """
+    # files (and links) in workdir replace or add to those in prefix
+    replacements = set()
+    for root, dirs, files in os.walk(workdir):
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            if not os.path.isdir(path) or os.path.islink(path):
+                replacements.add(os.path.relpath(path, workdir))
+
+    for root, dirs, files in os.walk(prefix):
+        dirs.sort()
+        rel_root = os.path.relpath(root, prefix)
+        if rel_root == os.curdir:
+            rel_root = ''
+        names = set(dirs + files)
+        # files only in workdir go with the others in their
+        # directory, so that the buildinfo file comes early
+        names.update(os.path.basename(r) for r in replacements
+                     if os.path.dirname(r) == rel_root)
+        for name in sorted(names):
+            rel_path = os.path.join(rel_root, name)
+            path = os.path.join(prefix, rel_path)
+            if rel_path in replacements:
+                replacements.remove(rel_path)
+                path = os.path.join(workdir, rel_path)
+            yield rel_path, path
+    for rel_path in sorted(replacements):
+        yield rel_path, os.path.join(workdir, rel_path)
+
+
+def write_prefix_tarball(tarfile_path, prefix, workdir, jobs=None):
+    """
+    Write a compressed tarball of prefix in one pass, taking the files that
+    are also in workdir from there. Compresses with ``jobs`` threads.
+
+    Return the sha256 checksum of the tarball.
+    """
+    arcroot = os.path.basename(prefix)
+
+    with open(tarfile_path, 'wb') as f:
+        output = _HashingWriter(f)
+        with compression.ParallelGzipWriter(output, jobs=jobs) as gz:
+            with closing(tarfile.open(fileobj=gz, mode='w|')) as tar:
+                tar.add(prefix, arcname=arcroot, recursive=False)
+                for rel_path, path in _prefix_members(prefix, workdir):
+                    tar.add(path, recursive=False,
+                            arcname=os.path.join(arcroot, rel_path))
+
+    return output.hexdigest()
+
+
+def blob_path_name(blob_hash):
+    """
+    Return the path of a blob relative to the build cache directory,
+    according to the convention blobs/<2 first digits of hash>/<hash>
+    """
+    return os.path.join(_blobs_relative_path, blob_hash[:2], blob_hash)
+
+
+def _hash_file(path, block_size=1 << 20):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def write_blob(build_cache_dir, path):
+    """
+    Store the contents of a file in the blobs of a build cache, compressed,
+    unless they are already there. Return the sha256 of the contents.
+    """
+    blob_hash = _hash_file(path)
+    blob_path = os.path.join(build_cache_dir, blob_path_name(blob_hash))
+    if not os.path.exists(blob_path):
+        mkdirp(os.path.dirname(blob_path))
+        tmp_path = '%s.%d.tmp' % (blob_path, os.getpid())
+        # zlib writes gzip headers without a timestamp, so that blobs
+        # don't depend on when they were written (16 + MAX_WBITS writes
+        # the gzip format)
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        with open(path, 'rb') as f:
+            with open(tmp_path, 'wb') as out:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    out.write(compressor.compress(block))
+                out.write(compressor.flush())
+        os.rename(tmp_path, blob_path)
+    return blob_hash
+
+
+def write_content_manifest(manifest_path, build_cache_dir, prefix, workdir,
+                           jobs=None):
+    """
+    Store the files of prefix (or of workdir, for those that are in both)
+    as blobs in a build cache, and write the manifest of the prefix.
+    Blobs are written by ``jobs`` threads (by default, one per core).
+
+    The manifest lists the directories, files and links of the prefix as
+    ``[path, type, mode, value]`` entries, where type is ``d``, ``f`` or
+    ``l``, and value is the sha256 of a file or the target of a link.
+
+    Return the sha256 checksum of the manifest.
+    """
+    entries = []
+    files = []
+    for rel_path, path in _prefix_members(prefix, workdir):
+        mode = os.lstat(path).st_mode
+        if os.path.islink(path):
+            entries.append([rel_path, 'l', 0o777, os.readlink(path)])
+        elif os.path.isdir(path):
+            entries.append([rel_path, 'd', stat.S_IMODE(mode), None])
+        else:
+            entries.append([rel_path, 'f', stat.S_IMODE(mode), None])
+            files.append((entries[-1], path))
+
+    def write(entry_and_path):
+        return write_blob(build_cache_dir, entry_and_path[1])
+
+    jobs = min(jobs or multiprocessing.cpu_count(), len(files))
+    if jobs <= 1:
+        blob_hashes = [write(f) for f in files]
+    else:
+        pool = multiprocessing.pool.ThreadPool(jobs)
+        try:
+            blob_hashes = pool.map(write, files)
+        finally:
+            pool.terminate()
+            pool.join()
+    for (entry, _), blob_hash in zip(files, blob_hashes):
+        entry[3] = blob_hash
+
+    manifest = {'content_manifest': {
+        'version': _content_manifest_version,
+        'entries': entries,
+    }}
+    contents = json.dumps(manifest, sort_keys=True, separators=(',', ':'))
+    mkdirp(os.path.dirname(manifest_path))
+    with open(manifest_path, 'w') as f:
+        f.write(contents)
+    return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
 
 def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
-                  allow_root=False, key=None, regenerate_index=False):
+                  allow_root=False, key=None, regenerate_index=False,
+                  jobs=None, content_addressed=False):
     """
     Build a tarball from given spec and put it into the directory structure
     used at the mirror (following <tarball_directory_name>).
+
+    The tarball is compressed with ``jobs`` threads (by default, one per
+    core).
+
+    If ``content_addressed`` is True, the files of the package are stored
+    as blobs named after their sha256 instead, and the package is the
+    manifest of its files. Blobs shared with other packages are stored
+    only once.
     """
     if not spec.concrete:
         raise ValueError('spec must be concrete to build tarball')
@@ -292,14 +557,16 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     tarfile_dir = os.path.join(build_cache_dir,
                                tarball_directory_name(spec))
     tarfile_path = os.path.join(tarfile_dir, tarfile_name)
-    mkdirp(tarfile_dir)
     spackfile_path = os.path.join(
         build_cache_dir, tarball_path_name(spec, '.spack'))
-    if os.path.exists(spackfile_path):
+    manifest_path = os.path.join(
+        build_cache_dir, tarball_path_name(spec, '.manifest.json'))
+    package_path = manifest_path if content_addressed else spackfile_path
+    if os.path.exists(package_path):
         if force:
-            os.remove(spackfile_path)
+            os.remove(package_path)
         else:
-            raise NoOverwriteException(str(spackfile_path))
+            raise NoOverwriteException(str(package_path))
     # need to copy the spec file so the build cache can be downloaded
     # without concretizing with the current spack packages
     # and preferences
@@ -313,12 +580,15 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
             os.remove(specfile_path)
         else:
             raise NoOverwriteException(str(specfile_path))
-    # make a copy of the install directory to work with
-    workdir = os.path.join(tempfile.mkdtemp(), os.path.basename(spec.prefix))
-    install_tree(spec.prefix, workdir, symlinks=True)
+    # the work directory only gets the files that are changed in the
+    # tarball: the relocation info, and the binaries and links to relocate
+    tmpdir = tempfile.mkdtemp()
+    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
+    mkdirp(os.path.dirname(buildinfo_file_name(workdir)))
 
     # create info for later relocation and create tar
     write_buildinfo_file(spec.prefix, workdir, rel=rel)
+    copy_files_to_relocate(spec.prefix, workdir)
 
     # optinally make the paths in the binaries relative to each other
     # in the spack install tree before creating tarball
@@ -326,25 +596,28 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
         try:
             make_package_relative(workdir, spec.prefix, allow_root)
         except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
+            shutil.rmtree(tmpdir)
             tty.die(str(e))
     else:
         try:
             make_package_placeholder(workdir, spec.prefix, allow_root)
         except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
+            shutil.rmtree(tmpdir)
             tty.die(str(e))
-    # create compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
-    # remove copy of install directory
-    shutil.rmtree(workdir)
 
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
+    # create compressed tarball of the install prefix (or the blobs of its
+    # files and their manifest), and get its sha256 checksum
+    try:
+        if content_addressed:
+            checksum = write_content_manifest(
+                manifest_path, build_cache_dir, spec.prefix, workdir,
+                jobs=jobs)
+        else:
+            mkdirp(tarfile_dir)
+            checksum = write_prefix_tarball(
+                tarfile_path, spec.prefix, workdir, jobs=jobs)
+    finally:
+        shutil.rmtree(tmpdir)
 
     # add sha256 checksum to spec.yaml
     spec_dict = {}
@@ -354,7 +627,10 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     bchecksum = {}
     bchecksum['hash_algorithm'] = 'sha256'
     bchecksum['hash'] = checksum
-    spec_dict['binary_cache_checksum'] = bchecksum
+    if content_addressed:
+        spec_dict['content_manifest_checksum'] = bchecksum
+    else:
+        spec_dict['binary_cache_checksum'] = bchecksum
     # Add original install prefix relative to layout root to spec.yaml.
     # This will be used to determine is the directory layout has changed.
     buildinfo = {}
@@ -373,6 +649,14 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     # sign the tarball and spec file with gpg
     if not unsigned:
         sign_tarball(key, force, specfile_path)
+
+    # the signature of content-addressed packages stays next to the spec
+    # file, as there is no archive to put it in
+    if content_addressed:
+        if regenerate_index:
+            generate_package_index(build_cache_dir)
+        return None
+
     # put tarball, spec and signature files in .spack archive
     with closing(tarfile.open(spackfile_path, 'w')) as tar:
         tar.add(name='%s' % tarfile_path, arcname='%s' % tarfile_name)
@@ -393,6 +677,57 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
     return None
 
 
+def _build_tarball_worker(spec, outdir, kwargs):
+    """Build the tarball of one spec in a forked process.
+
+    Returns None on success, or the error message.
+    """
+    try:
+        build_tarball(spec, outdir, **kwargs)
+    except (Exception, SystemExit) as e:
+        # tty.die() prints the error, then exits
+        return '%s: %s' % (type(e).__name__, e)
+    return None
+
+
+def build_tarballs(specs, outdir, jobs=1, **kwargs):
+    """Build the tarballs of several specs, ``jobs`` of them at a time.
+
+    Other arguments are passed to ``build_tarball``, except that the index
+    is regenerated only once, after all the tarballs are built.
+    """
+    specs = list(specs)
+    regenerate_index = kwargs.pop('regenerate_index', False)
+
+    jobs = min(jobs, len(specs))
+    if jobs <= 1:
+        for spec in specs:
+            tty.msg('creating binary cache file for package %s ' %
+                    spec.format())
+            build_tarball(spec, outdir, **kwargs)
+        if regenerate_index:
+            generate_package_index(build_cache_directory(outdir))
+        return
+
+    # Share the cores between the processes compressing tarballs
+    kwargs.setdefault('jobs', max(1, multiprocessing.cpu_count() // jobs))
+
+    tty.msg('creating binary cache files for %d packages, %d at a time' %
+            (len(specs), jobs))
+    errors = mp.fork_map(
+        lambda spec: _build_tarball_worker(spec, outdir, kwargs), specs, jobs)
+
+    if regenerate_index:
+        generate_package_index(build_cache_directory(outdir))
+
+    failed = ['%s: %s' % (spec.format(), error)
+              for spec, error in zip(specs, errors) if error]
+    if failed:
+        raise BuildTarballError(
+            'Could not create binary cache files for %d packages' %
+            len(failed), '\n'.join(failed))
+
+
 def download_tarball(spec):
     """
     Download binary tarball for given package into stage area
@@ -411,10 +746,116 @@ def download_tarball(spec):
             stage.fetch()
             return stage.save_filename
         except fs.FetchError:
-            continue
+            pass
+
+        manifest = _download_content_manifest(spec, mirror_url)
+        if manifest:
+            return manifest
     return None
 
 
+def _fetch_to_stage(url):
+    """Download a file to the build_cache stage, even if it is already
+    there. Return its path, or None if it could not be downloaded."""
+    stage = Stage(url, name="build_cache", keep=True)
+    if os.path.exists(stage.save_filename):
+        os.remove(stage.save_filename)
+    try:
+        stage.fetch()
+    except fs.FetchError:
+        return None
+    return stage.save_filename
+
+
+def _download_content_manifest(spec, mirror_url):
+    """
+    Download the manifest of a content-addressed package, with its spec
+    file and signature, into the stage area. Return the path of the
+    manifest, or None if the mirror does not have the package.
+    """
+    build_cache_url = mirror_url + '/' + _build_cache_relative_path
+    manifest = _fetch_to_stage(
+        build_cache_url + '/' + tarball_path_name(spec, '.manifest.json'))
+    if not manifest:
+        return None
+    specfile_name = tarball_name(spec, '.spec.yaml')
+    if not _fetch_to_stage(build_cache_url + '/' + specfile_name):
+        return None
+    _fetch_to_stage(build_cache_url + '/' + specfile_name + '.asc')
+    return manifest
+
+
+def local_blobs_directory():
+    """Directory where the blobs of content-addressed packages are kept,
+    uncompressed, once they are downloaded."""
+    path = spack.config.get('config:source_cache')
+    if not path:
+        path = os.path.join(spack.paths.var_path, "cache")
+    return os.path.join(canonicalize_path(path), _blobs_relative_path)
+
+
+def _download_blob(blob_hash, local_path):
+    """Download a blob from the first mirror that has it, uncompress it to
+    local_path and check its sha256."""
+    mirrors = spack.config.get('mirrors')
+    for mirror_name, mirror_url in mirrors.items():
+        url = '/'.join([mirror_url, _build_cache_relative_path,
+                        blob_path_name(blob_hash)])
+        try:
+            response = open_url(url)
+        except (URLError, IOError) as e:
+            tty.debug('Blob %s is not on %s: %s' % (blob_hash, mirror_url, e))
+            continue
+
+        mkdirp(os.path.dirname(local_path))
+        tmp_path = '%s.%d.tmp' % (local_path, os.getpid())
+        hasher = hashlib.sha256()
+        # 16 + MAX_WBITS reads the gzip format
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: response.read(1 << 20), b''):
+                    data = decompressor.decompress(block)
+                    hasher.update(data)
+                    f.write(data)
+                data = decompressor.flush()
+                hasher.update(data)
+                f.write(data)
+            if hasher.hexdigest() != blob_hash:
+                raise NoChecksumException(
+                    "Blob %s on %s failed checksum verification." %
+                    (blob_hash, mirror_url))
+            os.chmod(tmp_path, 0o444)
+            os.rename(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+        return
+
+    raise BlobFetchError('Blob %s was not found on any mirror' % blob_hash)
+
+
+def fetch_blobs(blob_hashes, jobs=None):
+    """Download the blobs that are not available locally yet, ``jobs`` at
+    a time. Return the local path of each blob, by hash."""
+    root = local_blobs_directory()
+    paths = dict((h, os.path.join(root, h[:2], h)) for h in blob_hashes)
+    missing = sorted(h for h, p in paths.items() if not os.path.exists(p))
+    if missing:
+        tty.msg('Downloading %d of %d blobs' % (len(missing), len(paths)))
+        jobs = min(jobs or _fetch_jobs, len(missing))
+        pool = multiprocessing.pool.ThreadPool(jobs)
+        try:
+            pool.map(lambda h: _download_blob(h, paths[h]), missing)
+        finally:
+            pool.terminate()
+            pool.join()
+    return paths
+
+
 def make_package_relative(workdir, prefix, allow_root):
     """
     Change paths in binaries to relative paths. Change absolute symlinks
@@ -453,9 +894,12 @@ def make_package_placeholder(workdir, prefix, allow_root):
     relocate.make_link_placeholder(cur_path_names, workdir, prefix)
 
 
-def relocate_package(workdir, allow_root):
+def relocate_package(workdir, allow_root, textfiles=None):
     """
     Relocate the given package
+
+    Only the text files in ``textfiles`` are relocated, if it is given;
+    the others listed in the buildinfo file are already relocated.
     """
     buildinfo = read_buildinfo_file(workdir)
     new_path = spack.store.layout.root
@@ -466,8 +910,10 @@ def relocate_package(workdir, allow_root):
 
     tty.msg("Relocating package from",
             "%s to %s." % (old_path, new_path))
+    if textfiles is None:
+        textfiles = buildinfo['relocate_textfiles']
     path_names = set()
-    for filename in buildinfo['relocate_textfiles']:
+    for filename in textfiles:
         path_name = os.path.join(workdir, filename)
         # Don't add backup files generated by filter_file during install step.
         if not path_name.endswith('~'):
@@ -488,97 +934,495 @@ def relocate_package(workdir, allow_root):
         relocate.relocate_links(path_names, old_path, new_path)
 
 
-def extract_tarball(spec, filename, allow_root=False, unsigned=False,
-                    force=False):
+class _HashingReader(object):
+    """Read-only file object that computes the sha256 of what is read."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def read(self, size):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+    def hexdigest(self):
+        # hash what is left after the end of the archive, too
+        while self.read(1 << 20):
+            pass
+        return self.hasher.hexdigest()
+
+
+def _install_member(member):
+    """Give an archive member the owner and permissions that install_tree
+    would give it."""
+    member.uid, member.gid = os.getuid(), os.getgid()
+    member.uname = member.gname = ''
+    if member.isdir():
+        member.mode = 0o755
+    elif not member.issym():
+        member.mode = 0o644 | (member.mode & 0o111)
+    return member
+
+
+def _within(name):
+    """Whether a relative path in an archive stays below its root."""
+    if not name or os.path.isabs(name):
+        return False
+    parts = os.path.normpath(name).split(os.sep)
+    return parts[0] != '..'
+
+
+def _check_member(member, path, safe_dirs):
+    """Raise UnsafeArchiveError if extracting member into path could
+    write outside of path.
+
+    Member names and hard link targets must be relative paths below path,
+    and so must relative symbolic links. Absolute symbolic links are kept,
+    as they are relocated later, but nothing is ever written through a
+    link: the parent directory of each member must resolve below path.
+    ``safe_dirs`` caches the parent directories already checked.
     """
-    extract binary tarball for given package into install area
+    name = member.name
+    if not _within(name) or '..' in name.split('/'):
+        raise UnsafeArchiveError('Unsafe path in binary package: %s' % name)
+    if member.islnk() and not _within(member.linkname):
+        raise UnsafeArchiveError(
+            'Unsafe hard link in binary package: %s -> %s' %
+            (name, member.linkname))
+    if member.issym() and not os.path.isabs(member.linkname) and \
+            not _within(os.path.join(os.path.dirname(name),
+                                     member.linkname)):
+        raise UnsafeArchiveError(
+            'Unsafe symbolic link in binary package: %s -> %s' %
+            (name, member.linkname))
+
+    parent = os.path.dirname(name)
+    if parent not in safe_dirs:
+        root = os.path.realpath(path)
+        real_parent = os.path.realpath(os.path.join(path, parent))
+        if real_parent != root and \
+                not real_parent.startswith(root + os.sep):
+            raise UnsafeArchiveError(
+                'Binary package writes through a link: %s' % name)
+        safe_dirs.add(parent)
+    if member.issym():
+        # directories checked so far may now be reached through it
+        safe_dirs.clear()
+
+
+def extract_prefix_tarball(fileobj, path, new_path=None):
     """
-    if os.path.exists(spec.prefix):
-        if force:
-            shutil.rmtree(spec.prefix)
-        else:
-            raise NoOverwriteException(str(spec.prefix))
+    Extract the compressed tarball of a prefix read from fileobj into path,
+    in one pass.
 
-    tmpdir = tempfile.mkdtemp()
-    stagepath = os.path.dirname(filename)
-    spackfile_name = tarball_name(spec, '.spack')
-    spackfile_path = os.path.join(stagepath, spackfile_name)
-    tarfile_name = tarball_name(spec, '.tar.gz')
-    tarfile_path = os.path.join(tmpdir, tarfile_name)
-    specfile_name = tarball_name(spec, '.spec.yaml')
-    specfile_path = os.path.join(tmpdir, specfile_name)
+    Once the buildinfo file of the prefix is extracted, the text files it
+    lists are relocated to ``new_path`` as they are written.
 
-    with closing(tarfile.open(spackfile_path, 'r')) as tar:
-        tar.extractall(tmpdir)
+    Every member is checked before it is written: an archive that would
+    write outside of path raises UnsafeArchiveError.
+
+    Return the buildinfo, and the text files that were not relocated yet
+    because they came before the buildinfo in the tarball.
+    """
+    buildinfo = None
+    relocator = None
+    textfiles = set()
+    relocated = set()
+    safe_dirs = set()
+    with closing(tarfile.open(fileobj=fileobj, mode='r|gz')) as tar:
+        for member in tar:
+            _check_member(member, path, safe_dirs)
+            _install_member(member)
+            # paths in the buildinfo are relative to the prefix
+            rel_path = member.name.split('/', 1)[-1]
+
+            # Don't relocate backup files generated by filter_file during
+            # install step.
+            if (relocator and member.isfile() and not rel_path.endswith('~')
+                    and rel_path in textfiles):
+                target = os.path.join(path, member.name)
+                data = tar.extractfile(member).read()
+                with open(target, 'wb') as f:
+                    f.write(relocator.relocate_data(data))
+                os.chmod(target, member.mode)
+                relocated.add(rel_path)
+                continue
+
+            tar.extract(member, path)
+            if rel_path == '.spack/binary_distribution':
+                with open(os.path.join(path, member.name)) as f:
+                    buildinfo = syaml.load(f)
+                textfiles = set(buildinfo['relocate_textfiles'])
+                if new_path and not buildinfo.get('relative_rpaths', False):
+                    relocator = relocate.TextRelocator(
+                        {buildinfo['buildpath']: new_path})
+
+    if buildinfo is None:
+        return None, None
+    todo = [f for f in buildinfo['relocate_textfiles'] if f not in relocated]
+    return buildinfo, todo
+
+
+def _read_verified_spec_file(spec, specfile_path, unsigned):
+    """
+    Check the signature of the spec file of a binary package, unless
+    unsigned is True, and return its contents
+    """
     if not unsigned:
         if os.path.exists('%s.asc' % specfile_path):
             try:
                 Gpg.verify('%s.asc' % specfile_path, specfile_path)
             except Exception as e:
-                shutil.rmtree(tmpdir)
                 tty.die(str(e))
         else:
-            shutil.rmtree(tmpdir)
             raise NoVerifyException(
                 "Package spec file failed signature verification.\n"
                 "Use spack buildcache keys to download "
                 "and install a key for verification from the mirror.")
-    # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
 
-    # get the sha256 checksum recorded at creation
     spec_dict = {}
     with open(specfile_path, 'r') as inputfile:
         content = inputfile.read()
         spec_dict = syaml.load(content)
-    bchecksum = spec_dict['binary_cache_checksum']
-
-    # if the checksums don't match don't install
-    if bchecksum['hash'] != checksum:
-        shutil.rmtree(tmpdir)
-        raise NoChecksumException(
-            "Package tarball failed checksum verification.\n"
-            "It cannot be installed.")
 
-    new_relative_prefix = str(os.path.relpath(spec.prefix,
-                                              spack.store.layout.root))
+    new_relative_prefix = str(os.path.relpath(
+        spec.prefix, spack.store.layout.root))
     # if the original relative prefix is in the spec file use it
     buildinfo = spec_dict.get('buildinfo', {})
-    old_relative_prefix = buildinfo.get('relative_prefix', new_relative_prefix)
-    # if the original relative prefix and new relative prefix differ the
-    # directory layout has changed and the  buildcache cannot be installed
+    old_relative_prefix = buildinfo.get(
+        'relative_prefix', new_relative_prefix)
+    # if the original relative prefix and new relative prefix differ
+    # the directory layout has changed and the buildcache cannot be
+    # installed
     if old_relative_prefix != new_relative_prefix:
-        shutil.rmtree(tmpdir)
         msg = "Package tarball was created from an install "
         msg += "prefix with a different directory layout.\n"
         msg += "It cannot be relocated."
         raise NewLayoutException(msg)
 
-    # extract the tarball in a temp directory
-    with closing(tarfile.open(tarfile_path, 'r')) as tar:
-        tar.extractall(path=tmpdir)
+    return spec_dict
+
+
+def extract_blobs(manifest, path, new_path=None, hardlink=False, jobs=None):
+    """
+    Create the files listed in the manifest of a content-addressed package
+    in path, from blobs downloaded ``jobs`` at a time if they are not
+    available locally yet.
+
+    The text files listed in the buildinfo file of the package are
+    relocated to ``new_path`` as they are written. With ``hardlink``, the
+    files that are not relocated are hard links to the local blobs, and
+    are read-only; otherwise they are copies.
+
+    Return the buildinfo, and the text files that were not relocated.
+    """
+    entries = manifest['content_manifest']['entries']
+    blobs = fetch_blobs(set(e[3] for e in entries if e[1] == 'f'), jobs)
+
+    buildinfo = None
+    for rel_path, kind, mode, value in entries:
+        if rel_path == '.spack/binary_distribution':
+            with open(blobs[value]) as f:
+                buildinfo = syaml.load(f)
+    if buildinfo is None:
+        return None, None
+
+    relocator = None
+    if new_path and not buildinfo.get('relative_rpaths', False):
+        relocator = relocate.TextRelocator(
+            {buildinfo['buildpath']: new_path})
+    textfiles = set(buildinfo['relocate_textfiles'])
+    # files that are changed in place by relocation can't be links
+    relocated_in_place = textfiles.union(
+        buildinfo['relocate_binaries'], ['.spack/binary_distribution'])
+
+    relocated = set()
+    directories = []
+    mkdirp(path)
+    for rel_path, kind, mode, value in entries:
+        target = os.path.join(path, rel_path)
+        if kind == 'd':
+            mkdirp(target)
+            directories.append((target, mode))
+            continue
+        elif kind == 'l':
+            os.symlink(value, target)
+            continue
+
+        # prefixes without a .spack directory get one for the buildinfo
+        if not os.path.isdir(os.path.dirname(target)):
+            mkdirp(os.path.dirname(target))
+
+        # like install_tree, only keep the executable bits of files
+        mode = 0o644 | (mode & 0o111)
+        # Don't relocate backup files generated by filter_file during
+        # install step.
+        if relocator and rel_path in textfiles and \
+                not rel_path.endswith('~'):
+            with open(blobs[value], 'rb') as f:
+                data = f.read()
+            with open(target, 'wb') as f:
+                f.write(relocator.relocate_data(data))
+            relocated.add(rel_path)
+        elif hardlink and rel_path not in relocated_in_place:
+            try:
+                os.link(_local_blob(blobs[value], mode & 0o111), target)
+                continue
+            except OSError as e:
+                # blobs may be on another filesystem, or links forbidden
+                if e.errno not in (errno.EXDEV, errno.EPERM):
+                    raise
+                shutil.copyfile(blobs[value], target)
+        else:
+            shutil.copyfile(blobs[value], target)
+        os.chmod(target, mode)
+
+    # like tarfile, set the modes of directories once their content is
+    # there, in case they are read-only
+    for target, mode in reversed(directories):
+        os.chmod(target, mode)
+
+    todo = [f for f in buildinfo['relocate_textfiles'] if f not in relocated]
+    return buildinfo, todo
+
+
+def _local_blob(blob_path, executable):
+    """Path of a read-only local blob, that is executable if needed."""
+    if not executable:
+        return blob_path
+    path = blob_path + '.x'
+    if not os.path.exists(path):
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        shutil.copyfile(blob_path, tmp_path)
+        os.chmod(tmp_path, 0o555)
+        os.rename(tmp_path, path)
+    return path
+
+
+def extract_tarball(spec, filename, allow_root=False, unsigned=False,
+                    force=False, hardlink=False):
+    """
+    extract binary tarball for given package into install area
+
+    ``filename`` may also be the manifest of a content-addressed package,
+    whose files are then hard links to local blobs if ``hardlink`` is True.
+    """
+    if os.path.exists(spec.prefix):
+        if force:
+            shutil.rmtree(spec.prefix)
+        else:
+            raise NoOverwriteException(str(spec.prefix))
+
+    # Extract next to the install prefix, so that the package can be moved
+    # into place once verification and relocation are done
+    mkdirp(os.path.dirname(spec.prefix))
+    tmpdir = tempfile.mkdtemp(dir=os.path.dirname(spec.prefix),
+                              prefix='.%s-' % os.path.basename(spec.prefix))
+    stagepath = os.path.dirname(filename)
+    spackfile_name = tarball_name(spec, '.spack')
+    spackfile_path = os.path.join(stagepath, spackfile_name)
+    tarfile_name = tarball_name(spec, '.tar.gz')
+    specfile_name = tarball_name(spec, '.spec.yaml')
+    specfile_path = os.path.join(tmpdir, specfile_name)
     # the base of the install prefix is used when creating the tarball
     # so the pathname should be the same now that the directory layout
     # is confirmed
     workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
 
-    # cleanup
-    os.remove(tarfile_path)
-    os.remove(specfile_path)
-
     try:
-        relocate_package(workdir, allow_root)
-    except Exception as e:
-        shutil.rmtree(workdir)
-        tty.die(str(e))
-    # Delay creating spec.prefix until verification is complete
-    # and any relocation has been done.
-    else:
-        install_tree(workdir, spec.prefix, symlinks=True)
+        if filename.endswith('.manifest.json'):
+            spec_dict = _read_verified_spec_file(
+                spec, os.path.join(stagepath, specfile_name), unsigned)
+            bchecksum = spec_dict['content_manifest_checksum']
+            checksum = checksum_tarball(filename)
+            if bchecksum['hash'] != checksum:
+                raise NoChecksumException(
+                    "Package manifest failed checksum verification.\n"
+                    "It cannot be installed.")
+            with open(filename) as f:
+                manifest = sjson.load(f)
+            buildinfo, textfiles = extract_blobs(
+                manifest, workdir, spack.store.layout.root,
+                hardlink=hardlink)
+
+        else:
+            with closing(tarfile.open(spackfile_path, 'r')) as tar:
+                # only the small spec file and its signature are written out
+                names = tar.getnames()
+                for name in (specfile_name, '%s.asc' % specfile_name):
+                    if name in names:
+                        tar.extract(name, tmpdir)
+
+                # get the sha256 checksum recorded at creation
+                spec_dict = _read_verified_spec_file(
+                    spec, specfile_path, unsigned)
+                bchecksum = spec_dict['binary_cache_checksum']
+
+                # extract the tarball straight out of the .spack file, and
+                # get its sha256 checksum at the same time
+                reader = _HashingReader(tar.extractfile(tarfile_name))
+                buildinfo, textfiles = extract_prefix_tarball(
+                    reader, tmpdir, spack.store.layout.root)
+                checksum = reader.hexdigest()
+
+            # if the checksums don't match don't install
+            if bchecksum['hash'] != checksum:
+                raise NoChecksumException(
+                    "Package tarball failed checksum verification.\n"
+                    "It cannot be installed.")
+
+        try:
+            relocate_package(workdir, allow_root, textfiles=textfiles)
+        except Exception as e:
+            tty.die(str(e))
+
+        # Delay creating spec.prefix until verification is complete
+        # and any relocation has been done.
+        os.rename(workdir, spec.prefix)
     finally:
         shutil.rmtree(tmpdir)
 
 
+def _extract_tarball_worker(spec, filename, kwargs):
+    """Extract the tarball of one spec in a forked process.
+
+    Returns None on success, or the error message.
+    """
+    try:
+        extract_tarball(spec, filename, **kwargs)
+    except (Exception, SystemExit) as e:
+        # tty.die() prints the error, then exits
+        return '%s: %s' % (type(e).__name__, e)
+    return None
+
+
+def extract_tarballs(tarballs, jobs=1, **kwargs):
+    """Extract the tarballs of independent specs, ``jobs`` at a time.
+
+    Arguments:
+        tarballs (list): (spec, tarball path) tuples
+        jobs (int): number of processes extracting tarballs
+
+    Other arguments are passed to ``extract_tarball``.
+
+    Returns:
+        (list): the error message for each tarball, or None if it was
+            installed
+    """
+    tarballs = list(tarballs)
+    jobs = min(jobs, len(tarballs))
+    if jobs <= 1:
+        for spec, filename in tarballs:
+            extract_tarball(spec, filename, **kwargs)
+        return [None] * len(tarballs)
+
+    return mp.fork_map(
+        lambda t: _extract_tarball_worker(t[0], t[1], kwargs), tarballs, jobs)
+
+
+def _index_cache_key(mirror_url):
+    """Key of the local copy of a mirror's index in the misc cache."""
+    return os.path.join(
+        'build_cache',
+        hashlib.sha1(mirror_url.encode('utf-8')).hexdigest() + '.json')
+
+
+def _read_index(mirror_url, cached):
+    """Read the index.json of a mirror and the sha256 it should have.
+
+    Returns None if the index did not change since ``cached`` was read,
+    or a tuple ``(contents, checksum, validators)`` where validators are
+    what to compare to next time to know if the index changed.
+    """
+    if mirror_url.startswith('file://'):
+        path = os.path.join(
+            mirror_url[len('file://'):], _build_cache_relative_path,
+            'index.json')
+        mtime = os.stat(path).st_mtime
+        if cached.get('mtime') == mtime:
+            return None
+        with open(path, 'rb') as f:
+            contents = f.read().decode('utf-8')
+        with open(path + '.hash') as f:
+            checksum = f.read()
+        return contents, checksum, {'mtime': mtime}
+
+    url = '/'.join([mirror_url, _build_cache_relative_path, 'index.json'])
+    result = read_from_url_if_modified(
+        url, cached.get('etag'), cached.get('last_modified'))
+    if result is None:
+        return None
+    contents, etag, last_modified = result
+    checksum = read_from_url(url + '.hash')
+    return contents, checksum, {'etag': etag, 'last_modified': last_modified}
+
+
+def get_index(mirror_url, force=False):
+    """Get the index of the build cache on a mirror.
+
+    A copy of the index is kept in the misc cache, and it is downloaded
+    again only if it changed on the mirror (or if ``force`` is True).
+
+    Returns:
+        (dict): the ``nodes`` and ``specs`` in the index, or None if the
+            mirror has no usable index.
+    """
+    cache = spack.caches.misc_cache
+    key = _index_cache_key(mirror_url)
+
+    cached = {}
+    if not force and cache.init_entry(key):
+        with cache.read_transaction(key) as f:
+            try:
+                cached = sjson.load(f)
+            except ValueError:
+                tty.debug('Ignoring corrupt cached index of %s' % mirror_url)
+
+    try:
+        result = _read_index(mirror_url, cached)
+    except (URLError, IOError, OSError) as e:
+        tty.debug('No build cache index on %s: %s' % (mirror_url, e))
+        return None
+
+    if result is None:
+        tty.debug('Using cached build cache index of %s' % mirror_url)
+        return cached['index']
+
+    contents, checksum, validators = result
+    if hashlib.sha256(contents.encode('utf-8')).hexdigest() != \
+            checksum.strip():
+        tty.warn('Build cache index on %s does not match its checksum'
+                 % mirror_url)
+        return None
+
+    index = sjson.load(contents)['buildcache_index']
+    if index['version'] != _index_version:
+        tty.debug('Unsupported build cache index version on %s: %s'
+                  % (mirror_url, index['version']))
+        return None
+
+    cached = dict(validators, index=index)
+    cache.init_entry(key)
+    with cache.write_transaction(key) as (old, new):
+        json.dump(cached, new, separators=(',', ':'))
+
+    return index
+
+
+def _specs_from_index(index, arch=None):
+    """Concrete specs in an index, optionally only those for ``arch``."""
+    nodes = index['nodes']
+    specs = []
+    for filename, entry in sorted(index['specs'].items()):
+        if arch and not re.search(arch, filename):
+            continue
+        spec = Spec.from_dict({'spec': [nodes[h] for h in entry['nodes']]})
+        spec._mark_concrete()
+        specs.append(spec)
+    return specs
+
+
 #: Internal cache for get_specs
 _cached_specs = None
 
@@ -600,7 +1444,17 @@ def get_specs(force=False):
 
     path = str(spack.architecture.sys_type())
     urls = set()
+    _cached_specs = []
     for mirror_name, mirror_url in mirrors.items():
+        # Mirrors with an index only need one download (or none, if the
+        # index did not change since last time)
+        index = get_index(mirror_url, force)
+        if index is not None:
+            tty.msg("Reading buildcache index of %s" % mirror_url)
+            arch = None if mirror_url.startswith('file') else path
+            _cached_specs.extend(_specs_from_index(index, arch))
+            continue
+
         if mirror_url.startswith('file'):
             mirror = mirror_url.replace('file://', '') + "/" + _build_cache_relative_path
             tty.msg("Finding buildcaches in %s" % mirror)
@@ -617,7 +1471,6 @@ def get_specs(force=False):
                 if re.search("spec.yaml", link) and re.search(path, link):
                     urls.add(link)
 
-    _cached_specs = []
     for link in urls:
         with Stage(link, name="build_cache", keep=True) as stage:
             if force and os.path.exists(stage.save_filename):
@@ -683,30 +1536,31 @@ def get_keys(install=False, trust=False, force=False):
                             'Use -t to install all downloaded keys')
 
 
-def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
-    if not spec.concrete:
-        raise ValueError('spec must be concrete to check against mirror')
+#: Number of spec.yaml files fetched at once when checking for rebuilds
+_fetch_jobs = 16
 
-    pkg_name = spec.name
-    pkg_version = spec.version
+#: Seconds during which a full hash found on a mirror without an index is
+#: not looked up again
+_known_full_hash_ttl = 24 * 60 * 60
 
-    pkg_hash = spec.dag_hash()
-    pkg_full_hash = spec.full_hash()
 
-    tty.debug('Checking {0}-{1}, dag_hash = {2}, full_hash = {3}'.format(
-        pkg_name, pkg_version, pkg_hash, pkg_full_hash))
-    tty.debug(spec.tree())
+def _full_hashes_cache_key(mirror_url):
+    """Key of the full hashes known to be on a mirror in the misc cache."""
+    return os.path.join(
+        'build_cache',
+        hashlib.sha1(mirror_url.encode('utf-8')).hexdigest() +
+        '-full-hashes.json')
 
-    # Try to retrieve the .spec.yaml directly, based on the known
-    # format of the name, in order to determine if the package
-    # needs to be rebuilt.
-    build_cache_dir = build_cache_directory(mirror_url)
-    spec_yaml_file_name = tarball_name(spec, '.spec.yaml')
-    file_path = os.path.join(build_cache_dir, spec_yaml_file_name)
 
-    result_of_error = 'Package ({0}) will {1}be rebuilt'.format(
-        spec.short_spec, '' if rebuild_on_errors else 'not ')
+def _read_remote_full_hash(mirror_url, spec_yaml_file_name):
+    """Read the full_hash in a spec.yaml file on a mirror.
 
+    Returns:
+        (tuple): ``(found, full_hash)``, where found is False if the file
+            could not be read, and full_hash is None if it has none
+    """
+    file_path = os.path.join(
+        build_cache_directory(mirror_url), spec_yaml_file_name)
     try:
         yaml_contents = read_from_url(file_path)
     except URLError as url_err:
@@ -714,39 +1568,137 @@ def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
             'Unable to determine whether {0} needs rebuilding,',
             ' caught URLError attempting to read from {1}.',
         ]
-        tty.error(''.join(err_msg).format(spec.short_spec, file_path))
+        tty.error(''.join(err_msg).format(spec_yaml_file_name, file_path))
         tty.debug(url_err)
-        tty.warn(result_of_error)
-        return rebuild_on_errors
+        return False, None
 
     if not yaml_contents:
         tty.error('Reading {0} returned nothing'.format(file_path))
-        tty.warn(result_of_error)
-        return rebuild_on_errors
-
-    spec_yaml = syaml.load(yaml_contents)
-
-    # If either the full_hash didn't exist in the .spec.yaml file, or it
-    # did, but didn't match the one we computed locally, then we should
-    # just rebuild.  This can be simplified once the dag_hash and the
-    # full_hash become the same thing.
-    if ('full_hash' not in spec_yaml or
-        spec_yaml['full_hash'] != pkg_full_hash):
-        if 'full_hash' in spec_yaml:
-            reason = 'hash mismatch, remote = {0}, local = {1}'.format(
-                spec_yaml['full_hash'], pkg_full_hash)
-        else:
-            reason = 'full_hash was missing from remote spec.yaml'
-        tty.msg('Rebuilding {0}, reason: {1}'.format(
-            spec.short_spec, reason))
-        tty.msg(spec.tree())
-        return True
+        return False, None
 
-    return False
+    return True, syaml.load(yaml_contents).get('full_hash')
+
+
+def needs_rebuilds(specs, mirror_url, rebuild_on_errors=False, jobs=None,
+                   force=False):
+    """Check which of the given specs need to be rebuilt on a mirror.
+
+    The full hashes of the specs are looked up in the index of the mirror,
+    which is only downloaded again when it changed, and in the spec.yaml
+    files of the remaining specs, which are read ``jobs`` at a time.
+
+    Full hashes read from spec.yaml files are kept in the misc cache for
+    ``_known_full_hash_ttl`` seconds. They are trusted only when the mirror
+    has no index: otherwise the index tells which binaries are still there.
+    With ``force``, neither the cached index nor these are used.
+
+    Returns:
+        (list): whether each spec needs to be rebuilt
+    """
+    specs = list(specs)
+    for spec in specs:
+        if not spec.concrete:
+            raise ValueError('spec must be concrete to check against mirror')
+
+    file_names = [tarball_name(s, '.spec.yaml') for s in specs]
+    full_hashes = [s.full_hash() for s in specs]
+
+    cache = spack.caches.misc_cache
+    key = _full_hashes_cache_key(mirror_url)
+    # full hash -> [spec.yaml file name, time it was found on the mirror]
+    known = {}
+    if cache.init_entry(key):
+        with cache.read_transaction(key) as f:
+            try:
+                known = sjson.load(f)
+            except ValueError:
+                tty.debug('Ignoring corrupt cached full hashes of %s'
+                          % mirror_url)
+    now = time.time()
+    fresh = dict(
+        (h, v) for h, v in known.items()
+        if isinstance(v, list) and now - v[1] < _known_full_hash_ttl)
+    changed = len(fresh) != len(known)
+    known = fresh
+
+    # file name -> (found, full_hash) on the mirror
+    remote = {}
+    index = get_index(mirror_url, force)
+    index_specs = index['specs'] if index is not None else {}
+    for file_name, full_hash in zip(file_names, full_hashes):
+        if file_name in index_specs:
+            remote[file_name] = (True, index_specs[file_name]['full_hash'])
+        elif index is None and not force and \
+                known.get(full_hash, [None])[0] == file_name:
+            remote[file_name] = (True, full_hash)
+
+    to_read = sorted(set(file_names) - set(remote))
+    read = set(to_read)
+    if to_read:
+        tty.debug('Reading {0} spec.yaml files on {1}'.format(
+            len(to_read), mirror_url))
+        jobs = min(jobs or _fetch_jobs, len(to_read))
+        pool = multiprocessing.pool.ThreadPool(jobs)
+        try:
+            results = pool.map(
+                lambda f: _read_remote_full_hash(mirror_url, f), to_read)
+        finally:
+            pool.terminate()
+            pool.join()
+        remote.update(zip(to_read, results))
+
+    rebuilds = []
+    for spec, file_name, full_hash in zip(specs, file_names, full_hashes):
+        tty.debug('Checking {0}-{1}, dag_hash = {2}, full_hash = {3}'.format(
+            spec.name, spec.version, spec.dag_hash(), full_hash))
+
+        found, remote_hash = remote[file_name]
+        if not found:
+            tty.warn('Package ({0}) will {1}be rebuilt'.format(
+                spec.short_spec, '' if rebuild_on_errors else 'not '))
+            rebuilds.append(rebuild_on_errors)
+            continue
+
+        # If either the full_hash didn't exist in the .spec.yaml file, or it
+        # did, but didn't match the one we computed locally, then we should
+        # just rebuild.  This can be simplified once the dag_hash and the
+        # full_hash become the same thing.
+        if remote_hash != full_hash:
+            if remote_hash:
+                reason = 'hash mismatch, remote = {0}, local = {1}'.format(
+                    remote_hash, full_hash)
+            else:
+                reason = 'full_hash was missing from remote spec.yaml'
+            tty.msg('Rebuilding {0}, reason: {1}'.format(
+                spec.short_spec, reason))
+            tty.msg(spec.tree())
+            rebuilds.append(True)
+            continue
+
+        if file_name in read:
+            known[full_hash] = [file_name, now]
+            changed = True
+        rebuilds.append(False)
+
+    if changed:
+        cache.init_entry(key)
+        with cache.write_transaction(key) as (old, new):
+            json.dump(known, new, separators=(',', ':'))
+
+    return rebuilds
+
+
+def needs_rebuild(spec, mirror_url, rebuild_on_errors=False):
+    """Whether a spec needs to be rebuilt on a mirror.
+
+    To check many specs, :func:`needs_rebuilds` is much faster.
+    """
+    return needs_rebuilds([spec], mirror_url, rebuild_on_errors)[0]
 
 
 def check_specs_against_mirrors(mirrors, specs, output_file=None,
-                                rebuild_on_errors=False):
+                                rebuild_on_errors=False, jobs=None,
+                                force=False):
     """Check all the given specs against buildcaches on the given mirrors and
     determine if any of the specs need to be rebuilt.  Reasons for needing to
     rebuild include binary cache for spec isn't present on a mirror, or it is
@@ -760,6 +1712,10 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
             JSON object and written to this file.
         rebuild_on_errors (boolean): Treat any errors encountered while
             checking specs as a signal to rebuild package.
+        jobs (int): Number of spec.yaml files to read at once from each
+            mirror
+        force (boolean): Read the index and spec.yaml files of the mirrors
+            again, instead of using what earlier checks found
 
     Returns: 1 if any spec was out-of-date on any mirror, 0 otherwise.
 
@@ -770,8 +1726,10 @@ def check_specs_against_mirrors(mirrors, specs, output_file=None,
 
         rebuild_list = []
 
-        for spec in specs:
-            if needs_rebuild(spec, mirror_url, rebuild_on_errors):
+        rebuild_flags = needs_rebuilds(
+            specs, mirror_url, rebuild_on_errors, jobs=jobs, force=force)
+        for spec, rebuild in zip(specs, rebuild_flags):
+            if rebuild:
                 rebuild_list.append({
                     'short_spec': spec.short_spec,
                     'hash': spec.dag_hash()
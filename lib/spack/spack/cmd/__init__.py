@@ -19,10 +19,12 @@ from llnl.util.filesystem import working_dir
 import spack.config
 import spack.extensions
 import spack.paths
-import spack.spec
-import spack.store
 from spack.error import SpackError
 
+# spack.spec and spack.store are imported in the functions that use them:
+# they are slow to import, and commands like ``spack commands`` only need
+# the functions that find and load commands.
+
 
 # cmd has a submodule called "list" so preserve the python list module
 python_list = list
@@ -130,6 +132,7 @@ def parse_specs(args, **kwargs):
     normalize = kwargs.get('normalize', False)
     tests = kwargs.get('tests', False)
 
+    import spack.spec
     try:
         specs = spack.spec.parse(args)
         for spec in specs:
@@ -178,6 +181,7 @@ def disambiguate_spec(spec, env):
         env (spack.environment.Environment): a spack environment,
             if one is active, or None if no environment is active
     """
+    import spack.store
     hashes = env.all_hashes() if env else None
     matching_specs = spack.store.db.query(spec, hashes=hashes)
     if not matching_specs:
@@ -235,6 +239,8 @@ def display_specs(specs, args=None, **kwargs):
         header_callback (function): called at start of arch/compiler sections
         all_headers (bool): show headers even when arch/compiler aren't defined
     """
+    import spack.spec
+
     def get_arg(name, default=None):
         """Prefer kwargs, then args, then default."""
         if name in kwargs:
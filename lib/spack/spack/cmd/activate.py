@@ -9,6 +9,7 @@ import llnl.util.tty as tty
 
 import spack.cmd
 import spack.environment as ev
+import spack.store
 from spack.filesystem_view import YamlFilesystemView
 
 description = "activate a package extension"
@@ -7,6 +7,7 @@ import llnl.util.tty as tty
 
 import spack.repo
 import spack.spec
+import spack.store
 import spack.cmd.common.arguments as arguments
 
 description = "Bootstrap packages needed for spack to run smoothly"
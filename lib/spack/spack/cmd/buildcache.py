@@ -57,6 +57,14 @@ def setup_parser(subparser):
     create.add_argument('--no-rebuild-index', action='store_true',
                         default=False, help="skip rebuilding index after " +
                                             "building package(s)")
+    create.add_argument('-j', '--jobs', action='store', type=int, default=1,
+                        help="number of packages to create tarballs for " +
+                             "in parallel")
+    create.add_argument('--content-addressed', action='store_true',
+                        default=False,
+                        help="store the files of packages by content, " +
+                             "so that files shared with other packages " +
+                             "are stored and downloaded only once")
     create.add_argument('-y', '--spec-yaml', default=None,
                         help='Create buildcache entry for spec from yaml file')
     create.add_argument(
@@ -75,6 +83,14 @@ def setup_parser(subparser):
     install.add_argument('-u', '--unsigned', action='store_true',
                          help="install unsigned buildcache" +
                               " tarballs for testing")
+    install.add_argument('-j', '--jobs', action='store', type=int, default=1,
+                         help="number of independent packages to install " +
+                              "in parallel")
+    install.add_argument('--hardlink', action='store_true',
+                         help="make the files of content-addressed " +
+                              "packages that need no relocation read-only " +
+                              "hard links to the local copy of their " +
+                              "contents")
     install.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to install buildcache for")
@@ -145,6 +161,16 @@ def setup_parser(subparser):
         help="Default to rebuilding packages if errors are encountered " +
              "during the process of checking whether rebuilding is needed")
 
+    check.add_argument(
+        '-j', '--jobs', action='store', type=int,
+        default=bindist._fetch_jobs,
+        help="number of spec.yaml files to read at once from each mirror")
+
+    check.add_argument(
+        '-f', '--force', action='store_true',
+        help="read the index and spec.yaml files of the mirrors again, " +
+             "instead of using what earlier checks found")
+
     check.set_defaults(func=check_binaries)
 
     # Download tarball and spec.yaml
@@ -278,6 +304,9 @@ def match_downloaded_specs(pkgs, allow_multiple_matches=False, force=False):
 
 def createtarball(args):
     """create a binary package from an existing install"""
+    if args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     if args.spec_yaml:
         packages = set()
         tty.msg('createtarball, reading spec from {0}'.format(args.spec_yaml))
@@ -331,11 +360,11 @@ def createtarball(args):
 
     tty.msg('writing tarballs to %s/build_cache' % outdir)
 
-    for spec in specs:
-        tty.msg('creating binary cache file for package %s ' % spec.format())
-        bindist.build_tarball(spec, outdir, args.force, args.rel,
-                              args.unsigned, args.allow_root, signkey,
-                              not args.no_rebuild_index)
+    bindist.build_tarballs(specs, outdir, jobs=args.jobs, force=args.force,
+                           rel=args.rel, unsigned=args.unsigned,
+                           allow_root=args.allow_root, key=signkey,
+                           regenerate_index=not args.no_rebuild_index,
+                           content_addressed=args.content_addressed)
 
 
 def installtarball(args):
@@ -343,35 +372,73 @@ def installtarball(args):
     if not args.packages:
         tty.die("build cache file installation requires" +
                 " at least one package spec argument")
+    if args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     pkgs = set(args.packages)
     matches = match_downloaded_specs(pkgs, args.multiple, args.force)
 
-    for match in matches:
-        install_tarball(match, args)
+    install_tarballs(matches, args)
 
 
 def install_tarball(spec, args):
-    s = Spec(spec)
-    if s.external or s.virtual:
-        tty.warn("Skipping external or virtual package %s" % spec.format())
-        return
-    for d in s.dependencies(deptype=('link', 'run')):
-        tty.msg("Installing buildcache for dependency spec %s" % d)
-        install_tarball(d, args)
-    package = spack.repo.get(spec)
-    if s.concrete and package.installed and not args.force:
-        tty.warn("Package for spec %s already installed." % spec.format())
-    else:
-        tarball = bindist.download_tarball(spec)
-        if tarball:
-            tty.msg('Installing buildcache for spec %s' % spec.format())
-            bindist.extract_tarball(spec, tarball, args.allow_root,
-                                    args.unsigned, args.force)
-            spack.hooks.post_install(spec)
+    install_tarballs([spec], args)
+
+
+def install_tarballs(specs, args):
+    """Install the binary packages of specs and their dependencies.
+
+    Packages are installed in rounds. Each round installs the packages
+    whose dependencies are installed, ``args.jobs`` at a time.
+    """
+    # round in which each package to install is installed
+    rounds = {}
+    to_install = {}
+    for root in specs:
+        for s in root.traverse(order='post', deptype=('link', 'run')):
+            if s.dag_hash() in rounds:
+                continue
+            deps = s.dependencies(deptype=('link', 'run'))
+            rounds[s.dag_hash()] = max(
+                [rounds[d.dag_hash()] + 1 for d in deps] or [0])
+
+            if s.external or s.virtual:
+                tty.warn("Skipping external or virtual package %s" %
+                         s.format())
+            elif s.concrete and s.package.installed and not args.force:
+                tty.warn("Package for spec %s already installed." %
+                         s.format())
+            else:
+                to_install[s.dag_hash()] = s
+
+    try:
+        for i in range(max(rounds.values() or [-1]) + 1):
+            tarballs = []
+            for dag_hash, spec in sorted(to_install.items()):
+                if rounds[dag_hash] != i:
+                    continue
+                tarball = bindist.download_tarball(spec)
+                if not tarball:
+                    tty.die('Download of binary cache file for spec %s '
+                            'failed.' % spec.format())
+                tty.msg('Installing buildcache for spec %s' % spec.format())
+                tarballs.append((spec, tarball))
+
+            errors = bindist.extract_tarballs(
+                tarballs, jobs=args.jobs, allow_root=args.allow_root,
+                unsigned=args.unsigned, force=args.force,
+                hardlink=args.hardlink)
+
+            for (spec, _), error in zip(tarballs, errors):
+                if error is None:
+                    spack.hooks.post_install(spec)
+            failed = ['%s: %s' % (spec.format(), error)
+                      for (spec, _), error in zip(tarballs, errors) if error]
+            if failed:
+                tty.die('Could not install binary packages:', *failed)
+    finally:
+        if to_install:
             spack.store.store.reindex()
-        else:
-            tty.die('Download of binary cache file for spec %s failed.' %
-                    spec.format())
 
 
 def listspecs(args):
@@ -413,6 +480,9 @@ def check_binaries(args):
     its result, specifically, if the exit code is non-zero, then at least
     one of the indicated specs needs to be rebuilt.
     """
+    if args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     if args.spec or args.spec_yaml:
         specs = [get_concrete_spec(args)]
     else:
@@ -439,7 +509,8 @@ def check_binaries(args):
         sys.exit(0)
 
     sys.exit(bindist.check_specs_against_mirrors(
-        configured_mirrors, specs, args.output_file, args.rebuild_on_error))
+        configured_mirrors, specs, args.output_file, args.rebuild_on_error,
+        jobs=args.jobs, force=args.force))
 
 
 def get_tarball(args):
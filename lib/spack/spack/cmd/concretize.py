@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import llnl.util.tty as tty
+
 import spack.environment as ev
 
 description = 'concretize an environment and write a lockfile'
@@ -14,9 +16,15 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-f', '--force', action='store_true',
         help="Re-concretize even if already concretized.")
+    subparser.add_argument(
+        '-j', '--jobs', action='store', type=int, default=1,
+        help="Number of user specs to concretize in parallel.")
 
 
 def concretize(parser, args):
+    if args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     env = ev.get_env(args, 'concretize', required=True)
-    env.concretize(force=args.force)
+    env.concretize(force=args.force, jobs=args.jobs)
     env.write()
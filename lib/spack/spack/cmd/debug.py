@@ -12,6 +12,7 @@ import llnl.util.tty as tty
 from llnl.util.filesystem import working_dir
 
 import spack.paths
+import spack.store
 from spack.util.executable import which
 
 description = "debugging commands for troubleshooting Spack"
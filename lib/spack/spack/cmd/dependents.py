@@ -39,7 +39,7 @@ def inverted_dependencies():
        actual dependents.
     """
     dag = {}
-    for pkg in spack.repo.path.all_packages():
+    for pkg in spack.repo.path.all_package_metadata():
         dag.setdefault(pkg.name, set())
         for dep in pkg.dependencies:
             deps = [dep]
@@ -9,6 +9,7 @@ import llnl.util.tty as tty
 
 import spack.cmd
 import spack.config
+import spack.fetch_scheduler
 import spack.repo
 import spack.cmd.common.arguments as arguments
 
@@ -25,6 +26,10 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-D', '--dependencies', action='store_true',
         help="also fetch all dependencies")
+    subparser.add_argument(
+        '-j', '--jobs', action='store', type=int, default=None,
+        help="number of packages to fetch at the same time "
+             "(default: the fetch_jobs setting in config.yaml)")
     subparser.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to fetch")
@@ -37,10 +42,14 @@ def fetch(parser, args):
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
+    if args.jobs is not None and args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     specs = spack.cmd.parse_specs(args.packages, concretize=True)
+    packages = []
     for spec in specs:
         if args.missing or args.dependencies:
-            for s in spec.traverse():
+            for s in spec.traverse(order='post', root=False):
                 package = spack.repo.get(s)
 
                 # Skip already-installed packages with --missing
@@ -51,7 +60,14 @@ def fetch(parser, args):
                 if package.spec.external:
                     continue
 
-                package.do_fetch()
+                packages.append(package)
+
+        packages.append(spack.repo.get(spec))
 
-        package = spack.repo.get(spec)
-        package.do_fetch()
+    errors = spack.fetch_scheduler.FetchScheduler(args.jobs).fetch(packages)
+    if len(errors) == 1:
+        raise errors[0][1]
+    elif errors:
+        for package, e in errors:
+            tty.error('Failed to fetch %s' % package.spec.cshort_spec, str(e))
+        tty.die('Failed to fetch %d packages' % len(errors))
@@ -14,10 +14,13 @@ import llnl.util.tty as tty
 import spack.build_environment
 import spack.cmd
 import spack.cmd.common.arguments as arguments
+import spack.config
 import spack.environment as ev
 import spack.fetch_strategy
 import spack.paths
 import spack.report
+import spack.spec
+import spack.store
 from spack.error import SpackError
 
 
@@ -36,6 +39,7 @@ def update_kwargs_from_args(args, kwargs):
         'restage': not args.dont_restage,
         'install_source': args.install_source,
         'make_jobs': args.jobs,
+        'install_jobs': args.install_jobs,
         'verbose': args.verbose,
         'fake': args.fake,
         'dirty': args.dirty,
@@ -62,6 +66,10 @@ alternatively one can decide to install only the package or only
 the dependencies"""
     )
     arguments.add_common_arguments(subparser, ['jobs', 'install_status'])
+    subparser.add_argument(
+        '--install-jobs', action='store', type=int, default=None,
+        help="number of dependencies to install concurrently. "
+             "the -j budget is split among them")
     subparser.add_argument(
         '--overwrite', action='store_true',
         help="reinstall an existing spec, even if it has dependents")
@@ -236,6 +244,10 @@ def install(parser, args, **kwargs):
         if args.jobs <= 0:
             tty.die("The -j option must be a positive integer!")
 
+    if args.install_jobs is not None:
+        if args.install_jobs <= 0:
+            tty.die("The --install-jobs option must be a positive integer!")
+
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
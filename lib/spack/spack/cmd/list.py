@@ -77,7 +77,7 @@ def filter_by_name(pkgs, args):
                 if f.match(p):
                     return True
 
-                pkg = spack.repo.get(p)
+                pkg = spack.repo.path.get_pkg_metadata(p)
                 if pkg.__doc__:
                     return f.match(pkg.__doc__)
                 return False
@@ -126,7 +126,7 @@ def rows_for_ncols(elts, ncols):
 def rst(pkg_names):
     """Print out information on all packages in restructured text."""
 
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name) for name in pkg_names]
 
     print('.. _package-list:')
     print()
@@ -190,7 +190,7 @@ def html(pkg_names):
     """
 
     # Read in all packages
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name) for name in pkg_names]
 
     # Start at 2 because the title of the page from Sphinx is id1.
     span_id = 2
@@ -47,6 +47,10 @@ def setup_parser(subparser):
         '-n', '--versions-per-spec', type=int,
         default=1,
         help="the number of versions to fetch for each spec")
+    create_parser.add_argument(
+        '-j', '--jobs', action='store', type=int, default=None,
+        help="number of packages to fetch at the same time "
+             "(default: the fetch_jobs setting in config.yaml)")
 
     # used to construct scope arguments below
     scopes = spack.config.scopes()
@@ -149,6 +153,9 @@ def _read_specs_from_file(filename):
 def mirror_create(args):
     """Create a directory to be used as a spack mirror, and fill it with
        package archives."""
+    if args.jobs is not None and args.jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     # try to parse specs from the command line first.
     with spack.concretize.concretizer.disable_compiler_existence_check():
         specs = spack.cmd.parse_specs(args.specs, concretize=True)
@@ -192,7 +199,8 @@ def mirror_create(args):
 
         # Actually do the work to create the mirror
         present, mirrored, error = spack.mirror.create(
-            directory, specs, num_versions=args.versions_per_spec)
+            directory, specs, num_versions=args.versions_per_spec,
+            jobs=args.jobs)
         p, m, e = len(present), len(mirrored), len(error)
 
         verb = "updated" if existed else "created"
@@ -6,15 +6,18 @@
 """Implementation details of the ``spack module`` command."""
 
 import collections
+import multiprocessing
 import os.path
 import shutil
 import sys
 
+import llnl.util.multiproc as mp
 from llnl.util import filesystem, tty
 
 import spack.cmd
 import spack.modules
 import spack.repo
+import spack.tengine
 
 import spack.cmd.common.arguments as arguments
 
@@ -37,6 +40,11 @@ def setup_parser(subparser):
         help='generate modules for packages installed upstream',
         action='store_true'
     )
+    refresh_parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of processes writing module files '
+             '(default: number of cores)'
+    )
     arguments.add_common_arguments(
         refresh_parser, ['constraint', 'yes_to_all']
     )
@@ -292,21 +300,71 @@ def refresh(module_type, specs, args):
         tty.msg(msg.format(module_type))
         return
 
+    jobs = args.jobs
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    if jobs < 1:
+        tty.die("The -j option must be a positive integer!")
+
     # If we arrived here we have at least one writer
     module_type_root = writers[0].layout.dirname()
-    spack.modules.common.generate_module_index(module_type_root, writers)
     # Proceed regenerating module files
     tty.msg('Regenerating {name} module files'.format(name=module_type))
     if os.path.isdir(module_type_root) and args.delete_tree:
         shutil.rmtree(module_type_root, ignore_errors=False)
     filesystem.mkdirp(module_type_root)
-    for x in writers:
-        try:
-            x.write(overwrite=True)
-        except Exception as e:
+    skipped = 0
+    for x, written, error in write_modules(writers, jobs):
+        if error:
             msg = 'Could not write module file [{0}]'
             tty.warn(msg.format(x.layout.filename))
-            tty.warn('\t--> {0} <--'.format(str(e)))
+            tty.warn('\t--> {0} <--'.format(error))
+        elif not written:
+            skipped += 1
+    if skipped:
+        msg = 'Skipped {0} module files that are up to date'
+        tty.msg(msg.format(skipped))
+
+    spack.modules.common.generate_module_index(module_type_root, writers)
+
+
+def _write(writer):
+    """Write the module file of writer.
+
+    Returns:
+        (tuple): whether the module file was written, and the error (or
+            None) if it could not be
+    """
+    try:
+        return writer.write(overwrite=True), None
+    except Exception as e:
+        return False, str(e)
+
+
+def write_modules(writers, jobs=1):
+    """Write the module files of writers, with up to jobs processes.
+
+    Templates are compiled before processes are forked, so that they are
+    compiled only once, in the template environment they all share.
+
+    Returns:
+        (list): (writer, written, error) tuples in the order of
+            ``writers``. Module files that are up to date are not written,
+            and error is None unless writing failed.
+    """
+    if jobs == 1 or len(writers) < 2:
+        return [(x,) + _write(x) for x in writers]
+
+    env = spack.tengine.make_environment()
+    for name in set(x._get_template() for x in writers):
+        try:
+            env.get_template(name)
+        except spack.tengine.TemplateNotFound:
+            pass  # reported by the writers that need it
+
+    results = mp.fork_map(_write, writers, min(jobs, len(writers)),
+                          chunksize=max(1, len(writers) // (4 * jobs)))
+    return [(x,) + r for x, r in zip(writers, results)]
 
 
 #: Dictionary populated with the list of sub-commands.
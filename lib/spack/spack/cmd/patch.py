@@ -9,6 +9,7 @@ import llnl.util.tty as tty
 
 import spack.repo
 import spack.cmd
+import spack.config
 import spack.cmd.common.arguments as arguments
 
 
@@ -11,6 +11,7 @@ import sys
 import llnl.util.tty as tty
 from llnl.util.filesystem import set_executable
 
+import spack.config
 import spack.repo
 import spack.store
 import spack.build_systems.cmake
@@ -7,6 +7,7 @@ import argparse
 
 import llnl.util.tty as tty
 
+import spack.config
 import spack.environment as ev
 import spack.repo
 import spack.cmd
@@ -15,6 +15,7 @@ from six import StringIO
 from llnl.util.filesystem import working_dir
 from llnl.util.tty.colify import colify
 
+import spack.config
 import spack.paths
 
 description = "run spack's unit tests"
@@ -170,10 +170,10 @@ def url_summary(args):
     tty.msg('Generating a summary of URL parsing in Spack...')
 
     # Loop through all packages
-    for pkg in spack.repo.path.all_packages():
+    for pkg in spack.repo.path.all_package_metadata():
         urls = set()
 
-        url = getattr(pkg.__class__, 'url', None)
+        url = pkg.url
         if url:
             urls.add(url)
 
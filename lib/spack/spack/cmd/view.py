@@ -23,8 +23,12 @@ The `view` can be built and tore down via a number of methods (the "actions"):
 
 - hardlink :: like the symlink view but hardlinks are used.
 
-- statlink :: a view producing a status report of a symlink or
-  hardlink view.
+- copy :: like the symlink view but files are copied. Where the
+  filesystem supports it, copies share their data with the installed
+  files until either is modified (they are "reflinks").
+
+- statlink :: a view producing a status report of a symlink,
+  hardlink or copy view.
 
 The file system view concept is imspired by Nix, implemented by
 brett.viren@gmail.com ca 2016.
@@ -33,8 +37,6 @@ All operations on views are performed via proxy objects such as
 YamlFilesystemView.
 
 '''
-import os
-
 import llnl.util.tty as tty
 from llnl.util.link_tree import MergeConflictError
 from llnl.util.tty.color import colorize
@@ -51,7 +53,8 @@ description = "project packages to a compact naming scheme on the filesystem."
 section = "environments"
 level = "short"
 
-actions_link = ["symlink", "add", "soft", "hardlink", "hard"]
+actions_link = ["symlink", "add", "soft", "hardlink", "hard", "copy",
+                "reflink"]
 actions_remove = ["remove", "rm"]
 actions_status = ["statlink", "status", "check"]
 
@@ -112,6 +115,10 @@ def setup_parser(sp):
         "hardlink": ssp.add_parser(
             'hardlink', aliases=['hard'],
             help='add packages files to a filesystem via via hard links'),
+        "copy": ssp.add_parser(
+            'copy', aliases=['reflink'],
+            help='add package files to a filesystem view via copies, which '
+                 'share their data where the filesystem supports it'),
         "remove": ssp.add_parser(
             'remove', aliases=['rm'],
             help='remove packages from a filesystem view'),
@@ -125,7 +132,7 @@ def setup_parser(sp):
         act.add_argument('path', nargs=1,
                          help="path to file system view directory")
 
-        if cmd in ("symlink", "hardlink"):
+        if cmd in ("symlink", "hardlink", "copy"):
             # invalid for remove/statlink, for those commands the view needs to
             # already know its own projections.
             help_msg = "Initialize view using projections from file."
@@ -157,7 +164,7 @@ def setup_parser(sp):
             so["nargs"] = "+"
             act.add_argument('specs', **so)
 
-    for cmd in ["symlink", "hardlink"]:
+    for cmd in ["symlink", "hardlink", "copy"]:
         act = file_system_view_actions[cmd]
         act.add_argument("-i", "--ignore-conflicts", action='store_true')
 
@@ -183,7 +190,7 @@ def view(parser, args):
         path, spack.store.layout,
         projections=ordered_projections,
         ignore_conflicts=getattr(args, "ignore_conflicts", False),
-        link=os.link if args.action in ["hardlink", "hard"] else os.symlink,
+        link_type=args.action if args.action in actions_link else 'symlink',
         verbose=args.verbose)
 
     # Process common args and specs
@@ -21,11 +21,14 @@ filesystem.
 
 """
 import datetime
+import functools
+import json
 import time
 import os
 import sys
 import socket
 import contextlib
+import uuid
 from six import string_types
 from six import iteritems
 
@@ -59,12 +62,36 @@ _db_lock_timeout = 120
 # Types of dependencies tracked by the database
 _tracked_deps = ('link', 'run')
 
+# Storage formats for the database, selected by config:db_storage
+_db_storage_formats = ('json', 'journal')
+
+# Number of journal entries after which the journal is folded into the
+# JSON index on the next write
+_journal_compaction_threshold = 1000
+
+# Record fields that can change after a record is created
+_mutable_record_fields = (
+    'path', 'installed', 'ref_count', 'explicit', 'installation_time')
+
 
 def _now():
     """Returns the time since the epoch"""
     return time.time()
 
 
+def _timestamp(date):
+    """Convert a local ``datetime`` to seconds since the epoch.
+
+    Dates that can't be represented as timestamps on this platform, like
+    ``datetime.min`` or ``datetime.max``, are mapped to -inf and +inf.
+    """
+    try:
+        return time.mktime(date.timetuple()) + date.microsecond / 1e6
+    except (OverflowError, ValueError):
+        epoch = datetime.datetime.fromtimestamp(0)
+        return float('-inf') if date < epoch else float('inf')
+
+
 def _autospec(function):
     """Decorator that automatically converts the argument of a single-arg
        function to a Spec."""
@@ -92,6 +119,10 @@ class InstallRecord(object):
     actually remove from the database until a spec has no installed
     dependents left.
 
+    Records read from the database file are lazy: they keep the node
+    dict of their spec, and only build the ``Spec`` (and its dependency
+    edges) the first time ``spec`` is accessed.
+
     Args:
         spec (Spec): spec tracked by the install record
         path (str): path where the spec has been installed
@@ -111,16 +142,61 @@ class InstallRecord(object):
             explicit=False,
             installation_time=None
     ):
-        self.spec = spec
+        self._spec = spec
         self.path = str(path) if path else None
         self.installed = bool(installed)
         self.ref_count = ref_count
         self.explicit = explicit
         self.installation_time = installation_time or _now()
 
+        #: node dict the spec was read from, if it was read from a file
+        self.node_dict = None
+
+        #: callable building the spec from the record, for lazy records
+        self._build_spec = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        # Records tracked by a database report their changes to it, so
+        # that a journal write only looks at the records that changed.
+        changes = self.__dict__.get('_changes')
+        if changes is not None and name in _mutable_record_fields:
+            changes.setdefault(self.__dict__['_key'], 'update')
+
+    @property
+    def spec(self):
+        if self._spec is None and self._build_spec is not None:
+            self._spec = self._build_spec(self)
+            self._build_spec = None
+        return self._spec
+
+    @spec.setter
+    def spec(self, spec):
+        self._spec = spec
+        self.node_dict = None
+        self._build_spec = None
+
+    @property
+    def materialized(self):
+        """Whether the ``Spec`` of this record was built already."""
+        return self._spec is not None
+
+    @property
+    def name(self):
+        """Name of the package, without building the spec."""
+        if self.node_dict is not None:
+            return next(iter(self.node_dict))
+        return self.spec.name
+
     def to_dict(self):
+        # Specs in the database never change once they are read, so the
+        # node dict they were read from can be written back as is.
+        node_dict = self.node_dict
+        if node_dict is None:
+            node_dict = self.spec.to_node_dict()
+
         return {
-            'spec': self.spec.to_node_dict(),
+            'spec': node_dict,
             'path': self.path,
             'installed': self.installed,
             'ref_count': self.ref_count,
@@ -129,14 +205,241 @@ class InstallRecord(object):
         }
 
     @classmethod
-    def from_dict(cls, spec, dictionary):
+    def from_dict(cls, spec, dictionary, build_spec=None):
+        """Make a record from its dict representation.
+
+        If ``spec`` is None, the record is lazy and ``build_spec`` is
+        called with the record to build its spec on first access.
+        """
         d = dict(dictionary.items())
-        d.pop('spec', None)
+        node_dict = d.pop('spec', None)
 
         # Old databases may have "None" for path for externals
         if d['path'] == 'None':
             d['path'] = None
-        return InstallRecord(spec, **d)
+
+        record = InstallRecord(spec, **d)
+        if spec is None:
+            record.node_dict = node_dict
+            record._build_spec = build_spec
+        return record
+
+
+class DatabaseJournal(object):
+    """Append-only log of the changes made to a database index.
+
+    With the ``journal`` storage format, write transactions append the
+    records they added, modified or removed to this journal instead of
+    rewriting the whole ``index.json``. Readers load ``index.json`` and
+    replay the journal on top of it. Once the journal grows past
+    ``_journal_compaction_threshold`` entries, the next write folds it
+    back into ``index.json``.
+
+    The first line of the journal holds the ``journal_id`` of the
+    ``index.json`` it applies to. Every rewrite of ``index.json`` gives it
+    a new id, so a journal left over from before the rewrite (e.g. if
+    Spack was interrupted before removing it) is never replayed, whatever
+    the storage format of the reader or of the writer.
+
+    Each other line is a JSON object with an ``op`` (``add``, ``update``
+    or ``remove``), the ``hash`` of the record and, except for removals,
+    the ``record`` fields to set. Every entry sets an absolute state.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        #: number of entries in the journal, as of the last replay/append
+        self.entries = 0
+
+        #: ``journal_id`` of the index, as of the last read/write
+        self.index_id = None
+
+        # whether the journal on disk applies to the index
+        self._current = False
+
+    def replay(self, installs, index_id):
+        """Apply the journal to ``installs``, a dict of record dicts read
+        from the index with the given ``journal_id``."""
+        self.entries = 0
+        self.index_id = index_id
+        self._current = False
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path) as f:
+            try:
+                header = sjson.load(f.readline())
+            except Exception:
+                header = {}
+            if index_id is None or header.get('index') != index_id:
+                tty.debug('Ignoring stale database journal')
+                return
+            self._current = True
+
+            for line in f:
+                try:
+                    entry = sjson.load(line)
+                except Exception:
+                    # A partial last line from an interrupted write.
+                    continue
+
+                op, key = entry['op'], entry['hash']
+                if op == 'add':
+                    installs[key] = entry['record']
+                elif op == 'update' and key in installs:
+                    installs[key].update(entry['record'])
+                elif op == 'remove':
+                    installs.pop(key, None)
+                self.entries += 1
+
+    def append(self, entries):
+        """Append a list of entries to the journal."""
+        if not entries:
+            return
+
+        if not self._current:
+            # Start a new journal for the current index
+            entries = [{'index': self.index_id}] + entries
+        lines = ''.join(
+            json.dumps(e, separators=(',', ':')) + '\n' for e in entries)
+        with open(self.path, 'a' if self._current else 'w') as f:
+            f.write(lines)
+        self.entries += len(entries) - (0 if self._current else 1)
+        self._current = True
+
+    def clear(self):
+        """Remove the journal, after it was folded into the index."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries = 0
+        self._current = False
+
+
+class QueryIndex(object):
+    """Secondary indexes over the install records of a Database.
+
+    Each index maps a field of the record's spec to the set of hashes of
+    the records having that value. Fields that a record does not
+    constrain are mapped from ``None``, so that a lookup never discards a
+    record that ``Spec.satisfies`` could accept.
+
+    The index only *narrows* the set of candidates for a query; the
+    final answer is always decided by ``Spec.satisfies``. For this
+    reason only fields that never change once a record is created are
+    indexed (name, compiler, architecture and variant names), while
+    flags like ``installed`` or ``explicit`` are checked on the records.
+    """
+
+    #: architecture fields that are indexed
+    arch_fields = ('platform', 'os', 'target')
+
+    def __init__(self, data=None):
+        self._index = {}
+        for key, rec in (data or {}).items():
+            self.add(key, rec)
+
+    def _keys_for(self, rec):
+        """Yield the (field, value) pairs under which a record is indexed."""
+        if not rec.materialized:
+            for item in self._node_dict_keys(rec.node_dict):
+                yield item
+            return
+
+        spec = rec.spec
+        yield 'name', spec.name
+        yield 'compiler', spec.compiler.name if spec.compiler else None
+
+        arch = spec.architecture
+        for field in self.arch_fields:
+            value = getattr(arch, field) if arch and arch.concrete else None
+            yield field, value
+
+        for name in spec.variants:
+            yield 'variant', name
+
+    def _node_dict_keys(self, node_dict):
+        """Same as ``_keys_for``, reading the node dict of a lazy record
+        the way ``Spec.from_node_dict`` does."""
+        name = next(iter(node_dict))
+        node = node_dict[name]
+        yield 'name', name
+
+        compiler = node.get('compiler')
+        yield 'compiler', compiler['name'] if compiler else None
+
+        arch = node.get('arch') or {}
+        arch_values = dict(zip(
+            self.arch_fields,
+            (arch.get('platform'), arch.get('platform_os'),
+             arch.get('target'))))
+        concrete = all(arch_values.values())
+        for field in self.arch_fields:
+            yield field, arch_values[field] if concrete else None
+
+        variants = node.get('parameters', node.get('variants', {}))
+        for name in variants:
+            if name not in spack.spec.FlagMap.valid_compiler_flags():
+                yield 'variant', name
+        if node.get('patches') and 'patches' not in variants:
+            yield 'variant', 'patches'
+
+    def add(self, key, rec):
+        """Index the record ``rec``, with hash ``key``."""
+        for field, value in self._keys_for(rec):
+            self._index.setdefault(field, {}).setdefault(
+                value, set()).add(key)
+
+    def remove(self, key, rec):
+        """Remove the record ``rec``, with hash ``key``."""
+        for field, value in self._keys_for(rec):
+            keys = self._index.get(field, {}).get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[field][value]
+
+    def _lookup(self, field, value):
+        """Hashes of records whose ``field`` matches or is unconstrained."""
+        by_value = self._index.get(field, {})
+        return by_value.get(value, set()) | by_value.get(None, set())
+
+    def candidates(self, query_spec):
+        """Return the hashes of the records that may satisfy ``query_spec``.
+
+        Returns None if the index can't narrow down the query, in which
+        case every record is a candidate.
+        """
+        if not isinstance(query_spec, spack.spec.Spec):
+            return None
+
+        result = None
+
+        def narrow(keys):
+            return keys if result is None else result & keys
+
+        # Virtual specs are satisfied by providers with other names.
+        if query_spec.name and not spack.repo.path.is_virtual(
+                query_spec.name):
+            result = narrow(self._lookup('name', query_spec.name))
+
+        if query_spec.compiler and query_spec.compiler.name:
+            result = narrow(
+                self._lookup('compiler', query_spec.compiler.name))
+
+        arch = query_spec.architecture
+        if arch:
+            for field in self.arch_fields:
+                value = getattr(arch, field)
+                if value:
+                    result = narrow(self._lookup(field, value))
+
+        # Install records are concrete, so they must define every
+        # variant in the query to satisfy it.
+        for name in query_spec.variants:
+            result = narrow(self._index.get('variant', {}).get(name, set()))
+
+        return result
 
 
 class ForbiddenLockError(SpackError):
@@ -189,6 +492,7 @@ class Database(object):
         # Set up layout of database files within the db dir
         self._old_yaml_index_path = os.path.join(self._db_dir, 'index.yaml')
         self._index_path = os.path.join(self._db_dir, 'index.json')
+        self._journal_path = os.path.join(self._db_dir, 'index.journal')
         self._lock_path = os.path.join(self._db_dir, 'lock')
 
         # This is for other classes to use to lock prefix directories.
@@ -220,6 +524,24 @@ class Database(object):
                          default_timeout=self.db_lock_timeout)
         self._data = {}
 
+        storage = spack.config.get('config:db_storage') or 'json'
+        if storage not in _db_storage_formats:
+            raise ValueError("Invalid database storage format: %s" % storage)
+
+        # The journal is read whatever the storage format is: the format
+        # only selects how this process writes.
+        self._journal = DatabaseJournal(self._journal_path)
+        self._journal_writes = storage == 'journal'
+
+        # hash -> 'add', 'update' or 'remove', for the records that
+        # changed since the last read or write. Tracked records share it.
+        self._changes = {}
+        # whether the next write has to rewrite the whole index
+        self._rewrite = False
+
+        # secondary indexes over self._data, built lazily for queries
+        self._query_index = None
+
         self.upstream_dbs = list(upstream_dbs) if upstream_dbs else []
 
         # whether there was an error at the start of a read transaction
@@ -311,10 +633,13 @@ class Database(object):
         # the same spec well.  If there are 2 identical specs with
         # different paths, it can't differentiate.
         # TODO: fix this before we support multiple install locations.
+        # Journals written before this index no longer apply to it
+        self._journal.index_id = uuid.uuid4().hex
         database = {
             'database': {
                 'installs': installs,
-                'version': str(_db_version)
+                'version': str(_db_version),
+                'journal_id': self._journal.index_id
             }
         }
 
@@ -324,20 +649,51 @@ class Database(object):
             raise syaml.SpackYAMLError(
                 "error writing YAML database:", str(e))
 
-    def _read_spec_from_dict(self, hash_key, installs):
-        """Recursively construct a spec from a hash in a YAML database.
+    def _read_spec_from_dict(self, hash_key, data, dependents, record):
+        """Build the spec of a lazy install record, with its dependencies.
+
+        Dependencies are looked up in ``data``, the records read along
+        with ``record``, and then in upstream databases. Their specs are
+        built first, so that all specs in the database share nodes (i.e.,
+        its specs are a true Merkle DAG, unlike most specs).
+
+        The records in ``dependents[hash_key]`` depend on this one. Their
+        specs are built the first time the dependents of the spec are
+        looked at.
 
         Does not do any locking.
         """
-        spec_dict = installs[hash_key]['spec']
+        node_dict = record.node_dict
+        name = next(iter(node_dict))
 
-        # Install records don't include hash with spec, so we add it in here
-        # to ensure it is read properly.
-        for name in spec_dict:
-            spec_dict[name]['hash'] = hash_key
+        try:
+            # Install records don't include hash with spec, so we add it in
+            # here to ensure it is read properly.
+            node = dict(node_dict[name])
+            node['hash'] = hash_key
+            spec = spack.spec.Spec.from_node_dict({name: node})
+            spec._dependents = spack.spec.LazyDependencyMap(functools.partial(
+                self._build_dependents, dependents.get(hash_key, ()), data))
+
+            yaml_deps = node.get('dependencies', {})
+            for dname, dhash, dtypes in spack.spec.Spec.read_yaml_dep_specs(
+                    yaml_deps):
+                # Missing dependencies were reported when reading the file.
+                upstream, dep_record = self.query_by_spec_hash(
+                    dhash, data=data)
+                if dep_record:
+                    spec._add_dependency(dep_record.spec, dtypes)
+        except Exception as e:
+            msg = ("Invalid record in Spack database: "
+                   "hash: %s, cause: %s: %s")
+            msg %= (hash_key, type(e).__name__, str(e))
+            raise CorruptDatabaseError(msg, self._index_path)
 
-        # Build spec from dict first.
-        spec = spack.spec.Spec.from_node_dict(spec_dict)
+        # Mark concrete only once dependencies are connected: doing it
+        # while constructing specs causes hashes to be cached prematurely.
+        # Dependencies were already marked when they were built.
+        spec._normal = True
+        spec._concrete = True
         return spec
 
     def db_for_spec_hash(self, hash_key):
@@ -361,37 +717,43 @@ class Database(object):
                 return True, db._data[hash_key]
         return False, None
 
-    def _assign_dependencies(self, hash_key, installs, data):
-        # Add dependencies from other records in the install DB to
-        # form a full spec.
-        spec = data[hash_key].spec
-        spec_dict = installs[hash_key]['spec']
-        if 'dependencies' in spec_dict[spec.name]:
-            yaml_deps = spec_dict[spec.name]['dependencies']
-            for dname, dhash, dtypes in spack.spec.Spec.read_yaml_dep_specs(
-                    yaml_deps):
-                # It is important that we always check upstream installations
-                # in the same order, and that we always check the local
-                # installation first: if a downstream Spack installs a package
-                # then dependents in that installation could be using it.
-                # If a hash is installed locally and upstream, there isn't
-                # enough information to determine which one a local package
-                # depends on, so the convention ensures that this isn't an
-                # issue.
-                upstream, record = self.query_by_spec_hash(dhash, data=data)
-                child = record.spec if record else None
-
-                if not child:
-                    msg = ("Missing dependency not in database: "
-                           "%s needs %s-%s" % (
-                               spec.cformat('{name}{/hash:7}'),
-                               dname, dhash[:7]))
-                    if self._fail_when_missing_deps:
-                        raise MissingDependenciesError(msg)
-                    tty.warn(msg)
-                    continue
+    @staticmethod
+    def _build_dependents(keys, data):
+        """Build the specs of the records with the given keys, which
+        connects them to the specs they depend on."""
+        for key in keys:
+            if key in data:
+                data[key].spec
+
+    def _check_dependencies(self, hash_key, data, dependents):
+        """Report dependencies of a lazy record that are not in the DB, and
+        add the record to the ``dependents`` of its dependencies.
 
-                spec._add_dependency(child, dtypes)
+        This only looks at hashes in the node dict, so that missing
+        dependencies are found without building any spec.
+        """
+        node_dict = data[hash_key].node_dict
+        name = next(iter(node_dict))
+        yaml_deps = node_dict[name].get('dependencies', {})
+        for dname, dhash, dtypes in spack.spec.Spec.read_yaml_dep_specs(
+                yaml_deps):
+            # It is important that we always check upstream installations
+            # in the same order, and that we always check the local
+            # installation first: if a downstream Spack installs a package
+            # then dependents in that installation could be using it.
+            # If a hash is installed locally and upstream, there isn't
+            # enough information to determine which one a local package
+            # depends on, so the convention ensures that this isn't an
+            # issue.
+            dependents.setdefault(dhash, []).append(hash_key)
+            upstream, record = self.query_by_spec_hash(dhash, data=data)
+            if not record:
+                msg = ("Missing dependency not in database: "
+                       "%s/%s needs %s-%s" % (
+                           name, hash_key[:7], dname, dhash[:7]))
+                if self._fail_when_missing_deps:
+                    raise MissingDependenciesError(msg)
+                tty.warn(msg)
 
     def _read_from_file(self, stream, format='json'):
         """
@@ -435,6 +797,10 @@ class Database(object):
 
         installs = db['installs']
 
+        # Changes written since the last compaction are in the journal.
+        if stream == self._index_path:
+            self._journal.replay(installs, db.get('journal_id'))
+
         # TODO: better version checking semantics.
         version = Version(db['version'])
         if version > _db_version:
@@ -449,48 +815,35 @@ class Database(object):
             msg %= (hash_key, type(error).__name__, str(error))
             raise CorruptDatabaseError(msg, self._index_path)
 
-        # Build up the database in three passes:
-        #
-        #   1. Read in all specs without dependencies.
-        #   2. Hook dependencies up among specs.
-        #   3. Mark all specs concrete.
-        #
-        # The database is built up so that ALL specs in it share nodes
-        # (i.e., its specs are a true Merkle DAG, unlike most specs.)
-
-        # Pass 1: Iterate through database and build specs w/o dependencies
+        # Records are lazy: their specs are only built, along with their
+        # dependencies, when they are first accessed. Their dependents are
+        # built when they are first asked for.
         data = {}
+        dependents = {}
         for hash_key, rec in installs.items():
             try:
-                # This constructs a spec DAG from the list of all installs
-                spec = self._read_spec_from_dict(hash_key, installs)
-
-                # Insert the brand new spec in the database.  Each
-                # spec has its own copies of its dependency specs.
-                # TODO: would a more immmutable spec implementation simplify
-                #       this?
-                data[hash_key] = InstallRecord.from_dict(spec, rec)
+                build_spec = functools.partial(
+                    self._read_spec_from_dict, hash_key, data, dependents)
+                data[hash_key] = InstallRecord.from_dict(
+                    None, rec, build_spec=build_spec)
             except Exception as e:
                 invalid_record(hash_key, e)
 
-        # Pass 2: Assign dependencies once all specs are created.
+        # Report missing dependencies now, rather than on first access.
         for hash_key in data:
             try:
-                self._assign_dependencies(hash_key, installs, data)
+                self._check_dependencies(hash_key, data, dependents)
             except MissingDependenciesError:
                 raise
             except Exception as e:
                 invalid_record(hash_key, e)
 
-        # Pass 3: Mark all specs concrete.  Specs representing real
-        # installations must be explicitly marked.
-        # We do this *after* all dependencies are connected because if we
-        # do it *while* we're constructing specs,it causes hashes to be
-        # cached prematurely.
         for hash_key, rec in data.items():
-            rec.spec._mark_concrete()
-
+            self._track(hash_key, rec)
         self._data = data
+        self._query_index = None
+        self._changes.clear()
+        self._rewrite = False
 
     def reindex(self, directory_layout):
         """Build database index from scratch based on a directory layout.
@@ -511,6 +864,7 @@ class Database(object):
             except CorruptDatabaseError as e:
                 self._error = e
                 self._data = {}
+                self._query_index = None
 
         transaction = WriteTransaction(
             self.lock, _read_suppress_error, self._write
@@ -531,6 +885,7 @@ class Database(object):
             except BaseException:
                 # If anything explodes, restore old data, skip write.
                 self._data = old_data
+                self._query_index = None
                 raise
 
     def _construct_from_directory_layout(self, directory_layout, old_data):
@@ -543,6 +898,8 @@ class Database(object):
         with directory_layout.disable_upstream_check():
             # Initialize data in the reconstructed DB
             self._data = {}
+            self._query_index = None
+            self._rewrite = True
 
             # Start inspecting the installed prefixes
             processed_specs = set()
@@ -651,6 +1008,16 @@ class Database(object):
         if type is not None:
             return
 
+        if (self._journal_writes and not self._rewrite and
+                self._journal.index_id and
+                os.path.isfile(self._index_path)):
+            entries = self._journal_entries()
+            total = self._journal.entries + len(entries)
+            if total <= _journal_compaction_threshold:
+                self._journal.append(entries)
+                self._changes.clear()
+                return
+
         temp_file = self._index_path + (
             '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
 
@@ -665,6 +1032,38 @@ class Database(object):
                 os.remove(temp_file)
             raise
 
+        # The index now contains everything that was in the journal.
+        self._journal.clear()
+        self._changes.clear()
+        self._rewrite = False
+
+    def _track(self, key, rec):
+        """Have rec report the changes to its fields in ``self._changes``."""
+        rec.__dict__['_key'] = key
+        rec.__dict__['_changes'] = self._changes
+
+    def _journal_entries(self):
+        """Journal entries for the records that changed since the last read
+        or write.
+
+        The spec of a record never changes once it is created, so only new
+        records are serialized in full.
+        """
+        entries = []
+        for key, op in self._changes.items():
+            rec = self._data.get(key)
+            if rec is None:
+                entries.append({'op': 'remove', 'hash': key})
+            elif op == 'add':
+                entries.append(
+                    {'op': 'add', 'hash': key, 'record': rec.to_dict()})
+            else:
+                entries.append({
+                    'op': 'update', 'hash': key,
+                    'record': dict((f, getattr(rec, f))
+                                   for f in _mutable_record_fields)})
+        return entries
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
@@ -775,6 +1174,8 @@ class Database(object):
             self._data[key] = InstallRecord(
                 new_spec, path, installed, ref_count=0, **extra_args
             )
+            self._track(key, self._data[key])
+            self._changes[key] = 'add'
 
             # Connect dependencies from the DB to the new copy.
             for name, dep in iteritems(spec.dependencies_dict(_tracked_deps)):
@@ -789,6 +1190,9 @@ class Database(object):
             new_spec._mark_concrete()
             new_spec._hash = key
 
+            if self._query_index is not None:
+                self._query_index.add(key, self._data[key])
+
         else:
             # If it is already there, mark it as installed.
             self._data[key].installed = True
@@ -824,6 +1228,13 @@ class Database(object):
         upstream, record = self.query_by_spec_hash(key)
         return record
 
+    def _delete_record(self, key):
+        """Remove a record from the database and from the query index."""
+        rec = self._data.pop(key)
+        self._changes[key] = 'remove'
+        if self._query_index is not None:
+            self._query_index.remove(key, rec)
+
     def _decrement_ref_count(self, spec):
         key = spec.dag_hash()
 
@@ -836,7 +1247,7 @@ class Database(object):
         rec.ref_count -= 1
 
         if rec.ref_count == 0 and not rec.installed:
-            del self._data[key]
+            self._delete_record(key)
             for dep in spec.dependencies(_tracked_deps):
                 self._decrement_ref_count(dep)
 
@@ -850,7 +1261,7 @@ class Database(object):
             rec.installed = False
             return rec.spec
 
-        del self._data[key]
+        self._delete_record(key)
         for dep in rec.spec.dependencies(_tracked_deps):
             self._decrement_ref_count(dep)
 
@@ -881,31 +1292,32 @@ class Database(object):
             raise ValueError("Invalid direction: %s" % direction)
 
         relatives = set()
-        for spec in self.query(spec):
-            if transitive:
-                to_add = spec.traverse(direction=direction, root=False)
-            elif direction == 'parents':
-                to_add = spec.dependents()
-            else:  # direction == 'children'
-                to_add = spec.dependencies()
-
-            for relative in to_add:
-                hash_key = relative.dag_hash()
-                upstream, record = self.query_by_spec_hash(hash_key)
-                if not record:
-                    reltype = ('Dependent' if direction == 'parents'
-                               else 'Dependency')
-                    msg = ("Inconsistent state! %s %s of %s not in DB"
-                           % (reltype, hash_key, spec.dag_hash()))
-                    if self._fail_when_missing_deps:
-                        raise MissingDependenciesError(msg)
-                    tty.warn(msg)
-                    continue
-
-                if not record.installed:
-                    continue
-
-                relatives.add(relative)
+        with self.read_transaction():
+            for spec in self.query(spec):
+                if transitive:
+                    to_add = spec.traverse(direction=direction, root=False)
+                elif direction == 'parents':
+                    to_add = spec.dependents()
+                else:  # direction == 'children'
+                    to_add = spec.dependencies()
+
+                for relative in to_add:
+                    hash_key = relative.dag_hash()
+                    upstream, record = self.query_by_spec_hash(hash_key)
+                    if not record:
+                        reltype = ('Dependent' if direction == 'parents'
+                                   else 'Dependency')
+                        msg = ("Inconsistent state! %s %s of %s not in DB"
+                               % (reltype, hash_key, spec.dag_hash()))
+                        if self._fail_when_missing_deps:
+                            raise MissingDependenciesError(msg)
+                        tty.warn(msg)
+                        continue
+
+                    if not record.installed:
+                        continue
+
+                    relatives.add(relative)
         return relatives
 
     @_autospec
@@ -999,30 +1411,51 @@ class Database(object):
             else:
                 return []
 
-        # Abstract specs require more work -- currently we test
-        # against everything.
-        results = []
-        start_date = start_date or datetime.datetime.min
-        end_date = end_date or datetime.datetime.max
+        # Abstract specs require more work: the query index narrows
+        # down the candidates, and we test each of them.
+        if isinstance(query_spec, string_types):
+            query_spec = spack.spec.Spec(query_spec)
 
-        for key, rec in self._data.items():
-            if hashes is not None and rec.spec.dag_hash() not in hashes:
-                continue
+        if self._query_index is None:
+            self._query_index = QueryIndex(self._data)
+
+        keys = self._query_index.candidates(query_spec) \
+            if query_spec is not any else None
+        if hashes is not None:
+            keys = set(hashes) if keys is None else keys & set(hashes)
+
+        # Candidates are taken in database order, so results come out in
+        # the same order whether or not they were narrowed down.
+        records = self._data.values() if keys is None else (
+            rec for key, rec in self._data.items() if key in keys)
+
+        # Compare timestamps rather than building a datetime per record.
+        start_time = _timestamp(start_date) if start_date else None
+        end_time = _timestamp(end_date) if end_date else None
+
+        # cache of the answers to spack.repo.path.exists(name)
+        known_names = {}
 
+        results = []
+        for rec in records:
             if installed is not any and rec.installed != installed:
                 continue
 
             if explicit is not any and rec.explicit != explicit:
                 continue
 
-            if known is not any and spack.repo.path.exists(
-                    rec.spec.name) != known:
-                continue
+            if known is not any:
+                name = rec.spec.name
+                if name not in known_names:
+                    known_names[name] = spack.repo.path.exists(name)
+                if known_names[name] != known:
+                    continue
 
-            inst_date = datetime.datetime.fromtimestamp(
-                rec.installation_time
-            )
-            if not (start_date < inst_date < end_date):
+            if start_time is not None and \
+                    not start_time < rec.installation_time:
+                continue
+            if end_time is not None and \
+                    not rec.installation_time < end_time:
                 continue
 
             if query_spec is any or rec.spec.satisfies(query_spec):
@@ -7,8 +7,6 @@
 """
 from six import string_types
 
-import spack.spec
-
 
 #: The types of dependency relationships that Spack understands.
 all_deptypes = ('build', 'link', 'run', 'test')
@@ -81,6 +79,8 @@ class Dependency(object):
             spec (Spec): Spec indicating dependency requirements
             type (sequence): strings describing dependency relationship
         """
+        # spack.spec imports this module, so it can't be imported first
+        import spack.spec
         assert isinstance(spec, spack.spec.Spec)
 
         self.pkg = pkg
@@ -3,10 +3,12 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import multiprocessing
 import os
 import re
 import sys
 import shutil
+import tempfile
 
 import ruamel.yaml
 import six
@@ -15,13 +17,16 @@ import llnl.util.filesystem as fs
 import llnl.util.tty as tty
 from llnl.util.tty.color import colorize
 
+import spack.compilers
 import spack.error
 import spack.repo
 import spack.schema.env
 import spack.spec
+import spack.store
 import spack.util.spack_json as sjson
 import spack.config
 from spack.spec import Spec
+import spack.filesystem_view
 from spack.filesystem_view import YamlFilesystemView
 
 from spack.util.environment import EnvironmentModifications
@@ -629,7 +634,7 @@ class Environment(object):
                 del self.concretized_order[i]
                 del self.specs_by_hash[dag_hash]
 
-    def concretize(self, force=False):
+    def concretize(self, force=False, jobs=1):
         """Concretize user_specs in this environment.
 
         Only concretizes specs that haven't been concretized yet unless
@@ -641,6 +646,9 @@ class Environment(object):
         Arguments:
             force (bool): re-concretize ALL specs, even those that were
                already concretized
+            jobs (int): number of processes concretizing user specs at
+               the same time. Results are added in manifest order either
+               way, so the lockfile does not depend on this.
         """
         if force:
             # Clear previously concretized specs
@@ -663,18 +671,25 @@ class Environment(object):
                 self._add_concrete_spec(s, concrete, new=False)
 
         # concretize any new user specs that we haven't concretized yet
-        for uspec in self.user_specs:
-            if uspec not in old_concretized_user_specs:
-                tty.msg('Concretizing %s' % uspec)
+        new_user_specs = [s for s in self.user_specs
+                          if s not in old_concretized_user_specs]
+        if jobs > 1 and len(new_user_specs) > 1:
+            concretized = _concretize_in_parallel(new_user_specs, jobs)
+        else:
+            concretized = ((s, None) for s in new_user_specs)
+
+        for uspec, concrete in concretized:
+            tty.msg('Concretizing %s' % uspec)
+            if concrete is None:
                 concrete = uspec.concretized()
-                self._add_concrete_spec(uspec, concrete)
+            self._add_concrete_spec(uspec, concrete)
 
-                # Display concretized spec to the user
-                sys.stdout.write(concrete.tree(
-                    recurse_dependencies=True,
-                    status_fn=spack.spec.Spec.install_status,
-                    hashlen=7, hashes=True)
-                )
+            # Display concretized spec to the user
+            sys.stdout.write(concrete.tree(
+                recurse_dependencies=True,
+                status_fn=spack.spec.Spec.install_status,
+                hashlen=7, hashes=True)
+            )
 
     def install(self, user_spec, concrete_spec=None, **install_args):
         """Install a single spec into an environment.
@@ -718,11 +733,12 @@ class Environment(object):
                 "{0} does not have a view enabled".format(self.name))
 
         return YamlFilesystemView(
-            self._view_path, spack.store.layout, ignore_conflicts=True)
+            self._view_path, spack.store.layout, ignore_conflicts=True,
+            link_type=spack.config.get('config:view_link_type', 'symlink'))
 
     def update_view(self, view_path):
         if self._view_path and self._view_path != view_path:
-            shutil.rmtree(self._view_path)
+            remove_view(self._view_path)
 
         self._view_path = view_path
 
@@ -743,6 +759,10 @@ class Environment(object):
         installed_specs_for_view = set(s for s in specs_for_view
                                        if s.package.installed)
 
+        if spack.config.get('config:view_update') == 'staged':
+            self._regenerate_view_staged(installed_specs_for_view)
+            return
+
         view = self.view()
         view.clean()
         specs_in_view = set(view.get_all_specs())
@@ -754,6 +774,71 @@ class Environment(object):
         add_specs = installed_specs_for_view - specs_in_view
         view.add_specs(*add_specs, with_dependencies=False)
 
+    def _regenerate_view_staged(self, specs):
+        """Build the view with specs in a directory next to it, then make
+        the view a link to that directory.
+
+        Readers of the view see either the old view or the new one, never
+        one being changed.
+        """
+        view_path = os.path.abspath(self._view_path)
+        if os.path.exists(view_path):
+            view = self.view()
+            in_view = set(view.get_all_specs())
+            if in_view == specs and all(
+                    os.path.exists(s.prefix) for s in in_view):
+                tty.debug('View at {0} is up to date'.format(view_path))
+                return
+        tty.msg("Updating view at {0}".format(self._view_path))
+
+        parent, name = os.path.split(view_path)
+        fs.mkdirp(parent)
+        staged = tempfile.mkdtemp(prefix='._%s-' % name, dir=parent)
+        old = moved = None
+        try:
+            # Keep the projections of the view
+            projections = os.path.join(view_path, '.spack', 'projections.yaml')
+            if os.path.exists(projections):
+                fs.mkdirp(os.path.join(staged, '.spack'))
+                shutil.copy(projections, os.path.join(staged, '.spack'))
+            view = YamlFilesystemView(
+                staged, spack.store.layout, ignore_conflicts=True,
+                link_type=spack.config.get('config:view_link_type',
+                                           'symlink'))
+            view.add_specs(*specs, with_dependencies=False,
+                           jobs=spack.config.get('config:view_jobs') or
+                           multiprocessing.cpu_count())
+            _retarget_copies(view, specs, staged, view_path)
+            os.chmod(staged, 0o755 & ~_umask())
+
+            # rename() replaces the old link with the new one atomically
+            link = staged + '.link'
+            os.symlink(os.path.basename(staged), link)
+            if os.path.islink(view_path):
+                old = os.path.join(parent, os.readlink(view_path))
+            elif os.path.exists(view_path):
+                # A view regenerated in place until now can't be replaced
+                # atomically: move it away first. Readers may not find the
+                # view until the link is there, this one time.
+                old = tempfile.mkdtemp(prefix='._%s-' % name, dir=parent)
+                moved = os.path.join(old, name)
+                os.rename(view_path, moved)
+            os.rename(link, view_path)
+        except BaseException:
+            if moved:
+                # Put the old view back where it was
+                if os.path.exists(moved) and not os.path.lexists(view_path):
+                    os.rename(moved, view_path)
+                if not os.path.exists(moved):
+                    shutil.rmtree(old, ignore_errors=True)
+            shutil.rmtree(staged, ignore_errors=True)
+            if os.path.lexists(staged + '.link'):
+                os.remove(staged + '.link')
+            raise
+
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+
     def _shell_vars(self):
         updates = [
             ('PATH', ['bin']),
@@ -966,18 +1051,8 @@ class Environment(object):
         self.concretized_user_specs = [Spec(r['spec']) for r in roots]
         self.concretized_order = [r['hash'] for r in roots]
 
-        json_specs_by_hash = d['concrete_specs']
         root_hashes = set(self.concretized_order)
-
-        specs_by_hash = {}
-        for dag_hash, node_dict in json_specs_by_hash.items():
-            specs_by_hash[dag_hash] = Spec.from_node_dict(node_dict)
-
-        for dag_hash, node_dict in json_specs_by_hash.items():
-            for dep_name, dep_hash, deptypes in (
-                    Spec.dependencies_from_node_dict(node_dict)):
-                specs_by_hash[dag_hash]._add_dependency(
-                    specs_by_hash[dep_hash], deptypes)
+        specs_by_hash = _specs_from_node_dicts(d['concrete_specs'])
 
         self.specs_by_hash = dict(
             (x, y) for x, y in specs_by_hash.items() if x in root_hashes)
@@ -1057,6 +1132,126 @@ class Environment(object):
             activate(self._previous_active)
 
 
+def _specs_from_node_dicts(node_dicts_by_hash):
+    """Rebuild concrete specs from their node dicts, keyed by DAG hash.
+
+    This is the inverse of ``to_node_dict(all_deps=True)`` over every node
+    of a set of concrete DAGs, as stored in lockfiles.
+    """
+    specs_by_hash = {}
+    for dag_hash, node_dict in node_dicts_by_hash.items():
+        specs_by_hash[dag_hash] = Spec.from_node_dict(node_dict)
+
+    for dag_hash, node_dict in node_dicts_by_hash.items():
+        for dep_name, dep_hash, deptypes in (
+                Spec.dependencies_from_node_dict(node_dict)):
+            specs_by_hash[dag_hash]._add_dependency(
+                specs_by_hash[dep_hash], deptypes)
+
+    return specs_by_hash
+
+
+def _concretize_worker(spec_json):
+    """Concretize a user spec in a pool process.
+
+    The user spec is passed as JSON rather than as a string, which does
+    not keep everything that a spec has.
+
+    Returns:
+        (tuple): DAG hash and JSON node dicts (as in lockfiles) of the
+            concrete spec, or None and an error message on failure.
+    """
+    try:
+        concrete = Spec.from_json(spec_json).concretized()
+        nodes = dict((s.dag_hash(), s.to_node_dict(all_deps=True))
+                     for s in concrete.traverse())
+        return concrete.dag_hash(), sjson.dump(nodes)
+    except Exception as e:
+        return None, '%s: %s' % (type(e).__name__, e)
+
+
+def _concretize_in_parallel(user_specs, jobs):
+    """Concretize independent user specs in a pool of processes.
+
+    Workers are forked from this process once configuration, packages
+    and compilers are loaded, so that they all see the same state and do
+    not read it again.
+
+    Returns:
+        (list): (user spec, concrete spec) tuples in the order of
+            ``user_specs``. The concrete spec is None if it could not be
+            concretized in a worker, so the caller can do it again in this
+            process and get the actual error.
+    """
+    for section in spack.config.section_schemas:
+        spack.config.config.get_config(section)
+    spack.repo.path.provider_index
+    spack.compilers.all_compiler_specs()
+
+    pool = multiprocessing.Pool(min(jobs, len(user_specs)))
+    try:
+        results = pool.map(
+            _concretize_worker, [s.to_json() for s in user_specs])
+    finally:
+        pool.terminate()
+        pool.join()
+
+    concretized = []
+    for uspec, (dag_hash, data) in zip(user_specs, results):
+        concrete = None
+        if dag_hash is None:
+            tty.debug('Could not concretize %s in parallel: %s' % (
+                uspec, data))
+        else:
+            concrete = _specs_from_node_dicts(sjson.load(data))[dag_hash]
+        concretized.append((uspec, concrete))
+    return concretized
+
+
+def remove_view(view_path):
+    """Remove the view of an environment, and the directory it links to
+    if it was regenerated in stages."""
+    if os.path.islink(view_path):
+        target = os.path.join(
+            os.path.dirname(view_path), os.readlink(view_path))
+        os.remove(view_path)
+        shutil.rmtree(target, ignore_errors=True)
+    elif os.path.exists(view_path):
+        shutil.rmtree(view_path)
+
+
+def _retarget_copies(view, specs, staged, view_path):
+    """Replace the staging directory of a view with its final path in
+    the scripts that packages copied into it instead of linking them.
+
+    Only packages that add their files to views their own way copy files
+    and rewrite their shebang lines.
+    """
+    if view.manifest is None:
+        return
+    marker = staged.encode('utf-8')
+    for spec in specs:
+        h = spec.dag_hash()
+        if h not in view.manifest.index or \
+                not spack.filesystem_view.adds_own_files(spec.package):
+            continue
+        for rel in view.manifest.entry(h)['files']:
+            path = os.path.join(staged, rel)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                line = f.readline()
+            if line.startswith(b'#!') and marker in line:
+                fs.filter_file(staged, view_path, path,
+                               string=True, backup=False)
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
 def make_repo_path(root):
     """Make a RepoPath from the repo subdirectories in an environment."""
     path = spack.repo.RepoPath()
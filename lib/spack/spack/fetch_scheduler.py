@@ -0,0 +1,379 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Fetch the sources of many packages at the same time.
+
+``PackageBase.do_fetch`` downloads one package after the other, and
+commands that fetch a whole DAG or a whole mirror spend most of their time
+waiting on the network. The :class:`FetchScheduler` in this module fetches
+up to ``fetch_jobs`` packages at a time in a pool of threads, and reports
+the progress of the whole set. Checksums are verified by the thread that
+fetched each archive, so they are computed concurrently as well.
+
+Two limits apply to every download made by
+:class:`~spack.fetch_strategy.URLFetchStrategy`, in a pool or not:
+
+* ``fetch_host_connections``: downloads from the same host at a time;
+* ``fetch_bandwidth``: bytes per second downloaded by the whole process.
+
+The :class:`Prefetcher` fetches the sources of a DAG in a separate process
+while ``spack install`` builds it, so that downloads overlap with the
+builds of the packages that come before.
+"""
+import contextlib
+import multiprocessing
+import multiprocessing.pool
+import re
+import threading
+import time
+import traceback
+
+from six.moves.urllib.parse import urlparse
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.error
+
+
+#: Bytes in each unit that ``fetch_bandwidth`` accepts
+_units = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+#: Protects the module state below, shared by all fetching threads
+_lock = threading.Lock()
+
+#: (host, limit) -> semaphore counting the downloads from host
+_host_slots = {}
+
+#: Whether the current thread fetches on behalf of a scheduler
+_worker = threading.local()
+
+
+def fetch_jobs(jobs=None):
+    """Number of packages that may be fetched concurrently.
+
+    Args:
+        jobs (int or None): number of jobs asked for on the command line,
+            which takes precedence over ``config:fetch_jobs``
+    """
+    if jobs is None:
+        jobs = spack.config.get('config:fetch_jobs', 1)
+    return max(1, jobs)
+
+
+def parse_bandwidth(value):
+    """Bytes per second in a ``fetch_bandwidth`` setting, like ``'10M'``.
+
+    Returns:
+        (int or None): the rate, or None if downloads are not limited
+    """
+    match = re.match(r'^(\d+)([kKmMgG]?)$', str(value or 0))
+    if not match:
+        raise ValueError('Invalid fetch_bandwidth: %s' % value)
+    return int(match.group(1)) * _units[match.group(2).lower()] or None
+
+
+class Throttle(object):
+    """Counts the bytes downloaded by all threads, and keeps them under a
+    rate.
+
+    Each call to :meth:`consume` reserves the time that its bytes take at
+    the allowed rate, after the time reserved by earlier calls, and sleeps
+    until then.
+    """
+
+    def __init__(self, rate=None):
+        #: bytes per second, or None for no limit
+        self.rate = rate
+        #: bytes downloaded so far
+        self.total = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """Account for nbytes downloaded, and wait if over the rate."""
+        with self._lock:
+            self.total += nbytes
+            if not self.rate:
+                return
+            now = time.time()
+            self._next = max(self._next, now) + nbytes / float(self.rate)
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+_throttle = Throttle()
+
+
+def download_throttle():
+    """The throttle that all downloads of this process share, set to the
+    current ``fetch_bandwidth``."""
+    _throttle.rate = parse_bandwidth(
+        spack.config.get('config:fetch_bandwidth', 0))
+    return _throttle
+
+
+@contextlib.contextmanager
+def host_connection(url):
+    """Hold one of the ``fetch_host_connections`` slots of the host of url
+    while in this context."""
+    limit = spack.config.get('config:fetch_host_connections')
+    if not limit:
+        yield
+        return
+
+    key = (urlparse(url).netloc, limit)
+    with _lock:
+        if key not in _host_slots:
+            _host_slots[key] = threading.BoundedSemaphore(limit)
+        slot = _host_slots[key]
+    with slot:
+        yield
+
+
+def in_worker():
+    """Whether the current thread fetches for a scheduler, alongside other
+    fetches. Progress bars of single downloads are not shown there."""
+    return getattr(_worker, 'active', False)
+
+
+def needs_confirmation(pkg):
+    """Whether fetching pkg may ask the user to go on without a checksum."""
+    return bool(spack.config.get('config:checksum') and
+                pkg.version not in pkg.versions)
+
+
+def fetches_in_thread(pkg):
+    """Whether pkg can be fetched in a thread, next to other fetches.
+
+    Version control checkouts and patches in archives change the working
+    directory of the process, and are fetched one at a time instead.
+    """
+    import spack.fetch_strategy as fs
+    try:
+        stages = list(pkg.stage)
+    except spack.error.SpackError:
+        # do_fetch will report the error
+        return False
+    return (not needs_confirmation(pkg) and
+            all(type(s.default_fetcher) in (fs.URLFetchStrategy,
+                                            fs.CacheURLFetchStrategy)
+                for s in stages) and
+            not any(getattr(p, 'archive_sha256', None)
+                    for p in pkg.spec.patches))
+
+
+class FetchScheduler(object):
+    """Fetch the sources of many packages, up to ``jobs`` at a time.
+
+    Packages that cannot be fetched in a thread (see
+    :func:`fetches_in_thread`) are fetched one at a time in the calling
+    thread, while the pool works on the others.
+    """
+
+    def __init__(self, jobs=None):
+        """
+        Args:
+            jobs (int or None): maximum number of concurrent fetches. The
+                default is ``config:fetch_jobs``.
+        """
+        self.jobs = fetch_jobs(jobs)
+        self._lock = threading.Lock()
+
+    def fetch(self, packages, action=None, callback=None):
+        """Fetch packages, and report progress as each one is done.
+
+        Args:
+            packages (list): packages to fetch. Packages with the same DAG
+                hash are only fetched once.
+            action (callable): fetches the package it is given. The default
+                is the package's ``do_fetch``.
+            callback (callable): called with each package and the exception
+                its fetch raised (or None), once the fetch is done
+
+        Returns:
+            (list): (package, exception) pairs of the fetches that failed
+        """
+        action = action or (lambda pkg: pkg.do_fetch())
+        hashes = set()
+        unique = []
+        for pkg in packages:
+            if pkg.spec.dag_hash() not in hashes:
+                hashes.add(pkg.spec.dag_hash())
+                unique.append(pkg)
+        packages = unique
+
+        concurrent, serial = [], []
+        for pkg in packages:
+            if self.jobs > 1 and fetches_in_thread(pkg):
+                concurrent.append(pkg)
+            else:
+                serial.append(pkg)
+
+        throttle = download_throttle()
+        start_bytes = throttle.total
+        errors = []
+        done = [0]
+
+        def run(pkg, in_thread):
+            in_pool = in_worker()
+            _worker.active = in_pool or in_thread
+            try:
+                action(pkg)
+                return pkg, None
+            except Exception as e:
+                tty.debug(traceback.format_exc())
+                return pkg, e
+            finally:
+                _worker.active = in_pool
+
+        def finished(result):
+            pkg, error = result
+            with self._lock:
+                done[0] += 1
+                if error is not None:
+                    errors.append(result)
+                tty.msg('[%d/%d] Finished fetching %s (%.1f MB downloaded)'
+                        % (done[0], len(packages),
+                           pkg.spec.cformat('{name}{@version}'),
+                           (throttle.total - start_bytes) / 1024.0 ** 2))
+                if callback:
+                    callback(pkg, error)
+
+        pool = None
+        try:
+            if concurrent:
+                tty.debug('Fetching {0} packages with {1} jobs'.format(
+                    len(concurrent), self.jobs))
+                pool = multiprocessing.pool.ThreadPool(
+                    min(self.jobs, len(concurrent)))
+                for pkg in concurrent:
+                    pool.apply_async(run, (pkg, True), callback=finished)
+                pool.close()
+
+            for pkg in serial:
+                finished(run(pkg, False))
+
+            if pool:
+                pool.join()
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+        order = dict((id(p), i) for i, p in enumerate(packages))
+        return sorted(errors, key=lambda e: order[id(e[0])])
+
+
+def packages_to_prefetch(spec, use_cache=True):
+    """Packages in the DAG of spec that ``spack install`` will build from
+    source, in the order they are needed.
+
+    Packages that may ask the user for confirmation are left out, as are
+    those found in a binary mirror when ``use_cache`` is set.
+    """
+    binaries = set()
+    if use_cache and spack.config.get('mirrors'):
+        import spack.binary_distribution as bindist
+        binaries = set(s.dag_hash() for s in bindist.get_specs())
+
+    packages = []
+    for s in spec.traverse(order='post'):
+        pkg = s.package
+        if s.external or pkg.installed_upstream or pkg.installed:
+            continue
+        if s.dag_hash() in binaries or needs_confirmation(pkg):
+            continue
+        packages.append(pkg)
+    return packages
+
+
+def _prefetch_worker(packages, jobs, conn):
+    """Body of the prefetch process: fetch packages, and send the DAG hash
+    of each one through conn when its fetch is done."""
+    _worker.active = True
+    try:
+        FetchScheduler(jobs).fetch(
+            packages, callback=lambda pkg, e: conn.send(pkg.spec.dag_hash()))
+    finally:
+        conn.close()
+
+
+class Prefetcher(object):
+    """Fetch the sources of packages in a separate process.
+
+    Builds fork from the process that runs ``spack install``, so fetches
+    run in their own process instead of in threads of that one. If a fetch
+    fails, the build of the package fetches it again and reports the error.
+    """
+
+    def __init__(self, packages, jobs=None):
+        """
+        Args:
+            packages (list): packages to fetch, in the order they are needed
+            jobs (int or None): maximum number of concurrent fetches
+        """
+        #: DAG hashes of the packages whose fetch is not done yet
+        self.pending = set(p.spec.dag_hash() for p in packages)
+
+        self._conn, child_conn = multiprocessing.Pipe(False)
+        self._process = multiprocessing.Process(
+            target=_prefetch_worker, args=(packages, jobs, child_conn))
+        self._process.start()
+        child_conn.close()
+
+    def wait(self, spec):
+        """Wait until the fetch of spec is done, if it is being fetched."""
+        h = spec.dag_hash()
+        while h in self.pending:
+            try:
+                self.pending.discard(self._conn.recv())
+            except EOFError:
+                # The process is gone: builds fetch what it did not
+                self.pending.clear()
+
+    def stop(self):
+        """Stop fetching. Interrupted downloads are continued by the next
+        fetch of their package."""
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        self._conn.close()
+        self.pending.clear()
+
+
+#: Prefetcher of the running ``spack install``, if any
+_prefetcher = None
+
+
+@contextlib.contextmanager
+def prefetch(packages, jobs=None):
+    """Fetch the sources of packages in the background in this context.
+
+    Contexts nested in one that is prefetching do nothing.
+    """
+    global _prefetcher
+    if _prefetcher is not None or not packages:
+        yield
+        return
+
+    tty.debug('Prefetching the sources of {0} packages'.format(
+        len(packages)))
+    _prefetcher = Prefetcher(packages, jobs)
+    try:
+        yield
+    finally:
+        _prefetcher.stop()
+        _prefetcher = None
+
+
+def wait_for_prefetch(spec):
+    """Wait until the sources of spec are fetched, if they are prefetched.
+
+    Call this before forking a process that builds spec.
+    """
+    if _prefetcher is not None:
+        _prefetcher.wait(spec)
@@ -26,6 +26,7 @@ import sys
 import re
 import shutil
 import copy
+import subprocess
 from functools import wraps
 from six import string_types, with_metaclass
 
@@ -34,6 +35,7 @@ from llnl.util.filesystem import working_dir, mkdirp
 
 import spack.config
 import spack.error
+import spack.fetch_scheduler
 import spack.util.crypto as crypto
 import spack.util.pattern as pattern
 from spack.util.executable import which
@@ -163,6 +165,14 @@ class FetchStrategyComposite(object):
             return component_ids
 
 
+#: Exit code of curl when the server does not support continuing downloads
+_curl_range_error = 33
+
+#: Exit codes of curl for errors that a later attempt may not run into:
+#: can't connect, partial file, timeout, empty reply, send and receive errors
+_curl_transient_errors = (7, 18, 28, 52, 55, 56)
+
+
 class URLFetchStrategy(FetchStrategy):
     """FetchStrategy that pulls source code from a URL for an archive,
        checks the archive against a checksum,and decompresses the archive.
@@ -193,6 +203,9 @@ class URLFetchStrategy(FetchStrategy):
 
         self.extension = kwargs.get('extension', None)
 
+        # archive path and digest computed while it was downloaded
+        self._fetched_digest = None
+
         if not self.url:
             raise ValueError("URLFetchStrategy requires a url for fetching.")
 
@@ -205,81 +218,159 @@ class URLFetchStrategy(FetchStrategy):
     def source_id(self):
         return self.digest
 
-    @_needs_stage
-    def fetch(self):
-        if self.archive_file:
-            tty.msg("Already downloaded %s" % self.archive_file)
-            return
-
-        save_file = None
-        partial_file = None
-        if self.stage.save_filename:
-            save_file = self.stage.save_filename
-            partial_file = self.stage.save_filename + '.part'
-
-        tty.msg("Fetching %s" % self.url)
-
-        if partial_file:
-            save_args = ['-C',
-                         '-',  # continue partial downloads
-                         '-o',
-                         partial_file]  # use a .part file
-        else:
-            save_args = ['-O']
-
-        curl_args = save_args + [
+    def _curl_args(self):
+        """Arguments that curl gets for any download from this URL."""
+        curl_args = [
             '-f',  # fail on >400 errors
-            '-D',
-            '-',  # print out HTML headers
             '-L',  # resolve 3xx redirects
-            self.url,
         ]
 
         if not spack.config.get('config:verify_ssl'):
             curl_args.append('-k')
 
-        if sys.stdout.isatty() and tty.msg_enabled():
+        if sys.stdout.isatty() and tty.msg_enabled() and \
+                not spack.fetch_scheduler.in_worker():
             curl_args.append('-#')  # status bar when using a tty
         else:
             curl_args.append('-sS')  # just errors when not.
 
-        curl_args += self.extra_curl_options
+        return curl_args + self.extra_curl_options
+
+    def _curl_error(self, returncode):
+        """Error to raise when curl fails with returncode."""
+        if returncode == 22:
+            # This is a 404.  Curl will print the error.
+            return FailedDownloadError(
+                self.url, "URL %s was not found!" % self.url)
+
+        elif returncode == 60:
+            # This is a certificate error.  Suggest spack -k
+            return FailedDownloadError(
+                self.url,
+                "Curl was unable to fetch due to invalid certificate. "
+                "This is either an attack, or your cluster's SSL "
+                "configuration is bad.  If you believe your SSL "
+                "configuration is bad, you can try running spack -k, "
+                "which will not check SSL certificates."
+                "Use this at your own risk.")
 
-        # Run curl but grab the mime type from the http headers
-        curl = self.curl
-        with working_dir(self.stage.path):
-            headers = curl(*curl_args, output=str, fail_on_error=False)
+        else:
+            # This is some other curl error.  Curl will print the
+            # error, but print a spack message too
+            return FailedDownloadError(
+                self.url,
+                "Curl failed with error %d" % returncode)
 
-        if curl.returncode != 0:
-            # clean up archive on failure.
-            if self.archive_file:
-                os.remove(self.archive_file)
+    def _download(self, partial_file):
+        """Download the archive to partial_file with curl.
 
-            if partial_file and os.path.exists(partial_file):
+        A download that was interrupted, in this call or in an earlier one,
+        continues where it stopped with an HTTP range request. Interrupted
+        downloads are retried ``config:fetch_retries`` times. The archive
+        is hashed as it is written, so that check() need not read it again.
+
+        Returns:
+            (tuple): the HTTP headers that curl received, and the digest of
+                the archive (or None, if there is no digest to check)
+        """
+        def new_hasher():
+            try:
+                return crypto.hash_fun_for_digest(self.digest)()
+            except ValueError:
+                # check() will tell about digests that are not valid
+                return None
+        hasher = new_hasher() if self.digest else None
+
+        offset = 0
+        if os.path.exists(partial_file):
+            with open(partial_file, 'rb') as f:
+                for block in iter(lambda: f.read(2**20), b''):
+                    offset += len(block)
+                    if hasher:
+                        hasher.update(block)
+            if offset:
+                tty.msg("Continuing download at byte %d" % offset)
+
+        retries = spack.config.get('config:fetch_retries', 3)
+        throttle = spack.fetch_scheduler.download_throttle()
+        headers_file = partial_file + '.headers'
+        attempt = 0
+        while True:
+            curl_args = self._curl_args() + ['-D', headers_file]
+            if offset:
+                curl_args += ['-C', str(offset)]
+            curl_args.append(self.url)
+
+            # curl writes the archive to its output, so that it can be
+            # hashed on the way to the partial file
+            with spack.fetch_scheduler.host_connection(self.url):
+                with open(partial_file, 'ab') as f:
+                    curl = subprocess.Popen(
+                        self.curl.exe + curl_args, stdout=subprocess.PIPE)
+                    for block in iter(lambda: curl.stdout.read(2**16), b''):
+                        f.write(block)
+                        offset += len(block)
+                        if hasher:
+                            hasher.update(block)
+                        throttle.consume(len(block))
+                    returncode = curl.wait()
+
+            headers = ''
+            if os.path.exists(headers_file):
+                with open(headers_file) as f:
+                    headers = f.read()
+                os.remove(headers_file)
+
+            if returncode == 0:
+                break
+
+            attempt += 1
+            statuses = re.findall(r'^HTTP/\S+\s+(\d+)', headers, re.MULTILINE)
+            cannot_resume = returncode == _curl_range_error or (
+                statuses and statuses[-1] == '416')
+            if offset and cannot_resume and attempt <= retries:
+                # The server can't continue the download: start over
+                tty.msg("Cannot continue download, restarting %s" % self.url)
                 os.remove(partial_file)
+                offset = 0
+                if hasher:
+                    hasher = new_hasher()
+            elif returncode in _curl_transient_errors and attempt <= retries:
+                tty.msg("Download interrupted (curl error %d), retrying %s" %
+                        (returncode, self.url))
+            else:
+                # keep what was downloaded if the next fetch can continue
+                if returncode not in _curl_transient_errors and \
+                        os.path.exists(partial_file):
+                    os.remove(partial_file)
+                raise self._curl_error(returncode)
 
-            if curl.returncode == 22:
-                # This is a 404.  Curl will print the error.
-                raise FailedDownloadError(
-                    self.url, "URL %s was not found!" % self.url)
-
-            elif curl.returncode == 60:
-                # This is a certificate error.  Suggest spack -k
-                raise FailedDownloadError(
-                    self.url,
-                    "Curl was unable to fetch due to invalid certificate. "
-                    "This is either an attack, or your cluster's SSL "
-                    "configuration is bad.  If you believe your SSL "
-                    "configuration is bad, you can try running spack -k, "
-                    "which will not check SSL certificates."
-                    "Use this at your own risk.")
+        return headers, hasher.hexdigest() if hasher else None
 
-            else:
-                # This is some other curl error.  Curl will print the
-                # error, but print a spack message too
-                raise FailedDownloadError(
-                    self.url,
-                    "Curl failed with error %d" % curl.returncode)
+    @_needs_stage
+    def fetch(self):
+        if self.archive_file:
+            tty.msg("Already downloaded %s" % self.archive_file)
+            return
+
+        save_file = self.stage.save_filename
+        self._fetched_digest = None
+        digest = None
+
+        tty.msg("Fetching %s" % self.url)
+
+        if save_file:
+            # use a .part file
+            headers, digest = self._download(save_file + '.part')
+        else:
+            curl = self.curl
+            with spack.fetch_scheduler.host_connection(self.url):
+                with working_dir(self.stage.path):
+                    headers = curl(*(['-O', '-D', '-'] + self._curl_args() +
+                                     [self.url]),
+                                   output=str, fail_on_error=False)
+            if curl.returncode != 0:
+                raise self._curl_error(curl.returncode)
 
         # Check if we somehow got an HTML file rather than the archive we
         # asked for.  We only look at the last content type, to handle
@@ -295,7 +386,9 @@ class URLFetchStrategy(FetchStrategy):
             tty.warn(msg.format(self.archive_file or "the archive"))
 
         if save_file:
-            os.rename(partial_file, save_file)
+            os.rename(save_file + '.part', save_file)
+            if digest:
+                self._fetched_digest = (save_file, digest)
 
         if not self.archive_file:
             raise FailedDownloadError(self.url)
@@ -373,7 +466,14 @@ class URLFetchStrategy(FetchStrategy):
                 "Attempt to check URLFetchStrategy with no digest.")
 
         checker = crypto.Checker(self.digest)
-        if not checker.check(self.archive_file):
+        fetched = self._fetched_digest
+        if fetched and fetched[0] == self.archive_file:
+            # the archive was hashed as it was downloaded
+            checker.sum = fetched[1]
+            matches = checker.sum == self.digest
+        else:
+            matches = checker.check(self.archive_file)
+        if not matches:
             raise ChecksumError(
                 "%s checksum failed for %s" %
                 (checker.hash_name, self.archive_file),
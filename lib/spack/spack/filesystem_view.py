@@ -5,18 +5,21 @@
 
 import filecmp
 import functools as ft
+import multiprocessing.pool
 import os
 import re
 import shutil
 import sys
 
-from llnl.util.link_tree import LinkTree, MergeConflictError
+from llnl.util.link_tree import LinkTree, MergeConflictError, empty_file_name
 from llnl.util import tty
 from llnl.util.lang import match_predicate, index_by
 from llnl.util.tty.color import colorize
 from llnl.util.filesystem import (
-    mkdirp, remove_dead_links, remove_empty_directories)
+    mkdirp, reflink, remove_dead_links, remove_empty_directories, touch,
+    traverse_tree)
 
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as s_yaml
 
 import spack.spec
@@ -34,10 +37,57 @@ if sys.version_info < (3, 0):
     from itertools import ifilter as filter
     from itertools import izip as zip
 
-__all__ = ["FilesystemView", "YamlFilesystemView"]
+__all__ = ["FilesystemView", "YamlFilesystemView", "ViewManifest"]
 
 
 _projections_path = '.spack/projections.yaml'
+_manifest_path = '.spack/manifest'
+
+#: Files linked by each task of the thread pool in ``add_specs``
+_link_batch_size = 1024
+
+
+def view_symlink(src, dst):
+    os.symlink(src, dst)
+
+
+def view_hardlink(src, dst):
+    """Hard link dst to src. Links in the prefix are copied as links."""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+    else:
+        os.link(src, dst)
+
+
+def view_copy(src, dst):
+    """Copy src to dst, sharing its data where the filesystem supports
+    it (see ``llnl.util.filesystem.reflink``)."""
+    reflink(src, dst)
+
+
+#: Functions that add files to a view, by link type
+link_types = {
+    'symlink': view_symlink,
+    'hardlink': view_hardlink,
+    'copy': view_copy,
+}
+
+#: Other names of the link types, as in the actions of ``spack view``
+link_type_aliases = {
+    'add': 'symlink',
+    'soft': 'symlink',
+    'hard': 'hardlink',
+    'reflink': 'copy',
+}
+
+
+def view_func_parser(link_type):
+    """Function that adds files to a view with link_type, or one of its
+    aliases."""
+    link_type = link_type_aliases.get(link_type, link_type)
+    if link_type not in link_types:
+        raise ValueError('Invalid link type for a view: %s' % link_type)
+    return link_types[link_type]
 
 
 class FilesystemView(object):
@@ -58,7 +108,8 @@ class FilesystemView(object):
             Initialize a filesystem view under the given `root` directory with
             corresponding directory `layout`.
 
-            Files are linked by method `link` (os.symlink by default).
+            Files are linked by method `link`, which is chosen by
+            `link_type` (symlinks by default, see `link_types`).
         """
         self._root = root
         self.layout = layout
@@ -66,7 +117,9 @@ class FilesystemView(object):
         self.projections = kwargs.get('projections', {})
 
         self.ignore_conflicts = kwargs.get("ignore_conflicts", False)
-        self.link = kwargs.get("link", os.symlink)
+        link_type = kwargs.get("link_type", "symlink")
+        self.link_type = link_type_aliases.get(link_type, link_type)
+        self.link = kwargs.get("link", view_func_parser(self.link_type))
         self.verbose = kwargs.get("verbose", False)
 
     def add_specs(self, *specs, **kwargs):
@@ -218,6 +271,55 @@ class YamlFilesystemView(FilesystemView):
 
         self._croot = colorize_root(self._root) + " "
 
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """Read the manifest of this view, or write one for a view that
+        was made without it. Returns None if it cannot be written."""
+        manifest = ViewManifest(self._root)
+        if manifest.exists():
+            return manifest
+
+        try:
+            specs = self._walk_all_specs()
+            if specs:
+                tty.debug('Writing the manifest of view %s' % self._root)
+            for spec in specs:
+                self._record_existing(manifest, spec)
+            manifest.save(force=True)
+        except (IOError, OSError) as e:
+            tty.debug('Cannot write the manifest of view %s: %s'
+                      % (self._root, str(e)))
+            return None
+        return manifest
+
+    def _record_existing(self, manifest, spec):
+        """Record the files that spec already has in this view."""
+        try:
+            pkg = spec.package
+            view_source = pkg.view_source()
+            view_dst = pkg.view_destination(self)
+            meta = self._relpath(self.get_path_meta_folder(spec))
+        except SpackError:
+            # Without its package, clean() is all that can be done
+            view_source, view_dst, meta = spec.prefix, None, None
+
+        files, dirs = {}, []
+        if view_dst and os.path.isdir(view_source):
+            ignore_file = match_predicate(self.layout.hidden_file_paths)
+            for src, dst in traverse_tree(view_source, view_dst,
+                                          ignore=ignore_file,
+                                          follow_nonexisting=False):
+                if os.path.isdir(src):
+                    dirs.append(self._relpath(dst))
+                elif _links_to(src, dst):
+                    files[self._relpath(dst)] = src
+
+        manifest.record(spec, view_source, files=files, dirs=dirs, meta=meta)
+
+    def _relpath(self, path):
+        return os.path.relpath(path, self._root)
+
     def add_specs(self, *specs, **kwargs):
         assert all((s.concrete for s in specs))
         specs = set(specs)
@@ -239,9 +341,17 @@ class YamlFilesystemView(FilesystemView):
         standalones = specs - extensions
 
         set(map(self._check_no_ext_conflicts, extensions))
-        # fail on first error, otherwise link extensions as well
-        if all(map(self.add_standalone, standalones)):
-            all(map(self.add_extension, extensions))
+        jobs = kwargs.get('jobs', 1)
+        try:
+            # fail on first error, otherwise link extensions as well
+            if jobs > 1 and self.ignore_conflicts:
+                added = self._add_standalones_in_parallel(standalones, jobs)
+            else:
+                added = all(map(self.add_standalone, standalones))
+            if added:
+                all(map(self.add_extension, extensions))
+        finally:
+            self._save_manifest()
 
     def add_extension(self, spec):
         if not spec.package.is_extension:
@@ -266,6 +376,21 @@ class YamlFilesystemView(FilesystemView):
         return True
 
     def add_standalone(self, spec):
+        skip = self._skip_standalone(spec)
+        if skip is not None:
+            return skip
+
+        self.merge(spec)
+
+        self.link_meta_folder(spec)
+
+        if self.verbose:
+            tty.info(self._croot + 'Linked package: %s' % colorize_spec(spec))
+        return True
+
+    def _skip_standalone(self, spec):
+        """Return None if spec is to be linked by add_standalone, or else
+        what add_standalone returns for it."""
         if spec.package.is_extension:
             tty.error(self._croot + 'Package %s is an extension.'
                       % spec.name)
@@ -294,14 +419,120 @@ class YamlFilesystemView(FilesystemView):
                                         long=False)
                 return False
 
-        self.merge(spec)
+        return None
 
-        self.link_meta_folder(spec)
+    def _add_standalones_in_parallel(self, specs, jobs):
+        """Add standalone specs like add_standalone, with a pool of jobs
+        threads that scans their prefixes and links their files.
 
-        if self.verbose:
-            tty.info(self._croot + 'Linked package: %s' % colorize_spec(spec))
+        Only for views that ignore conflicts: as when specs are added one at
+        a time, the first spec to have a file in the view links it.
+        """
+        to_merge = []
+        for spec in specs:
+            skip = self._skip_standalone(spec)
+            if skip is False:
+                return False
+            elif skip is None:
+                to_merge.append(spec)
+        if not to_merge:
+            return True
+
+        pool = multiprocessing.pool.ThreadPool(jobs)
+        try:
+            scans = pool.map(self._scan_package, to_merge)
+
+            # Decide which spec links each file, in order
+            merge_maps = []
+            claimed_dirs, claimed_files = set(), set()
+            dir_owners = {}
+            generic, custom = [], []
+            for spec, (view_source, view_dst, dirs, files) in zip(
+                    to_merge, scans):
+                for d in dirs:
+                    dst = os.path.join(view_dst, d)
+                    if dst in claimed_files or (
+                            os.path.lexists(dst) and not os.path.isdir(dst)):
+                        raise MergeConflictError(dst)
+                    claimed_dirs.add(dst)
+                    dir_owners[dst] = dir_owners.get(dst, 0) + 1
+
+                merge_map = {}
+                shared = set()
+                for f in files:
+                    src = os.path.join(view_source, f)
+                    dst = os.path.join(view_dst, f)
+                    if dst in claimed_dirs or os.path.isdir(dst):
+                        raise MergeConflictError(dst)
+                    merge_map[src] = dst
+                    if dst in claimed_files or os.path.lexists(dst):
+                        shared.add(dst)
+                merge_maps.append((merge_map, shared))
+
+                pkg = spec.package
+                if not adds_own_files(pkg):
+                    generic.extend(
+                        (src, dst) for src, dst in merge_map.items()
+                        if dst not in shared)
+                else:
+                    custom.append((pkg, merge_map))
+                claimed_files.update(merge_map.values())
+
+            # Mark directories that were in the view and empty, like
+            # LinkTree.merge_directories does, then make the others
+            for dst in sorted(dir_owners):
+                if os.path.isdir(dst):
+                    if not os.listdir(dst):
+                        touch(os.path.join(dst, empty_file_name))
+                else:
+                    mkdirp(dst)
+
+            batches = [generic[i:i + _link_batch_size]
+                       for i in range(0, len(generic), _link_batch_size)]
+            pool.map(self._link_files, batches)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        # Packages that link their own way do so as in merge
+        for pkg, merge_map in custom:
+            pkg.add_files_to_view(self, merge_map)
+
+        for dst, owners in dir_owners.items():
+            if owners > 1 and not os.listdir(dst):
+                touch(os.path.join(dst, empty_file_name))
+
+        for spec, scan, (merge_map, shared) in zip(
+                to_merge, scans, merge_maps):
+            view_source, view_dst, dirs, _ = scan
+            if self.manifest is not None:
+                self.manifest.record(
+                    spec, view_source,
+                    files=dict((self._relpath(dst), src)
+                               for src, dst in merge_map.items()
+                               if os.path.lexists(dst)),
+                    dirs=[self._relpath(os.path.join(view_dst, d))
+                          for d in dirs],
+                    shared=[self._relpath(dst) for dst in shared])
+            self.link_meta_folder(spec)
+            if self.verbose:
+                tty.info(self._croot + 'Linked package: %s'
+                         % colorize_spec(spec))
         return True
 
+    def _scan_package(self, spec):
+        """Source and destination of spec in this view, and the directories
+        and files in its source, relative to it."""
+        pkg = spec.package
+        view_source = pkg.view_source()
+        ignore_file = match_predicate(self.layout.hidden_file_paths)
+        dirs, files = scan_tree(view_source, ignore_file)
+        return view_source, pkg.view_destination(self), dirs, files
+
+    def _link_files(self, pairs):
+        for src, dst in pairs:
+            self.link(src, dst)
+
     def merge(self, spec, ignore=None):
         pkg = spec.package
         view_source = pkg.view_source()
@@ -326,10 +557,42 @@ class YamlFilesystemView(FilesystemView):
         # merge directories with the tree
         tree.merge_directories(view_dst, ignore_file)
 
+        if self.manifest is None:
+            pkg.add_files_to_view(self, merge_map)
+            return
+
+        # Files of the package that are in the view are recorded, even
+        # those it shares with other packages: when it is removed, its
+        # remove_files_from_view decides which ones to keep. Those that
+        # were already there are recorded as shared.
+        shared = [self._relpath(dst) for dst in merge_map.values()
+                  if os.path.lexists(dst)]
         pkg.add_files_to_view(self, merge_map)
+        files = dict((self._relpath(dst), src)
+                     for src, dst in merge_map.items()
+                     if os.path.lexists(dst))
+        dirs = [self._relpath(dst) for src, dst in
+                traverse_tree(view_source, view_dst, ignore=ignore_file)
+                if os.path.isdir(src)]
+        self.manifest.record(spec, view_source, files=files, dirs=dirs,
+                             shared=[self._relpath(dst) for dst in shared])
 
     def unmerge(self, spec, ignore=None):
         pkg = spec.package
+        entry = self.manifest and self.manifest.entry(spec.dag_hash())
+        if entry:
+            # only the files recorded when spec was merged are removed
+            merge_map = {}
+            for rel, src in entry['files'].items():
+                dst = os.path.join(self._root, rel)
+                if os.path.lexists(dst):
+                    merge_map[src] = dst
+            pkg.remove_files_from_view(self, merge_map)
+            self._remove_directories(entry['dirs'])
+            self.manifest.record(spec, pkg.view_source(), files={}, dirs=[],
+                                 replace=True)
+            return
+
         view_source = pkg.view_source()
         view_dst = pkg.view_destination(self)
 
@@ -345,13 +608,35 @@ class YamlFilesystemView(FilesystemView):
         # now unmerge the directory tree
         tree.unmerge_directories(view_dst, ignore_file)
 
+    def _remove_directories(self, dirs):
+        """Remove the directories of the view (relative to its root) that
+        are left empty, deepest first, like ``LinkTree.unmerge`` does."""
+        for rel in sorted(set(dirs), reverse=True):
+            path = os.path.join(self._root, rel)
+            if path == self._root or os.path.islink(path) or \
+                    not os.path.isdir(path):
+                continue
+            if not os.listdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            marker = os.path.join(path, empty_file_name)
+            if os.path.exists(marker):
+                os.remove(marker)
+
     def remove_file(self, src, dest):
-        if not os.path.islink(dest):
+        if os.path.islink(dest):
+            # a link to src is removed even if src is gone, as is a copy of
+            # a link in the prefix (made by hardlink and copy views)
+            target = os.readlink(dest)
+            if target == src or (os.path.islink(src) and
+                                 os.readlink(src) == target):
+                os.remove(dest)
+                return
+        elif not os.path.isfile(dest):
             raise ValueError("%s is not a link tree!" % dest)
-        # remove if dest is a hardlink/symlink to src; this will only
-        # be false if two packages are merged into a prefix and have a
-        # conflicting file
-        if filecmp.cmp(src, dest, shallow=True):
+        # remove if dest is a hardlink/copy of src; this will only be false
+        # if two packages are merged into a prefix and have a conflicting
+        # file
+        if _is_view_file(src, dest):
             os.remove(dest)
 
     def check_added(self, spec):
@@ -405,10 +690,15 @@ class YamlFilesystemView(FilesystemView):
         remove_extension = ft.partial(self.remove_extension,
                                       with_dependents=with_dependents)
 
-        set(map(remove_extension, extensions))
-        set(map(self.remove_standalone, standalones))
+        try:
+            set(map(remove_extension, extensions))
+            set(map(self.remove_standalone, standalones))
+        finally:
+            self._save_manifest()
 
-        self._purge_empty_directories()
+        # with a manifest, directories are removed with the specs
+        if self.manifest is None:
+            self._purge_empty_directories()
 
     def remove_extension(self, spec, with_dependents=True):
         """
@@ -464,6 +754,12 @@ class YamlFilesystemView(FilesystemView):
         return self._root
 
     def get_all_specs(self):
+        if self.manifest is not None:
+            return self.manifest.specs()
+        return self._walk_all_specs()
+
+    def _walk_all_specs(self):
+        """Specs with a meta folder anywhere in the view."""
         md_dirs = []
         for root, dirs, files in os.walk(self._root):
             if spack.store.layout.metadata_dir in dirs:
@@ -511,6 +807,10 @@ class YamlFilesystemView(FilesystemView):
         # there should be no conflicts when linking the meta folder
         tree.merge(tgt, link=self.link)
 
+        if self.manifest is not None:
+            self.manifest.record(spec, spec.package.view_source(),
+                                 meta=self._relpath(tgt))
+
     def print_conflict(self, spec_active, spec_specified, level="error"):
         "Singular print function for spec conflicts."
         cprint = getattr(tty, level)
@@ -584,14 +884,73 @@ class YamlFilesystemView(FilesystemView):
         remove_dead_links(self._root)
 
     def clean(self):
-        self._purge_broken_links()
-        self._purge_empty_directories()
+        if self.manifest is None:
+            self._purge_broken_links()
+            self._purge_empty_directories()
+            return
+
+        # Links are broken when the prefix of their spec is gone, or when
+        # files were removed from it: only the recorded files are checked
+        try:
+            for h, record in list(self.manifest.index.items()):
+                if not os.path.exists(record['prefix']):
+                    self._remove_recorded(h)
+                else:
+                    self._remove_dead_links(h)
+        finally:
+            self._save_manifest()
+
+    def _remove_dead_links(self, h):
+        """Remove the links recorded for the spec with DAG hash h whose
+        target is gone."""
+        entry = self.manifest.entry(h)
+        if not entry:
+            return
+        dead = []
+        for rel in entry['files']:
+            path = os.path.join(self._root, rel)
+            if os.path.islink(path) and not os.path.exists(path):
+                os.remove(path)
+                dead.append(rel)
+        if dead:
+            self.manifest.forget_files(h, dead)
+            self._remove_directories(os.path.dirname(rel) for rel in dead)
+
+    def _remove_recorded(self, h):
+        """Remove the files of the spec with DAG hash h that the manifest
+        has, and its meta folder, without its package."""
+        entry = self.manifest.entry(h)
+        if entry:
+            shared = set(entry.get('shared', []))
+            for rel, src in entry['files'].items():
+                path = os.path.join(self._root, rel)
+                if os.path.islink(path):
+                    if os.readlink(path) == src or rel not in shared:
+                        os.remove(path)
+                elif rel not in shared and os.path.isfile(path) and (
+                        not os.path.exists(src) or
+                        _is_view_file(src, path)):
+                    # a hard link or copy this spec made
+                    os.remove(path)
+            if entry.get('meta'):
+                shutil.rmtree(os.path.join(self._root, entry['meta']),
+                              ignore_errors=True)
+                entry['dirs'].append(os.path.dirname(entry['meta']))
+            self._remove_directories(entry['dirs'])
+        self.manifest.remove(h)
+
+    def _save_manifest(self):
+        if self.manifest is not None:
+            self.manifest.save()
 
     def unlink_meta_folder(self, spec):
         path = self.get_path_meta_folder(spec)
         assert os.path.exists(path)
         shutil.rmtree(path)
 
+        if self.manifest is not None:
+            self.manifest.remove(spec.dag_hash())
+
     def _check_no_ext_conflicts(self, spec):
         """
             Check that there is no extension conflict for specs.
@@ -606,9 +965,236 @@ class YamlFilesystemView(FilesystemView):
                      'Skipping already activated package: %s' % spec.name)
 
 
+class ViewManifest(object):
+    """Record of what each spec added to a view, so that specs are added
+    and removed without walking the prefixes of the others.
+
+    The manifest is a directory in the view. ``index.json`` lists the specs
+    in the view by DAG hash, with their prefix, and ``<hash>.json`` has,
+    for each spec, the files of its prefix in the view (relative to the view
+    root) with the file they come from, the directories it was merged into,
+    and its meta folder.
+
+    Entries are written as soon as they change, and the index once per
+    change of the view (see :meth:`save`). Entries that are not in the
+    index, or the other way round, are reconciled when it is read.
+    """
+
+    #: version of the format of the files in the manifest
+    version = 1
+
+    def __init__(self, root):
+        self.path = os.path.join(root, _manifest_path)
+        self.index_path = os.path.join(self.path, 'index.json')
+        self._index = None
+        self._dirty = False
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    @property
+    def index(self):
+        """DAG hash -> dict with the ``spec`` (as a dict) and ``prefix``
+        of the specs in the view."""
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self):
+        index = {}
+        data = _read_json(self.index_path)
+        if data and data.get('version') == self.version:
+            index = data['specs']
+
+        hashes = set()
+        if os.path.isdir(self.path):
+            hashes = set(os.path.splitext(f)[0] for f in os.listdir(self.path)
+                         if f.endswith('.json') and f != 'index.json')
+        for h in set(index) - hashes:
+            del index[h]
+            self._dirty = True
+        for h in hashes - set(index):
+            entry = self.entry(h)
+            if entry:
+                index[h] = {'spec': entry['spec'], 'prefix': entry['prefix']}
+                self._dirty = True
+        return index
+
+    def specs(self):
+        return [spack.spec.Spec.from_dict(record['spec'])
+                for record in self.index.values()]
+
+    def _entry_path(self, h):
+        return os.path.join(self.path, h + '.json')
+
+    def entry(self, h):
+        """Files, directories and meta folder recorded for the spec with
+        DAG hash h, or None."""
+        entry = _read_json(self._entry_path(h))
+        if entry and entry.get('version') == self.version:
+            return entry
+        return None
+
+    def record(self, spec, prefix, files=None, dirs=None, meta=None,
+               shared=None, replace=False):
+        """Record files and directories that spec has in the view, or
+        with ``replace``, record them instead of those it had.
+
+        Args:
+            spec (Spec): spec whose files are in the view
+            prefix (str): directory the files of spec come from
+            files (dict): paths in the view, relative to its root, mapped
+                to the files of spec they come from
+            dirs (list): directories spec was merged into, relative to the
+                root of the view
+            meta (str): meta folder of spec, relative to the root
+            shared (list): paths in files that were in the view before spec
+        """
+        h = spec.dag_hash()
+        entry = self.entry(h)
+        if entry is None or replace:
+            entry = {'version': self.version,
+                     'spec': spec.to_dict(),
+                     'prefix': prefix,
+                     'files': {},
+                     'dirs': [],
+                     'shared': [],
+                     'meta': (entry or {}).get('meta')}
+        entry['files'].update(files or {})
+        entry['dirs'] = sorted(set(entry['dirs']).union(dirs or []))
+        entry['shared'] = sorted(
+            set(entry.get('shared', [])).union(shared or []))
+        entry['meta'] = meta or entry['meta']
+
+        _write_json(self._entry_path(h), entry)
+        self.index[h] = {'spec': entry['spec'], 'prefix': prefix}
+        self._dirty = True
+
+    def forget_files(self, h, files):
+        """Stop recording some files for the spec with DAG hash h."""
+        entry = self.entry(h)
+        if entry:
+            for rel in files:
+                entry['files'].pop(rel, None)
+            _write_json(self._entry_path(h), entry)
+
+    def remove(self, h):
+        if os.path.exists(self._entry_path(h)):
+            os.remove(self._entry_path(h))
+        self.index.pop(h, None)
+        self._dirty = True
+
+    def save(self, force=False):
+        """Write the index, if it changed."""
+        if self._dirty or force:
+            _write_json(self.index_path,
+                        {'version': self.version, 'specs': self.index})
+            self._dirty = False
+
+
 #####################
 # utility functions #
 #####################
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return sjson.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """Write data to path atomically."""
+    mkdirp(os.path.dirname(path))
+    tmp = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        sjson.dump(data, f)
+    os.rename(tmp, path)
+
+
+if hasattr(os, 'scandir'):
+    def _list_dir(path):
+        """(name, is a directory, is a link) for each entry of path."""
+        return [(e.name, e.is_dir(), e.is_symlink())
+                for e in os.scandir(path)]
+else:
+    def _list_dir(path):
+        """(name, is a directory, is a link) for each entry of path."""
+        entries = []
+        for name in os.listdir(path):
+            child = os.path.join(path, name)
+            entries.append(
+                (name, os.path.isdir(child), os.path.islink(child)))
+        return entries
+
+
+def scan_tree(root, ignore=None):
+    """Directories and files under root, relative to it, as
+    ``traverse_tree`` finds them, but with a single call to ``scandir``
+    per directory where it is available.
+
+    Links to directories are listed as directories, but not descended into.
+
+    Returns:
+        (tuple): list of directories, starting with ``''`` for root itself,
+            and list of files
+    """
+    ignore = ignore or (lambda f: False)
+    dirs, files = [''], []
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        for name, is_dir, is_link in _list_dir(os.path.join(root, rel_dir)):
+            rel = os.path.join(rel_dir, name)
+            if ignore(rel):
+                continue
+            if is_dir:
+                dirs.append(rel)
+                if not is_link:
+                    stack.append(rel)
+            else:
+                files.append(rel)
+    return dirs, files
+
+
+def adds_own_files(pkg):
+    """Whether pkg adds its files to views its own way, i.e. it overrides
+    ``add_files_to_view``, instead of linking all of them."""
+    from spack.package import PackageViewMixin
+    return _method(type(pkg), 'add_files_to_view') is not _method(
+        PackageViewMixin, 'add_files_to_view')
+
+
+def _method(cls, name):
+    """The function behind a method of cls, in Python 2 as in 3."""
+    method = getattr(cls, name)
+    return getattr(method, '__func__', method)
+
+
+def _links_to(src, dst):
+    """Whether the file dst in a view is a link to (or a copy of) src."""
+    if not os.path.lexists(dst):
+        return False
+    if os.path.islink(dst) and os.readlink(dst) == src:
+        return True
+    return _is_view_file(src, dst)
+
+
+def _is_view_file(src, dst):
+    """Whether the regular file dst in a view was added for src: a hard
+    link to it, or a copy of it.
+
+    Hard links are told by their inode. The content is only compared for
+    other files of the same size, which views may not know are copies.
+    """
+    try:
+        if os.path.samefile(src, dst):
+            return True
+        return filecmp.cmp(src, dst, shallow=False)
+    except OSError:
+        return False
+
+
 def get_spec_from_file(filename):
     try:
         with open(filename, "r") as f:
@@ -29,16 +29,40 @@ import spack.util.imp as simp
 from llnl.util.lang import memoized, list_modules
 
 
+@memoized
+def _load_hook_module(name):
+    mod_name = __name__ + '.' + name
+    path = os.path.join(spack.paths.hooks_path, name) + ".py"
+    return simp.load_source(mod_name, path)
+
+
 @memoized
 def all_hook_modules():
-    modules = []
-    for name in list_modules(spack.paths.hooks_path):
-        mod_name = __name__ + '.' + name
-        path = os.path.join(spack.paths.hooks_path, name) + ".py"
-        mod = simp.load_source(mod_name, path)
-        modules.append(mod)
+    return [_load_hook_module(name)
+            for name in list_modules(spack.paths.hooks_path)]
+
 
-    return modules
+#: Hooks defined by each module of this package. Only the modules that
+#: define a hook are loaded to run it: ``pre_run`` is run by every command,
+#: and loading all the hook modules would import most of Spack (and
+#: jinja2). Modules that are not listed here are loaded for every hook.
+module_hooks = {
+    'extensions': ('pre_uninstall',),
+    'licensing': ('pre_install', 'post_install'),
+    'module_file_generation': ('post_install', 'post_uninstall'),
+    'permissions_setters': ('post_install',),
+    'relocation_manifest': ('post_install',),
+    'sbang': ('post_install',),
+    'yaml_version_check': ('pre_run',),
+}
+
+
+@memoized
+def hook_modules(hook_name):
+    """Hook modules that may define a particular hook."""
+    return [_load_hook_module(name)
+            for name in list_modules(spack.paths.hooks_path)
+            if hook_name in module_hooks.get(name, (hook_name,))]
 
 
 class HookRunner(object):
@@ -47,7 +71,7 @@ class HookRunner(object):
         self.hook_name = hook_name
 
     def __call__(self, *args, **kwargs):
-        for module in all_hook_modules():
+        for module in hook_modules(self.hook_name):
             if hasattr(module, self.hook_name):
                 hook = getattr(module, self.hook_name)
                 if hasattr(hook, '__call__'):
@@ -3,19 +3,26 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import spack.config
 import spack.modules
 import spack.modules.common
 import llnl.util.tty as tty
 
-try:
-    enabled = spack.config.get('modules:enable')
-except KeyError:
-    tty.debug('NO MODULE WRITTEN: list of enabled module files is empty')
-    enabled = []
-
 
 def _for_each_enabled(spec, method_name):
-    """Calls a method for each enabled module"""
+    """Calls a method for each enabled module.
+
+    Module files are not written again if they were made from the same
+    spec, configuration and template (see
+    :meth:`~spack.modules.common.BaseModuleFileWriter.write`).
+    """
+    # Hook modules are loaded on first use, so the configuration is read
+    # here rather than when this module is loaded.
+    enabled = spack.config.get('modules:enable')
+    if not enabled:
+        tty.debug('NO MODULE WRITTEN: list of enabled module files is empty')
+        return
+
     for name in enabled:
         generator = spack.modules.module_types[name](spec)
         try:
@@ -0,0 +1,32 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.relocate
+import spack.store
+
+
+def post_install(spec):
+    """Record which files of the prefix need relocation, so that binary
+    packages of it are created without classifying every file again.
+
+    Only done if ``config:relocation_manifest`` is set: otherwise the
+    manifest is recorded the first time a binary package is created.
+    """
+    if not spack.config.get('config:relocation_manifest', False):
+        return
+
+    if spec.external:
+        tty.debug('SKIP: relocation manifest [external package]')
+        return
+
+    try:
+        spack.relocate.write_relocation_manifest(
+            spec.prefix, spack.store.layout.root)
+    except (IOError, OSError) as e:
+        tty.debug('Cannot write the relocation manifest of %s: %s' %
+                  (spec.prefix, e))
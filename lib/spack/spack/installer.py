@@ -0,0 +1,267 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Schedule the installation of a concrete DAG across a pool of workers.
+
+``PackageBase.do_install`` installs dependencies one at a time, in post
+order. The :class:`DagInstaller` in this module instead looks at the
+whole concrete DAG and installs every package whose dependencies are
+already in place, up to ``install_jobs`` packages at a time.
+
+Each package is installed in its own worker process, which calls
+``do_install(install_deps=False)`` on it. Workers therefore go through
+exactly the same code path as a serial install, including the
+per-prefix locks in :class:`~spack.database.Database` and the database
+write transactions, so concurrent ``spack install`` processes on the
+same store keep cooperating.
+
+The number of ``make`` jobs is treated as a global budget: it is split
+evenly among the packages that can be built at the same time.
+"""
+import multiprocessing
+import sys
+import time
+import traceback
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.error
+import spack.fetch_scheduler
+
+
+#: Seconds to sleep between two polls of the running workers
+poll_interval = 0.1
+
+
+def install_jobs(kwargs=None):
+    """Number of packages that may be installed concurrently.
+
+    Args:
+        kwargs (dict): keyword arguments given to ``do_install``. The
+            ``install_jobs`` entry, if present and not None, takes
+            precedence over ``config:install_jobs``.
+    """
+    jobs = (kwargs or {}).get('install_jobs')
+    if jobs is None:
+        jobs = spack.config.get('config:install_jobs', 1)
+    return max(1, jobs)
+
+
+def make_jobs_share(make_jobs, install_jobs):
+    """Split a global ``make`` job budget among concurrent installs.
+
+    Args:
+        make_jobs (int or None): total number of make jobs. If None, the
+            value of ``config:build_jobs`` is used.
+        install_jobs (int): number of packages built at the same time
+
+    Returns:
+        (int): number of make jobs each build may use (at least one)
+    """
+    if make_jobs is None:
+        make_jobs = spack.config.get(
+            'config:build_jobs', multiprocessing.cpu_count())
+    return max(1, make_jobs // max(1, install_jobs))
+
+
+def _install_worker(spec, kwargs, conn):
+    """Body of a worker process: install ``spec`` without its dependencies.
+
+    The outcome is sent back through ``conn``: None on success, or a
+    string describing the error on failure.
+    """
+    try:
+        spec.package.do_install(**kwargs)
+        conn.send(None)
+    except BaseException:
+        exc_type, exc, tb = sys.exc_info()
+        tty.debug(traceback.format_exc())
+        conn.send('%s: %s' % (exc_type.__name__, str(exc)))
+    finally:
+        conn.close()
+
+
+class DagInstaller(object):
+    """Install the dependencies of a concrete spec in parallel.
+
+    Packages are scheduled in topological order: a package is started as
+    soon as all of its dependencies have been installed. If a package
+    fails, packages that depend on it are skipped, but independent
+    packages are still installed; an :class:`ParallelInstallError` is
+    raised at the end listing every failure.
+    """
+
+    def __init__(self, spec, jobs, **kwargs):
+        """
+        Args:
+            spec (Spec): concrete spec whose dependencies are installed.
+                The root itself is NOT installed by this class.
+            jobs (int): maximum number of concurrent installs
+            **kwargs: arguments forwarded to ``do_install`` for each
+                dependency
+        """
+        if not spec.concrete:
+            raise ValueError('Can only install concrete specs: %s' % spec)
+
+        self.spec = spec
+        self.jobs = max(1, jobs)
+        self.kwargs = kwargs.copy()
+        self.kwargs['install_deps'] = False
+        self.kwargs['explicit'] = False
+        self.kwargs.pop('install_jobs', None)
+
+        #: dag hash -> spec of every dependency to be installed
+        self.specs = {}
+        #: dag hash -> set of dag hashes it is still waiting for
+        self.waiting_on = {}
+        #: dag hash -> set of dag hashes of its dependents
+        self.dependents = {}
+
+        for dep in spec.traverse(order='post', root=False):
+            h = dep.dag_hash()
+            self.specs[h] = dep
+            self.dependents.setdefault(h, set())
+            self.waiting_on[h] = set(
+                d.dag_hash() for d in dep.dependencies())
+            for d in dep.dependencies():
+                self.dependents.setdefault(d.dag_hash(), set()).add(h)
+
+        #: dag hash -> error message of failed installs
+        self.failed = {}
+        #: dag hashes of installs skipped because a dependency failed
+        self.skipped = set()
+        #: dag hashes of successful installs
+        self.installed = set()
+
+    def ready(self):
+        """Dependencies that are not installed yet, but whose own
+        dependencies all are, in a deterministic order."""
+        return sorted(
+            (h for h, deps in self.waiting_on.items() if not deps),
+            key=lambda h: (self.specs[h].name, h))
+
+    def _done(self, h):
+        """Mark ``h`` as installed and release its dependents."""
+        self.installed.add(h)
+        del self.waiting_on[h]
+        for d in self.dependents[h]:
+            if d in self.waiting_on:
+                self.waiting_on[d].discard(h)
+
+    def _fail(self, h, message):
+        """Mark ``h`` as failed, and skip everything that depends on it."""
+        self.failed[h] = message
+        del self.waiting_on[h]
+        stack = list(self.dependents[h])
+        while stack:
+            d = stack.pop()
+            if d in self.waiting_on:
+                del self.waiting_on[d]
+                self.skipped.add(d)
+                stack.extend(self.dependents[d])
+
+    def _needs_worker(self, spec):
+        """Whether installing ``spec`` requires a worker process.
+
+        Externals, upstream and already installed packages only need a
+        quick database update, which is done in this process.
+        """
+        pkg = spec.package
+        return not (spec.external or pkg.installed_upstream or pkg.installed)
+
+    def install(self):
+        """Install all the dependencies of the root spec."""
+        kwargs = self.kwargs.copy()
+        kwargs['make_jobs'] = make_jobs_share(
+            kwargs.get('make_jobs'), self.jobs)
+
+        # dag hash -> (process, parent end of the pipe)
+        running = {}
+        try:
+            self._schedule(kwargs, running)
+        finally:
+            # On errors and interrupts, don't leave builds running behind
+            for p, conn in running.values():
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+                conn.close()
+
+        if self.failed:
+            raise ParallelInstallError(self.spec, [
+                (self.specs[h], msg) for h, msg in sorted(
+                    self.failed.items(), key=lambda x: self.specs[x[0]].name)
+            ], [self.specs[h] for h in self.skipped])
+
+    def _schedule(self, kwargs, running):
+        """Start workers for the specs that are ready and wait for them,
+        until nothing else can be installed."""
+        while self.waiting_on or running:
+            for h in self.ready():
+                if len(running) >= self.jobs:
+                    break
+                if h in running:
+                    continue
+
+                spec = self.specs[h]
+                if not self._needs_worker(spec):
+                    try:
+                        spec.package.do_install(**self.kwargs)
+                        self._done(h)
+                    except spack.error.SpackError as e:
+                        self._fail(h, str(e))
+                    continue
+
+                # The build forks from this process: it must not start
+                # while its sources are being fetched in the background
+                spack.fetch_scheduler.wait_for_prefetch(spec)
+
+                parent_conn, child_conn = multiprocessing.Pipe(False)
+                p = multiprocessing.Process(
+                    target=_install_worker, args=(spec, kwargs, child_conn))
+                p.start()
+                child_conn.close()
+                running[h] = (p, parent_conn)
+
+            # If nothing is running, the loop above either made progress
+            # or there is nothing left that can be started.
+            if not running:
+                if not self.ready():
+                    break
+                continue
+
+            time.sleep(poll_interval)
+            for h, (p, conn) in list(running.items()):
+                if p.is_alive() and not conn.poll():
+                    continue
+
+                try:
+                    error = conn.recv()
+                except EOFError:
+                    error = 'worker exited without reporting a result'
+                p.join()
+                conn.close()
+                del running[h]
+
+                if error is None and p.exitcode == 0:
+                    self._done(h)
+                else:
+                    self._fail(h, error or 'exit code %s' % p.exitcode)
+
+
+class ParallelInstallError(spack.error.SpackError):
+    """Raised when some dependencies failed to install in parallel."""
+
+    def __init__(self, spec, failures, skipped):
+        super(ParallelInstallError, self).__init__(
+            'Failed to install %d dependencies of %s' % (
+                len(failures), spec.name),
+            '\n'.join(
+                ['%s: %s' % (s.cshort_spec, msg) for s, msg in failures] +
+                ['%s: skipped, a dependency failed' % s.cshort_spec
+                 for s in skipped]))
+        self.failures = failures
+        self.skipped = skipped
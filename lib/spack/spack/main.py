@@ -20,19 +20,16 @@ from six import StringIO
 
 import llnl.util.tty as tty
 import llnl.util.tty.color as color
-from llnl.util.tty.log import log_output
 
+# Only modules needed by every command are imported here. The others
+# (spack.cmd, spack.config, spack.environment, ...) are imported where
+# they are used, so that commands that don't need them, e.g. ``spack
+# --version`` or the ``spack commands`` call made by shell completion,
+# start quickly. See ``test/startup.py``.
 import spack
-import spack.architecture
-import spack.config
-import spack.cmd
-import spack.environment as ev
 import spack.hooks
 import spack.paths
-import spack.repo
-import spack.store
-import spack.util.debug
-import spack.util.path
+import spack.satisfies_cache
 from spack.error import SpackError
 
 
@@ -101,12 +98,14 @@ def set_working_dir():
 
 def add_all_commands(parser):
     """Add all spack subcommands to the parser."""
+    import spack.cmd
     for cmd in spack.cmd.all_commands():
         parser.add_command(cmd)
 
 
 def index_commands():
     """create an index of commands by section for this help level"""
+    import spack.cmd
     index = {}
     for command in spack.cmd.all_commands():
         cmd_module = spack.cmd.get_module(command)
@@ -156,6 +155,7 @@ class SpackArgumentParser(argparse.ArgumentParser):
             raise ValueError("level must be one of: %s" % levels)
 
         # lazily add all commands to the parser when needed.
+        import spack.cmd
         add_all_commands(self)
 
         """Print help on subcommands in neatly formatted sections."""
@@ -266,6 +266,8 @@ class SpackArgumentParser(argparse.ArgumentParser):
 
     def add_command(self, cmd_name):
         """Add one subcommand to this parser."""
+        import spack.cmd
+
         # lazily initialize any subparsers
         if not hasattr(self, 'subparsers'):
             # remove the dummy "command" argument.
@@ -395,9 +397,12 @@ def setup_main_options(args):
     tty.set_debug(args.debug)
     tty.set_stacktrace(args.stacktrace)
 
+    import spack.config
+
     # debug must be set first so that it can even affect behvaior of
     # errors raised by spack.config.
     if args.debug:
+        import spack.util.debug
         spack.error.debug = True
         spack.util.debug.register_interrupt_handler()
         spack.config.set('config:debug', True, scope='command_line')
@@ -407,10 +412,12 @@ def setup_main_options(args):
 
     # override lock configuration if passed on command line
     if args.locks is not None:
+        import spack.util.lock
         spack.util.lock.check_lock_safety(spack.paths.prefix)
         spack.config.set('config:locks', False, scope='command_line')
 
     if args.mock:
+        import spack.repo
         rp = spack.repo.RepoPath(spack.paths.mock_packages_path)
         spack.repo.set_path(rp)
 
@@ -486,6 +493,8 @@ class SpackCommand(object):
         is set in ``returncode`` property, and the error is set in the
         ``error`` property.  Otherwise, raise an error.
         """
+        from llnl.util.tty.log import log_output
+
         # set these before every call to clear them out
         self.returncode = None
         self.error = None
@@ -562,6 +571,10 @@ def print_setup_info(*info):
     invoke spack in login scripts, and it needs to be quick.
 
     """
+    import spack.architecture
+    import spack.config
+    import spack.util.path
+
     shell = 'csh' if 'csh' in info else 'sh'
 
     def shell_set(var, value):
@@ -603,6 +616,7 @@ def print_setup_info(*info):
     # print environment module system if available. This can be expensive
     # on clusters, so skip it if not needed.
     if 'modules' in info:
+        import spack.store
         specs = spack.store.db.query(
             'environment-modules arch=%s' % spack.architecture.sys_type())
         if specs:
@@ -611,6 +625,22 @@ def print_setup_info(*info):
             shell_set('_sp_module_prefix', 'not_installed')
 
 
+def find_environment(args):
+    """Find the environment to activate, like
+    ``spack.environment.find_environment()``.
+
+    ``spack.environment`` is only imported if an environment was
+    requested on the command line, with a ``spack.yaml`` file in the
+    current directory, or with ``SPACK_ENV``, as it is slow to import.
+    """
+    if not (args.env or args.env_dir or os.path.exists('spack.yaml') or
+            os.environ.get('SPACK_ENV')):
+        return None
+
+    import spack.environment as ev
+    return ev.find_environment(args)
+
+
 def main(argv=None):
     """This is the entry point for the Spack command.
 
@@ -626,15 +656,22 @@ def main(argv=None):
     parser.add_argument('command', nargs=argparse.REMAINDER)
     args, unknown = parser.parse_known_args(argv)
 
+    # -V does not need an environment or any configuration.
+    if args.version:
+        print(spack.spack_version)
+        return 0
+
     # activate an environment if one was specified on the command line
     if not args.no_env:
-        env = ev.find_environment(args)
+        env = find_environment(args)
         if env:
+            import spack.environment as ev
             ev.activate(env, args.use_env_repo)
 
     # make spack.config aware of any command line configuration scopes
     if args.config_scopes:
-        spack.config.command_line_scopes = args.config_scopes
+        import spack.config as config
+        config.command_line_scopes = args.config_scopes
 
     if args.print_shell_vars:
         print_setup_info(*args.print_shell_vars.split(','))
@@ -646,12 +683,9 @@ def main(argv=None):
         parser.print_help()
         return 1
 
-    # -h, -H, and -V are special as they do not require a command, but
-    # all the other options do nothing without a command.
-    if args.version:
-        print(spack.spack_version)
-        return 0
-    elif args.help:
+    # -h and -H are special as they do not require a command, but all
+    # the other options do nothing without a command.
+    if args.help:
         sys.stdout.write(parser.format_help(level=args.help))
         return 0
     elif not args.command:
@@ -709,6 +743,9 @@ def main(argv=None):
     except SystemExit as e:
         return e.code
 
+    finally:
+        spack.satisfies_cache.report()
+
 
 class SpackCommandError(Exception):
     """Raised when SpackCommand execution fails."""
@@ -18,6 +18,7 @@ from llnl.util.filesystem import mkdirp
 
 import spack.config
 import spack.error
+import spack.fetch_scheduler
 import spack.url as url
 import spack.fetch_strategy as fs
 from spack.spec import Spec
@@ -153,6 +154,8 @@ def create(path, specs, **kwargs):
     Keyword args:
         num_versions: Max number of versions to fetch per spec, \
             (default is 1 each spec)
+        jobs: Number of packages to fetch at the same time (default is \
+            the ``fetch_jobs`` setting in ``config.yaml``)
 
     Return Value:
         Returns a tuple of lists: (present, mirrored, error)
@@ -197,9 +200,12 @@ def create(path, specs, **kwargs):
     mirror_cache = spack.caches.MirrorCache(mirror_root)
     try:
         spack.caches.mirror_cache = mirror_cache
-        # Iterate through packages and download all safe tarballs for each
-        for spec in version_specs:
-            add_single_spec(spec, mirror_root, categories, **kwargs)
+        # Download all safe tarballs for each package
+        scheduler = spack.fetch_scheduler.FetchScheduler(kwargs.get('jobs'))
+        scheduler.fetch(
+            [s.package for s in version_specs],
+            lambda pkg: add_single_spec(
+                pkg.spec, mirror_root, categories, **kwargs))
     finally:
         spack.caches.mirror_cache = None
 
@@ -30,7 +30,9 @@ module type.
 """
 import copy
 import datetime
+import hashlib
 import inspect
+import json
 import os.path
 import re
 import collections
@@ -40,6 +42,7 @@ import llnl.util.filesystem
 import llnl.util.tty as tty
 
 import spack.paths
+import spack.spec
 import spack.build_environment as build_environment
 import spack.util.environment
 import spack.tengine as tengine
@@ -162,16 +165,16 @@ def merge_config_rules(configuration, spec):
         dict: actions to be taken on the spec passed as an argument
     """
 
-    # Get the top-level configuration for the module type we are using
-    module_specific_configuration = copy.deepcopy(configuration)
-
     # Construct a dictionary with the actions we need to perform on the spec
-    # passed as a parameter
+    # passed as a parameter. Only the actions that apply to the spec are
+    # copied, as they are merged into it.
 
     # The keyword 'all' is always evaluated first, all the others are
     # evaluated in order of appearance in the module file
-    spec_configuration = module_specific_configuration.pop('all', {})
-    for constraint, action in module_specific_configuration.items():
+    spec_configuration = copy.deepcopy(configuration.get('all', {}))
+    for constraint, action in configuration.items():
+        if constraint == 'all':
+            continue
         override = False
         if constraint.endswith(':'):
             constraint = constraint.strip(':')
@@ -179,7 +182,8 @@ def merge_config_rules(configuration, spec):
         if spec.satisfies(constraint, strict=True):
             if override:
                 spec_configuration = {}
-            update_dictionary_extending_lists(spec_configuration, action)
+            update_dictionary_extending_lists(
+                spec_configuration, copy.deepcopy(action))
 
     # Transform keywords for dependencies or prerequisites into a list of spec
 
@@ -196,10 +200,10 @@ def merge_config_rules(configuration, spec):
     # configuration
 
     # Hash length in module files
-    hash_length = module_specific_configuration.get('hash_length', 7)
+    hash_length = configuration.get('hash_length', 7)
     spec_configuration['hash_length'] = hash_length
 
-    verbose = module_specific_configuration.get('verbose', False)
+    verbose = configuration.get('verbose', False)
     spec_configuration['verbose'] = verbose
 
     return spec_configuration
@@ -233,6 +237,40 @@ def generate_module_index(root, modules):
         syaml.dump(index, index_file, default_flow_style=False)
 
 
+#: Last line of module files, with the digest of what they were made from
+_digest_line = re.compile(r'^\S+ spack-module-digest: ([0-9a-f]+)$')
+
+
+def read_digest(filename):
+    """Digest of the inputs recorded in a module file.
+
+    Returns:
+        (str or None): the digest, or None if the file does not exist or
+            has no digest
+    """
+    try:
+        with open(filename) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return None
+    match = lines and _digest_line.match(lines[-1])
+    return match.group(1) if match else None
+
+
+def _digest_value(obj):
+    """JSON-serializable value of the objects in the context of module
+    files, for their digest."""
+    if isinstance(obj, spack.spec.Spec):
+        return obj.dag_hash()
+    elif isinstance(obj, (spack.util.environment.NameModifier,
+                          spack.util.environment.NameValueModifier)):
+        return [type(obj).__name__, obj.name, getattr(obj, 'value', None),
+                getattr(obj, 'separator', None)]
+    elif isinstance(obj, (set, frozenset)):
+        return sorted(str(x) for x in obj)
+    return str(obj)
+
+
 ModuleIndexEntry = collections.namedtuple(
     'ModuleIndexEntry', ['path', 'use_name'])
 
@@ -636,6 +674,9 @@ class BaseContext(tengine.Context):
 
 
 class BaseModuleFileWriter(object):
+    #: Starts the comment that records the digest of the module file
+    comment = '#'
+
     def __init__(self, spec):
         self.spec = spec
 
@@ -677,38 +718,52 @@ class BaseModuleFileWriter(object):
         # ... and return the first match
         return choices.pop(0)
 
+    def digest(self, template, context):
+        """Digest of what the module file is made from: the rules of
+        ``modules.yaml`` that apply to it, the template, and the whole
+        context it is rendered with (except for the time), which has the
+        spec, the environment modifications and the names of the modules
+        of its dependencies.
+
+        Args:
+            template: template the module file is rendered with
+            context (dict): context the template is rendered with
+        """
+        options = dict(
+            (key, value) for key, value in self.module.configuration.items()
+            if not isinstance(value, dict))
+        context = dict(
+            (key, value) for key, value in context.items()
+            if key != 'timestamp')
+
+        sha = hashlib.sha256()
+        sha.update(json.dumps(
+            [self.conf.conf, options, template.name, context],
+            sort_keys=True, default=_digest_value).encode('utf-8'))
+        env = template.environment
+        source = env.loader.get_source(env, template.name)[0]
+        sha.update(source.encode('utf-8'))
+        return sha.hexdigest()
+
     def write(self, overwrite=False):
         """Writes the module file.
 
+        Module files record the digest of what they are made from, and are
+        not written again while it does not change.
+
         Args:
             overwrite (bool): if True it is fine to overwrite an already
                 existing file. If False the operation is skipped an we print
                 a warning to the user.
+
+        Returns:
+            (bool): whether the module file was written
         """
         # Return immediately if the module is blacklisted
         if self.conf.blacklisted:
             msg = '\tNOT WRITING: {0} [BLACKLISTED]'
             tty.debug(msg.format(self.spec.cshort_spec))
-            return
-
-        # Print a warning in case I am accidentally overwriting
-        # a module file that is already there (name clash)
-        if not overwrite and os.path.exists(self.layout.filename):
-            message = 'Module file already exists : skipping creation\n'
-            message += 'file : {0.filename}\n'
-            message += 'spec : {0.spec}'
-            tty.warn(message.format(self.layout))
-            return
-
-        # If we are here it means it's ok to write the module file
-        msg = '\tWRITE: {0} [{1}]'
-        tty.debug(msg.format(self.spec.cshort_spec, self.layout.filename))
-
-        # If the directory where the module should reside does not exist
-        # create it
-        module_dir = os.path.dirname(self.layout.filename)
-        if not os.path.exists(module_dir):
-            llnl.util.filesystem.mkdirp(module_dir)
+            return False
 
         # Get the template for the module
         template_name = self._get_template()
@@ -740,11 +795,41 @@ class BaseModuleFileWriter(object):
         conf_update = self.conf.context
         context.update(conf_update)
 
+        # Skip module files made from the same inputs
+        digest = self.digest(template, context)
+        if read_digest(self.layout.filename) == digest:
+            msg = '\tNOT WRITING: {0} [UP TO DATE]'
+            tty.debug(msg.format(self.spec.cshort_spec))
+            return False
+
+        # Print a warning in case I am accidentally overwriting
+        # a module file that is already there (name clash)
+        if not overwrite and os.path.exists(self.layout.filename):
+            message = 'Module file already exists : skipping creation\n'
+            message += 'file : {0.filename}\n'
+            message += 'spec : {0.spec}'
+            tty.warn(message.format(self.layout))
+            return False
+
+        # If we are here it means it's ok to write the module file
+        msg = '\tWRITE: {0} [{1}]'
+        tty.debug(msg.format(self.spec.cshort_spec, self.layout.filename))
+
+        # If the directory where the module should reside does not exist
+        # create it
+        module_dir = os.path.dirname(self.layout.filename)
+        if not os.path.exists(module_dir):
+            llnl.util.filesystem.mkdirp(module_dir)
+
         # Render the template
         text = template.render(context)
+        if not text.endswith('\n'):
+            text += '\n'
+        text += '{0} spack-module-digest: {1}\n'.format(self.comment, digest)
         # Write it to file
         with open(self.layout.filename, 'w') as f:
             f.write(text)
+        return True
 
     def remove(self):
         """Deletes the module file."""
@@ -427,6 +427,7 @@ class LmodContext(BaseContext):
 class LmodModulefileWriter(BaseModuleFileWriter):
     """Writer class for lmod module files."""
     default_template = os.path.join('modules', 'modulefile.lua')
+    comment = '--'
 
 
 class CoreCompilersNotFoundError(spack.error.SpackError, KeyError):
@@ -38,7 +38,9 @@ import spack.directives
 import spack.directory_layout
 import spack.error
 import spack.fetch_strategy as fs
+import spack.fetch_scheduler
 import spack.hooks
+import spack.installer
 import spack.mirror
 import spack.mixins
 import spack.repo
@@ -1382,6 +1384,10 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
             use_cache (bool): Install from binary package, if available.
             stop_at (InstallPhase): last installation phase to be executed
                 (or None)
+            install_jobs (int): Number of dependencies that may be installed
+                concurrently. Default is the ``install_jobs`` setting in
+                ``config.yaml``, or 1. The ``make_jobs`` budget is split
+                among concurrent builds.
         """
         if not self.spec.concrete:
             raise ValueError("Can only install concrete packages: %s."
@@ -1434,22 +1440,47 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
 
         self._do_install_pop_kwargs(kwargs)
 
+        # Sources of the packages to build are fetched in the background
+        # while the dependencies are installed.
+        prefetch = []
+        if install_deps and not (fake or restage) and spack.config.get(
+                'config:install_prefetch', False):
+            prefetch = spack.fetch_scheduler.packages_to_prefetch(
+                self.spec, kwargs.get('use_cache', True))
+
         # First, install dependencies recursively.
-        if install_deps:
-            tty.debug('Installing {0} dependencies'.format(self.name))
-            dep_kwargs = kwargs.copy()
-            dep_kwargs['explicit'] = False
-            dep_kwargs['install_deps'] = False
-            for dep in self.spec.traverse(order='post', root=False):
-                if spack.config.get('config:install_missing_compilers', False):
-                    tty.debug('Bootstrapping {0} compiler for {1}'.format(
-                        self.spec.compiler, self.name
-                    ))
-                    comp_kwargs = kwargs.copy()
-                    comp_kwargs['explicit'] = False
-                    comp_kwargs['install_deps'] = True
-                    dep.package.bootstrap_compiler(**comp_kwargs)
-                dep.package.do_install(**dep_kwargs)
+        with spack.fetch_scheduler.prefetch(prefetch):
+            install_jobs = spack.installer.install_jobs(kwargs)
+            missing_compilers = spack.config.get(
+                'config:install_missing_compilers', False)
+            if install_deps and install_jobs > 1 and missing_compilers:
+                tty.warn('Installing {0} dependencies one at a time: {1} '
+                         'jobs are not supported with '
+                         'install_missing_compilers'.format(
+                             self.name, install_jobs))
+            if install_deps and install_jobs > 1 and not missing_compilers:
+                tty.debug('Installing {0} dependencies with {1} jobs'.format(
+                    self.name, install_jobs))
+                spack.installer.DagInstaller(
+                    self.spec, install_jobs, **kwargs).install()
+
+            elif install_deps:
+                tty.debug('Installing {0} dependencies'.format(self.name))
+                dep_kwargs = kwargs.copy()
+                dep_kwargs['explicit'] = False
+                dep_kwargs['install_deps'] = False
+                for dep in self.spec.traverse(order='post', root=False):
+                    if missing_compilers:
+                        tty.debug('Bootstrapping {0} compiler for {1}'.format(
+                            self.spec.compiler, self.name
+                        ))
+                        comp_kwargs = kwargs.copy()
+                        comp_kwargs['explicit'] = False
+                        comp_kwargs['install_deps'] = True
+                        dep.package.bootstrap_compiler(**comp_kwargs)
+                    dep.package.do_install(**dep_kwargs)
+
+            spack.fetch_scheduler.wait_for_prefetch(self.spec)
 
         # Then, install the package proper
         tty.msg(colorize('@*{Installing} @*g{%s}' % self.name))
@@ -1580,6 +1611,7 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
                     os.chmod(self.prefix, perms)
 
             # Fork a child to do the actual installation
+            spack.fetch_scheduler.wait_for_prefetch(self.spec)
             # we preserve verbosity settings across installs.
             PackageBase._verbose = spack.build_environment.fork(
                 self, build_process, dirty=dirty, fake=fake)
@@ -0,0 +1,283 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Static package metadata that can be queried without importing packages.
+
+Directives (``version``, ``depends_on``, ``variant``, ``provides``,
+``conflicts``, ``patch``, ``resource``, ``extends``) and a few class
+attributes only *describe* a package. This module serializes that
+description for every package in a repository, so that commands that
+only read it (``spack dependents``, ``spack list``, ``spack url
+summary``, ...) do not have to execute thousands of ``package.py``
+files. The index is stored in the misc cache and updated like the other
+repository indexes: only packages whose file is newer than the index are
+imported again.
+
+Packages are still imported to be concretized or built.
+"""
+import re
+import textwrap
+
+from six import StringIO, string_types
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import spack.spec
+import spack.dependency
+import spack.util.spack_json as sjson
+import spack.variant
+import spack.version
+
+
+#: Class attributes stored as they are in the metadata
+_class_attributes = (
+    'homepage', 'url', 'urls', 'list_url', 'list_depth', 'git', 'hg', 'svn',
+    'tags', 'extendable')
+
+
+def _jsonable(value):
+    """Convert a value to something JSON can represent faithfully, or to
+    its string representation otherwise."""
+    if value is None or isinstance(value, (bool, int, float, string_types)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return dict((str(k), _jsonable(v)) for k, v in value.items())
+    return str(value)
+
+
+def metadata_dict(pkg_cls):
+    """Serialize the static metadata of a package class.
+
+    Args:
+        pkg_cls (type): package class, as returned by ``get_pkg_class()``
+
+    Returns:
+        (dict): JSON-compatible description of the package
+    """
+    d = {
+        'name': pkg_cls.name,
+        'namespace': pkg_cls.namespace,
+        'doc': pkg_cls.__doc__,
+    }
+    for attr in _class_attributes:
+        d[attr] = _jsonable(getattr(pkg_cls, attr, None))
+
+    d['versions'] = [
+        [str(v), _jsonable(kwargs)] for v, kwargs in pkg_cls.versions.items()]
+
+    d['dependencies'] = [
+        [name, str(when), str(dep.spec), sorted(dep.type),
+         [p.sha256 for pl in dep.patches.values() for p in pl]]
+        for name, conditions in pkg_cls.dependencies.items()
+        for when, dep in conditions.items()]
+
+    d['variants'] = []
+    for name, variant in pkg_cls.variants.items():
+        values = variant.values
+        if values is not None:
+            values = _jsonable(list(values))
+        d['variants'].append([name, {
+            'default': _jsonable(variant.default),
+            'description': variant.description,
+            'values': values,
+            'multi': variant.multi}])
+
+    d['provided'] = [
+        [str(provided), sorted(str(w) for w in whens)]
+        for provided, whens in pkg_cls.provided.items()]
+
+    d['conflicts'] = [
+        [str(conflict), str(when), msg]
+        for conflict, conditions in pkg_cls.conflicts.items()
+        for when, msg in conditions]
+
+    d['patches'] = [
+        [str(when), [p.sha256 for p in patches]]
+        for when, patches in pkg_cls.patches.items()]
+
+    d['resources'] = [
+        [str(when), [{'name': r.name,
+                      'destination': r.destination,
+                      'placement': _jsonable(r.placement),
+                      'url': getattr(r.fetcher, 'url', None)}
+                     for r in resources]]
+        for when, resources in pkg_cls.resources.items()]
+
+    d['extendees'] = [
+        [name, str(spec), _jsonable(kwargs)]
+        for name, (spec, kwargs) in pkg_cls.extendees.items()]
+
+    return d
+
+
+class _LazyDict(Mapping):
+    """Read-only mapping whose values are computed on first access."""
+
+    def __init__(self, keys, compute):
+        self._keys = keys
+        self._compute = compute
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._values[key] = self._compute(key)
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class PackageMetadata(object):
+    """Read-only view of the static metadata of a package.
+
+    It has the same class-level attributes as the package it describes,
+    except for ``patches`` and ``resources``, which are summaries: lists
+    of sha256 sums of the patches (see ``spack.patch.PatchCache``) and
+    dicts with the name, destination, placement and URL of the
+    resources, respectively. Directive dictionaries are built lazily.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self.name = data['name']
+        self.namespace = data['namespace']
+        self.__doc__ = data['doc']
+        for attr in _class_attributes:
+            setattr(self, attr, data.get(attr))
+
+    @property
+    def fullname(self):
+        return '%s.%s' % (self.namespace, self.name)
+
+    @property
+    def versions(self):
+        return dict((spack.version.Version(v), kwargs)
+                    for v, kwargs in self._data['versions'])
+
+    @property
+    def dependencies(self):
+        entries = {}
+        for entry in self._data['dependencies']:
+            entries.setdefault(entry[0], []).append(entry)
+
+        def conditions(name):
+            return dict(
+                (spack.spec.Spec(when), spack.dependency.Dependency(
+                    self, spack.spec.Spec(spec), type=tuple(deptypes)))
+                for _, when, spec, deptypes, _ in entries[name])
+
+        # Parsing specs is slow, and many callers only need the names
+        return _LazyDict(entries, conditions)
+
+    @property
+    def variants(self):
+        variants = {}
+        for name, v in self._data['variants']:
+            # validators that are functions can't be serialized
+            values = v['values']
+            if values is None:
+                values = lambda x: True
+            variants[name] = spack.variant.Variant(
+                name, v['default'], v['description'], values, v['multi'])
+        return variants
+
+    @property
+    def provided(self):
+        return dict(
+            (spack.spec.Spec(p), set(spack.spec.Spec(w) for w in whens))
+            for p, whens in self._data['provided'])
+
+    @property
+    def conflicts(self):
+        conflicts = {}
+        for conflict, when, msg in self._data['conflicts']:
+            conflicts.setdefault(conflict, []).append(
+                (spack.spec.Spec(when), msg))
+        return conflicts
+
+    @property
+    def patches(self):
+        return dict(
+            (spack.spec.Spec(when), shas)
+            for when, shas in self._data['patches'])
+
+    @property
+    def resources(self):
+        return dict(
+            (spack.spec.Spec(when), resources)
+            for when, resources in self._data['resources'])
+
+    @property
+    def extendees(self):
+        return dict(
+            (name, (spack.spec.Spec(spec), kwargs))
+            for name, spec, kwargs in self._data['extendees'])
+
+    def dependencies_of_type(self, *deptypes):
+        """Names of dependencies that can possibly have these deptypes."""
+        return set(
+            name for name, _, _, types, _ in self._data['dependencies']
+            if any(dt in types for dt in deptypes))
+
+    def format_doc(self, **kwargs):
+        """Wrap doc string at 72 characters and format nicely"""
+        indent = kwargs.get('indent', 0)
+
+        if not self.__doc__:
+            return ""
+
+        doc = re.sub(r'\s+', ' ', self.__doc__)
+        lines = textwrap.wrap(doc, 72)
+        results = StringIO()
+        for line in lines:
+            results.write((" " * indent) + line + "\n")
+        return results.getvalue()
+
+    def __str__(self):
+        return self.fullname
+
+    def __repr__(self):
+        return 'PackageMetadata(%s)' % self.fullname
+
+
+class PackageMetadataIndex(object):
+    """Index of the static metadata of the packages in a repository."""
+
+    def __init__(self, data=None):
+        #: package name -> result of ``metadata_dict()``
+        self.packages = data or {}
+
+    @classmethod
+    def from_json(cls, stream):
+        d = sjson.load(stream)
+        return PackageMetadataIndex(d['packages'])
+
+    def to_json(self, stream):
+        sjson.dump({'packages': self.packages}, stream)
+
+    def get(self, pkg_name):
+        """Return the ``PackageMetadata`` of a package, or None."""
+        data = self.packages.get(pkg_name)
+        return PackageMetadata(data) if data is not None else None
+
+    def update_package(self, pkg_cls):
+        """Store the metadata of a package class, replacing the old one."""
+        self.packages[pkg_cls.name] = metadata_dict(pkg_cls)
+
+    def __contains__(self, pkg_name):
+        return pkg_name in self.packages
+
+    def __len__(self):
+        return len(self.packages)
@@ -319,6 +319,14 @@ class PatchCache(object):
         return from_dict(patch_dict)
 
     def update_package(self, pkg_fullname):
+        self.remove_package(pkg_fullname)
+
+        # update the index with per-package patch indexes
+        pkg = spack.repo.get(pkg_fullname)
+        self.update(PatchCache({'patches': self.package_index(pkg)}))
+
+    def remove_package(self, pkg_fullname):
+        """Remove the patches owned by a package from the index."""
         # remove this package from any patch entries that reference it.
         empty = []
         for sha256, package_to_patch in self.index.items():
@@ -337,13 +345,6 @@ class PatchCache(object):
         for sha256 in empty:
             del self.index[sha256]
 
-        # update the index with per-package patch indexes
-        pkg = spack.repo.get(pkg_fullname)
-        partial_index = self._index_patches(pkg)
-        for sha256, package_to_patch in partial_index.items():
-            p2p = self.index.setdefault(sha256, {})
-            p2p.update(package_to_patch)
-
     def update(self, other):
         """Update this cache with the contents of another."""
         for sha256, package_to_patch in other.index.items():
@@ -351,7 +352,9 @@ class PatchCache(object):
             p2p.update(package_to_patch)
 
     @staticmethod
-    def _index_patches(pkg_class):
+    def package_index(pkg_class):
+        """Index of the patches owned by a single package, in the same
+        format as ``self.index``."""
         index = {}
 
         # Add patches from the class
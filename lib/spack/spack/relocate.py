@@ -4,13 +4,20 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 
+import hashlib
+import json
+import mmap
+import multiprocessing
+import multiprocessing.pool
 import os
 import platform
 import re
+from contextlib import closing
 import spack.repo
 import spack.cmd
+import spack.store
 import llnl.util.lang
-import llnl.util.filesystem as fs
+import spack.util.elf as elf
 from spack.util.executable import Executable, ProcessError
 import llnl.util.tty as tty
 
@@ -50,10 +57,15 @@ def get_patchelf():
 
 def get_existing_elf_rpaths(path_name):
     """
-    Return the RPATHS returned by patchelf --print-rpath path_name
-    as a list of strings.
+    Return the RPATHS of the ELF file path_name as a list of strings.
+    Uses patchelf --print-rpath if Spack can't read the file itself.
     """
     if platform.system() == 'Linux':
+        try:
+            return elf.get_rpaths(path_name)
+        except elf.ElfParsingError as e:
+            tty.debug('Cannot read the RPATH of %s: %s' % (path_name, e))
+
         patchelf = Executable(get_patchelf())
         try:
             output = patchelf('--print-rpath', '%s' %
@@ -242,21 +254,37 @@ def modify_macho_object(cur_path, rpaths, deps, idpath,
     return
 
 
-def strings_contains_installroot(path_name, root_dir):
+def strings_contains_installroot(path_name, root_dir, block_size=1 << 20):
     """
     Check if the file contain the install root string.
     """
-    strings = Executable('strings')
-    output = strings('%s' % path_name,
-                     output=str, err=str)
-    return (root_dir in output)
+    root = root_dir.encode('utf-8')
+    with open(path_name, 'rb') as f:
+        # keep the end of the previous blocks, in case root spans several
+        tail = b''
+        block = f.read(block_size)
+        while block:
+            data = tail + block
+            if root in data:
+                return True
+            tail = data[-(len(root) - 1):] if len(root) > 1 else b''
+            block = f.read(block_size)
+    return False
 
 
 def modify_elf_object(path_name, new_rpaths):
     """
-    Replace orig_rpath with new_rpath in RPATH of elf object path_name
+    Replace orig_rpath with new_rpath in RPATH of elf object path_name.
+    The RPATH is rewritten in place when the new one is not longer,
+    otherwise patchelf does it.
     """
     if platform.system() == 'Linux':
+        try:
+            if elf.set_rpaths(path_name, new_rpaths):
+                return
+        except elf.ElfParsingError as e:
+            tty.debug('Cannot set the RPATH of %s: %s' % (path_name, e))
+
         new_joined = ':'.join(new_rpaths)
         patchelf = Executable(get_patchelf())
         try:
@@ -438,11 +466,85 @@ def relocate_links(path_names, old_dir, new_dir):
         os.symlink(new_src, path_name)
 
 
+class TextRelocator(object):
+    """Replaces several prefixes in text files, in a single pass.
+
+    All the old prefixes are matched by one regular expression, so each
+    file is scanned once however many prefixes there are.  Files without
+    any of them are not written.
+    """
+
+    def __init__(self, prefixes):
+        """Create a relocator for a dict mapping old prefixes to new ones.
+        """
+        self.prefixes = dict(
+            (_to_bytes(old), _to_bytes(new))
+            for old, new in prefixes.items() if old != new)
+
+        self.regex = None
+        if self.prefixes:
+            # longest first, so that a prefix wins over its parents
+            old_prefixes = sorted(self.prefixes, key=len, reverse=True)
+            self.regex = re.compile(
+                b'|'.join(re.escape(p) for p in old_prefixes))
+
+    def _replace(self, match):
+        return self.prefixes[match.group(0)]
+
+    def relocate_data(self, data):
+        """Return the bytes data with all the prefixes replaced."""
+        if self.regex is None:
+            return data
+        return self.regex.sub(self._replace, data)
+
+    def relocate_file(self, path):
+        """Replace the prefixes in a file. Return whether it changed."""
+        if self.regex is None:
+            return False
+
+        with open(path, 'rb') as f:
+            # scan the file without reading it in memory first
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with closing(mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+                if not self.regex.search(data):
+                    return False
+            data = f.read()
+
+        tty.debug('Relocating text in %s' % path)
+        with open(path, 'wb') as f:
+            f.write(self.relocate_data(data))
+        return True
+
+    def relocate_files(self, paths, jobs=None):
+        """Replace the prefixes in files, using ``jobs`` threads (by
+        default, one per core). Return the files that changed."""
+        paths = list(paths)
+        jobs = min(jobs or multiprocessing.cpu_count(), len(paths))
+        if jobs <= 1:
+            changed = [self.relocate_file(p) for p in paths]
+        else:
+            pool = multiprocessing.pool.ThreadPool(jobs)
+            try:
+                changed = pool.map(self.relocate_file, paths)
+            finally:
+                pool.terminate()
+                pool.join()
+        return [p for p, c in zip(paths, changed) if c]
+
+
+def _to_bytes(string):
+    if isinstance(string, bytes):
+        return string
+    return string.encode('utf-8')
+
+
 def relocate_text(path_names, old_dir, new_dir):
     """
     Replace old path with new path in text file path_name
     """
-    fs.filter_file('%s' % old_dir, '%s' % new_dir, *path_names, backup=False)
+    TextRelocator({old_dir: new_dir}).relocate_files(path_names)
 
 
 def substitute_rpath(orig_rpath, topdir, new_root_path):
@@ -515,7 +617,6 @@ def file_is_relocatable(file):
         raise ValueError('{0} is not an absolute path'.format(file))
 
     strings = Executable('strings')
-    patchelf = Executable(get_patchelf())
 
     # Remove the RPATHS from the strings in the executable
     set_of_strings = set(strings(file, output=str).split())
@@ -526,8 +627,8 @@ def file_is_relocatable(file):
 
     if platform.system().lower() == 'linux':
         if m_subtype == 'x-executable' or m_subtype == 'x-sharedlib':
-            rpaths = patchelf('--print-rpath', file, output=str).strip()
-            set_of_strings.discard(rpaths.strip())
+            rpaths = ':'.join(get_existing_elf_rpaths(file))
+            set_of_strings.discard(rpaths)
     if platform.system().lower() == 'darwin':
         if m_subtype == 'x-mach-binary':
             rpaths, deps, idpath  = macho_get_paths(file)
@@ -576,7 +677,164 @@ def mime_type(file):
     Returns:
         Tuple containing the MIME type and subtype
     """
+    # ELF files are common in prefixes, and easy to recognize
+    if os.path.isfile(file) and not os.path.islink(file):
+        elf_subtype = elf.mime_subtype(file)
+        if elf_subtype:
+            return 'application', elf_subtype
+
     file_cmd = Executable('file')
     output = file_cmd('-b', '-h', '--mime-type', file, output=str, error=str)
     tty.debug('[MIME_TYPE] {0} -> {1}'.format(file, output.strip()))
     return tuple(output.strip().split('/'))
+
+
+#: Name of the relocation manifest in the metadata directory of a prefix
+relocation_manifest_name = 'relocation_manifest.json'
+
+#: Version of the relocation manifest format
+_manifest_version = 2
+
+#: Directories of a prefix that are never relocated
+_manifest_blacklist = ('.spack', 'man')
+
+
+def relocation_manifest_path(prefix):
+    """Path of the relocation manifest of an installation prefix."""
+    return os.path.join(prefix, spack.store.layout.metadata_dir,
+                        relocation_manifest_name)
+
+
+def _prefix_files(prefix):
+    """Relative paths of the files to relocate in a prefix, and the
+    latest modification time among them."""
+    paths = []
+    mtime = 0
+    for root, dirs, files in os.walk(prefix, topdown=True):
+        dirs[:] = [d for d in dirs if d not in _manifest_blacklist]
+        for filename in files:
+            path_name = os.path.join(root, filename)
+            paths.append(os.path.relpath(path_name, prefix))
+            mtime = max(mtime, os.lstat(path_name).st_mtime)
+    return sorted(paths), mtime
+
+
+def _files_digest(paths):
+    return hashlib.sha1('\n'.join(paths).encode('utf-8')).hexdigest()
+
+
+def contains_install_root(path_name, root_dir):
+    """Whether root_dir occurs in a file. Stops at the first occurrence."""
+    with open(path_name, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as m:
+            return m.find(_to_bytes(root_dir)) >= 0
+
+
+def compute_relocation_manifest(prefix, install_root=None):
+    """Classify the files of an installation prefix for relocation.
+
+    Only the files that contain the install root are classified, so
+    ``file`` is run on few of them.
+
+    Returns:
+        (dict): the manifest, with the binaries that need their RPATHs
+            relocated, the text files that contain the install root, and
+            the absolute symbolic links into the install root
+    """
+    install_root = install_root or spack.store.layout.root
+    paths, _ = _prefix_files(prefix)
+
+    binaries = []
+    textfiles = []
+    links = []
+    for rel_path_name in paths:
+        path_name = os.path.join(prefix, rel_path_name)
+        if os.path.islink(path_name):
+            link = os.readlink(path_name)
+            if os.path.isabs(link):
+                # Relocate absolute links into the spack tree
+                if link.startswith(install_root):
+                    links.append(rel_path_name)
+                else:
+                    msg = 'Absolute link %s to %s ' % (path_name, link)
+                    msg += 'outside of stage %s ' % prefix
+                    msg += 'cannot be relocated.'
+                    tty.warn(msg)
+            continue
+
+        if not contains_install_root(path_name, install_root):
+            continue
+        m_type, m_subtype = mime_type(path_name)
+        if needs_binary_relocation(m_type, m_subtype):
+            binaries.append(rel_path_name)
+        elif needs_text_relocation(m_type, m_subtype):
+            textfiles.append(rel_path_name)
+
+    return {
+        'version': _manifest_version,
+        'install_root': install_root,
+        'files': _files_digest(paths),
+        'binaries': binaries,
+        'textfiles': textfiles,
+        'links': links,
+    }
+
+
+def write_relocation_manifest(prefix, install_root=None):
+    """Compute the relocation manifest of a prefix and write it in its
+    metadata directory.  Return the manifest."""
+    manifest = compute_relocation_manifest(prefix, install_root)
+    path = relocation_manifest_path(prefix)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'relocation_manifest': manifest}, f,
+                  sort_keys=True, separators=(',', ':'))
+    os.rename(tmp_path, path)
+    return manifest
+
+
+def read_relocation_manifest(prefix, install_root=None):
+    """Read the relocation manifest of a prefix, if it is up to date.
+
+    The manifest is out of date when files were added, removed or
+    modified in the prefix since it was written, or when it was written
+    for another install root.
+
+    Returns:
+        (dict): the manifest, or None if there is no up to date manifest
+    """
+    install_root = install_root or spack.store.layout.root
+    path = relocation_manifest_path(prefix)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)['relocation_manifest']
+        written = os.stat(path).st_mtime
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if manifest.get('version') != _manifest_version or \
+            manifest.get('install_root') != install_root:
+        return None
+
+    paths, mtime = _prefix_files(prefix)
+    if manifest.get('files') != _files_digest(paths) or mtime > written:
+        tty.debug('Relocation manifest of %s is out of date' % prefix)
+        return None
+    return manifest
+
+
+def relocation_manifest(prefix, install_root=None):
+    """The relocation manifest of a prefix: the recorded one if it is up
+    to date, otherwise a freshly computed one, recorded for next time if
+    the prefix is writable."""
+    manifest = read_relocation_manifest(prefix, install_root)
+    if manifest:
+        return manifest
+    try:
+        return write_relocation_manifest(prefix, install_root)
+    except (IOError, OSError) as e:
+        tty.debug('Cannot write the relocation manifest of %s: %s' %
+                  (prefix, e))
+        return compute_relocation_manifest(prefix, install_root)
@@ -34,7 +34,9 @@ from llnl.util.filesystem import mkdirp, install
 import spack.config
 import spack.caches
 import spack.error
+import spack.package_metadata
 import spack.patch
+import spack.paths
 import spack.spec
 import spack.util.spack_json as sjson
 import spack.util.imp as simp
@@ -230,15 +232,28 @@ class TagIndex(Mapping):
 
         """
         package = path.get(pkg_name)
+        self.remove_package(package.name)
+        self.add_package(package.name, getattr(package, 'tags', []))
 
-        # Remove the package from the list of packages, if present
+    def remove_package(self, pkg_name):
+        """Remove a package from the list of packages of every tag.
+
+        Args:
+            pkg_name (str): name of the package, without namespace
+        """
         for pkg_list in self._tag_dict.values():
             if pkg_name in pkg_list:
                 pkg_list.remove(pkg_name)
 
-        # Add it again under the appropriate tags
-        for tag in getattr(package, 'tags', []):
-            self._tag_dict[tag].append(package.name)
+    def add_package(self, pkg_name, tags):
+        """Add a package to the list of packages of some tags.
+
+        Args:
+            pkg_name (str): name of the package, without namespace
+            tags (list): tags of the package
+        """
+        for tag in tags:
+            self._tag_dict[tag].append(pkg_name)
 
 
 @add_metaclass(abc.ABCMeta)
@@ -268,6 +283,18 @@ class Indexer(object):
         """
         return False
 
+    def is_stale(self, index_mtime):
+        """Whether the whole index is outdated, even for packages whose
+        file hasn't changed.
+
+        Arguments:
+            index_mtime (float): modification time of the stored index
+
+        Indexes whose content also depends on files outside of the
+        repository can override this to be rebuilt when they change.
+        """
+        return False
+
     @abc.abstractmethod
     def read(self, stream):
         """Read this index from a provided file object."""
@@ -280,6 +307,26 @@ class Indexer(object):
     def write(self, stream):
         """Write the index to a file object."""
 
+    @abc.abstractmethod
+    def write_package(self, pkg_fullname, stream):
+        """Write the part of the index about one package to a file object.
+
+        This must not depend on the content of the index in memory.
+        """
+
+    @abc.abstractmethod
+    def read_package(self, pkg_fullname, stream):
+        """Replace what the index in memory knows about a package with
+        what was written by ``write_package()``."""
+
+    @abc.abstractmethod
+    def package_names(self):
+        """Names, without namespace, of the packages in the index."""
+
+    @abc.abstractmethod
+    def remove_package(self, pkg_fullname):
+        """Remove what the index in memory knows about a package."""
+
 
 class TagIndexer(Indexer):
     """Lifecycle methods for a TagIndex on a Repo."""
@@ -295,6 +342,21 @@ class TagIndexer(Indexer):
     def write(self, stream):
         self.index.to_json(stream)
 
+    def write_package(self, pkg_fullname, stream):
+        pkg_class = path.get_pkg_class(pkg_fullname)
+        sjson.dump({'tags': list(getattr(pkg_class, 'tags', []))}, stream)
+
+    def read_package(self, pkg_fullname, stream):
+        pkg_name = pkg_fullname.split('.')[-1]
+        self.index.remove_package(pkg_name)
+        self.index.add_package(pkg_name, sjson.load(stream)['tags'])
+
+    def package_names(self):
+        return set(name for names in self.index.values() for name in names)
+
+    def remove_package(self, pkg_fullname):
+        self.index.remove_package(pkg_fullname.split('.')[-1])
+
 
 class ProviderIndexer(Indexer):
     """Lifecycle methods for virtual package providers."""
@@ -311,6 +373,22 @@ class ProviderIndexer(Indexer):
     def write(self, stream):
         self.index.to_json(stream)
 
+    def write_package(self, pkg_fullname, stream):
+        index = ProviderIndex()
+        index.update(pkg_fullname)
+        index.to_json(stream)
+
+    def read_package(self, pkg_fullname, stream):
+        self.index.remove_provider(pkg_fullname)
+        self.index.merge(ProviderIndex.from_json(stream))
+
+    def package_names(self):
+        return set(p.name for pkg_dict in self.index.providers.values()
+                   for pset in pkg_dict.values() for p in pset)
+
+    def remove_package(self, pkg_fullname):
+        self.index.remove_provider(pkg_fullname)
+
 
 class PatchIndexer(Indexer):
     """Lifecycle methods for patch cache."""
@@ -333,6 +411,71 @@ class PatchIndexer(Indexer):
     def update(self, pkg_fullname):
         self.index.update_package(pkg_fullname)
 
+    def write_package(self, pkg_fullname, stream):
+        pkg_class = path.get_pkg_class(pkg_fullname)
+        sjson.dump(
+            {'patches': spack.patch.PatchCache.package_index(pkg_class)},
+            stream)
+
+    def read_package(self, pkg_fullname, stream):
+        self.index.remove_package(pkg_fullname)
+        self.index.update(spack.patch.PatchCache(sjson.load(stream)))
+
+    def package_names(self):
+        return set(fullname.split('.')[-1]
+                   for package_to_patch in self.index.index.values()
+                   for fullname in package_to_patch)
+
+    def remove_package(self, pkg_fullname):
+        # Also drop the patches the package inherits from another one
+        for sha256, package_to_patch in list(self.index.index.items()):
+            package_to_patch.pop(pkg_fullname, None)
+            if not package_to_patch:
+                del self.index.index[sha256]
+
+
+class MetadataIndexer(Indexer):
+    """Lifecycle methods for the static metadata of packages."""
+    def __init__(self, repo):
+        self.repo = repo
+
+    def _create(self):
+        return spack.package_metadata.PackageMetadataIndex()
+
+    def is_stale(self, index_mtime):
+        # Base classes like CMakePackage also contribute directives
+        lib_files = [os.path.join(spack.paths.module_path, f)
+                     for f in ('directives.py', 'package.py')]
+        lib_files.extend(
+            os.path.join(spack.paths.build_systems_path, f)
+            for f in os.listdir(spack.paths.build_systems_path)
+            if f.endswith('.py'))
+        return any(os.path.getmtime(f) > index_mtime for f in lib_files)
+
+    def read(self, stream):
+        self.index = spack.package_metadata.PackageMetadataIndex.from_json(
+            stream)
+
+    def update(self, pkg_fullname):
+        self.index.update_package(self.repo.get_pkg_class(pkg_fullname))
+
+    def write(self, stream):
+        self.index.to_json(stream)
+
+    def write_package(self, pkg_fullname, stream):
+        sjson.dump(spack.package_metadata.metadata_dict(
+            self.repo.get_pkg_class(pkg_fullname)), stream)
+
+    def read_package(self, pkg_fullname, stream):
+        data = sjson.load(stream)
+        self.index.packages[data['name']] = data
+
+    def package_names(self):
+        return set(self.index.packages)
+
+    def remove_package(self, pkg_fullname):
+        self.index.packages.pop(pkg_fullname.split('.')[-1], None)
+
 
 class RepoIndex(object):
     """Container class that manages a set of Indexers for a Repo.
@@ -349,6 +492,10 @@ class RepoIndex(object):
     Generated indexes are accessed by name via ``__getitem__()``.
 
     """
+    #: Number of per-package update files above which they are merged
+    #: into the base file of an index
+    max_updates = 100
+
     def __init__(self, package_checker, namespace):
         self.checker = package_checker
         self.packages_path = self.checker.packages_path
@@ -394,39 +541,132 @@ class RepoIndex(object):
             self.indexes[name] = self._build_index(name, indexer)
 
     def _build_index(self, name, indexer):
-        """Determine which packages need an update, and update indexes."""
-
+        """Determine which packages need an update, and update indexes.
+
+        An index is stored as a base file, ``<name>/<namespace>-index.json``,
+        plus one small file per package updated since the base was written,
+        in ``<name>/<namespace>-updates/``. Updating a package only writes
+        its own file, atomically and without taking any lock. Once there
+        are more than ``max_updates`` of them, they are folded back into
+        the base file, which is the only operation that needs a write
+        lock. It is also rewritten to drop the packages that were removed
+        from the repository.
+        """
         # Filename of the provider index cache (we assume they're all json)
         cache_filename = '{0}/{1}-index.json'.format(name, self.namespace)
-
-        # Compute which packages needs to be updated in the cache
         misc_cache = spack.caches.misc_cache
+        updates_dir = misc_cache.cache_path(
+            '{0}/{1}-updates'.format(name, self.namespace))
+
         index_mtime = misc_cache.mtime(cache_filename)
+        if not index_mtime or indexer.is_stale(index_mtime):
+            # Build the whole index from scratch
+            with misc_cache.write_transaction(cache_filename) as (old, new):
+                indexer.create()
+                for pkg_name in self.checker:
+                    indexer.update(self._fullname(pkg_name))
+                indexer.write(new)
+
+            self._remove_updates(updates_dir, self._list_updates(updates_dir))
+            return indexer.index
+
+        # Updates are listed before the base is read: if it is compacted
+        # in the meantime, the updates we read are still newer than it.
+        updates = self._list_updates(updates_dir)
+        with misc_cache.read_transaction(cache_filename) as f:
+            indexer.read(f)
+
+        for pkg_name in sorted(updates):
+            if pkg_name not in self.checker:
+                continue
+            try:
+                with open(os.path.join(updates_dir, pkg_name + '.json')) as f:
+                    indexer.read_package(self._fullname(pkg_name), f)
+            except (IOError, OSError) as e:
+                # Removed by a concurrent compaction; it is in the base now.
+                if e.errno != errno.ENOENT:
+                    raise
+
+        # Packages removed from the repository since they were indexed
+        removed = [x for x in indexer.package_names() if x not in self.checker]
+        for pkg_name in removed:
+            indexer.remove_package(self._fullname(pkg_name))
+        removed.extend(x for x in updates if x not in self.checker)
 
         needs_update = [
             x for x, sinfo in self.checker.items()
-            if sinfo.st_mtime > index_mtime
+            if sinfo.st_mtime > updates.get(x, index_mtime)
         ]
+        if needs_update:
+            mkdirp(updates_dir)
+        for pkg_name in needs_update:
+            updates[pkg_name] = self._write_update(
+                indexer, updates_dir, pkg_name)
 
-        index_existed = misc_cache.init_entry(cache_filename)
-        if index_existed and not needs_update:
-            # If the index exists and doesn't need an update, read it
-            with misc_cache.read_transaction(cache_filename) as f:
-                indexer.read(f)
-
-        else:
-            # Otherwise update it and rewrite the cache file
+        if removed or len(updates) > self.max_updates:
             with misc_cache.write_transaction(cache_filename) as (old, new):
-                indexer.read(old) if old else indexer.create()
-
-                for pkg_name in needs_update:
-                    namespaced_name = '%s.%s' % (self.namespace, pkg_name)
-                    indexer.update(namespaced_name)
-
                 indexer.write(new)
 
+            # The base covers the package files as they were checked: one
+            # modified since then, even before this write, must be newer.
+            stamp = max([index_mtime] + [
+                sinfo.st_mtime for sinfo in self.checker.values()])
+            os.utime(misc_cache.cache_path(cache_filename), (stamp, stamp))
+            self._remove_updates(updates_dir, updates)
+
         return indexer.index
 
+    def _fullname(self, pkg_name):
+        return '%s.%s' % (self.namespace, pkg_name)
+
+    def _write_update(self, indexer, updates_dir, pkg_name):
+        """Write the update file of a package, apply it to the index in
+        memory, and return its modification time."""
+        update_file = os.path.join(updates_dir, pkg_name + '.json')
+        tmp_file = '%s.%s.tmp' % (update_file, os.getpid())
+        try:
+            with open(tmp_file, 'w') as f:
+                indexer.write_package(self._fullname(pkg_name), f)
+            with open(tmp_file) as f:
+                indexer.read_package(self._fullname(pkg_name), f)
+            os.rename(tmp_file, update_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        return os.stat(update_file).st_mtime
+
+    def _list_updates(self, updates_dir):
+        """Map the names of the packages with an update file to the
+        modification time of that file."""
+        updates = {}
+        if not os.path.isdir(updates_dir):
+            return updates
+
+        for filename in os.listdir(updates_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                sinfo = os.stat(os.path.join(updates_dir, filename))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            updates[filename[:-len('.json')]] = sinfo.st_mtime
+        return updates
+
+    def _remove_updates(self, updates_dir, updates):
+        """Remove update files that were not modified since they were
+        listed in ``updates``, because their content is in the base."""
+        for pkg_name, mtime in updates.items():
+            update_file = os.path.join(updates_dir, pkg_name + '.json')
+            try:
+                if os.stat(update_file).st_mtime == mtime:
+                    os.remove(update_file)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
 
 class RepoPath(object):
     """A RepoPath is a list of repos that function as one.
@@ -646,6 +886,16 @@ class RepoPath(object):
         """Find a class for the spec's package and return the class object."""
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
+    def get_pkg_metadata(self, pkg_name):
+        """Find the static metadata of a package, without importing it."""
+        return self.repo_for_pkg(pkg_name).get_pkg_metadata(pkg_name)
+
+    def all_package_metadata(self):
+        """Iterator over the metadata of all packages, like
+        ``all_packages()`` but without importing them."""
+        for name in self.all_package_names():
+            yield self.get_pkg_metadata(name)
+
     @autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -740,6 +990,7 @@ class Repo(object):
 
         # Indexes for this repository, computed lazily
         self._repo_index = None
+        self._metadata_index = None
 
         # make sure the namespace for packages in this repo exists.
         self._create_namespace()
@@ -934,6 +1185,21 @@ class Repo(object):
             self._repo_index.add_indexer('patches', PatchIndexer())
         return self._repo_index
 
+    @property
+    def metadata_index(self):
+        """Index of the static metadata of the packages in this repo.
+
+        It is kept apart from the other indexes, which are all read every
+        time any of them is needed, because it is much larger and only
+        needed by a few commands.
+        """
+        if self._metadata_index is None:
+            self._metadata_index = RepoIndex(
+                self._pkg_checker, self.namespace)
+            self._metadata_index.add_indexer(
+                'metadata', MetadataIndexer(self))
+        return self._metadata_index['metadata']
+
     @property
     def provider_index(self):
         """A provider index with names *specific* to this repo."""
@@ -1014,6 +1280,28 @@ class Repo(object):
         for name in self.all_package_names():
             yield self.get(name)
 
+    def get_pkg_metadata(self, pkg_name):
+        """Get the static metadata of a package without importing it.
+
+        Returns:
+            (spack.package_metadata.PackageMetadata): metadata of the
+                package, read from the metadata index
+        """
+        namespace, _, pkg_name = pkg_name.rpartition('.')
+        if namespace and (namespace != self.namespace):
+            raise InvalidNamespaceError('Invalid namespace for %s repo: %s'
+                                        % (self.namespace, namespace))
+
+        if not self.exists(pkg_name):
+            raise UnknownPackageError(pkg_name, self)
+        return self.metadata_index.get(pkg_name)
+
+    def all_package_metadata(self):
+        """Iterator over the metadata of all packages in the repository."""
+        index = self.metadata_index
+        for name in self.all_package_names():
+            yield index.get(name)
+
     def exists(self, pkg_name):
         """Whether a package with the supplied name exists."""
         return pkg_name in self._pkg_checker
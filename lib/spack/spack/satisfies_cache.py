@@ -0,0 +1,160 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Opt-in memoization of ``satisfies()`` checks on spec components.
+
+Concretization and database queries compare the same few abstract
+constraints against many specs, over and over. When
+``config:satisfies_cache`` is set to a positive number of entries, the
+results of these comparisons are remembered:
+
+* ``VersionList.satisfies()``
+* the node-local part of ``Spec.satisfies()``, i.e. name, namespace,
+  versions, compiler, variants, architecture and compiler flags.
+
+Results are keyed on the *structure* of the operands, computed when the
+check is made, and never on object identity. Specs, version lists,
+variant maps and arch specs are all mutated in place by ``normalize()``
+and ``concretize()``; a mutated object simply produces a new key, so a
+stale result can never be returned and nothing has to be invalidated
+explicitly. Only truly immutable objects (``Version`` and
+``VersionRange``) appear as themselves in keys.
+
+Structural keys are interned: each distinct key is mapped to a small
+integer, and the result cache is indexed by tuples of those integers.
+The cache is bounded; when it is full, it is flushed together with the
+interning table.
+
+Hit rates are reported with ``tty.debug`` at the end of every command,
+so they show up with ``spack -d``.
+"""
+import llnl.util.tty as tty
+
+
+#: The process-wide cache, created from the configuration on first use
+_cache = None
+
+
+class SatisfiesCache(object):
+    """Bounded cache of the results of ``satisfies()`` checks."""
+
+    def __init__(self, size):
+        """
+        Args:
+            size (int): maximum number of results kept. Zero disables
+                the cache.
+        """
+        self.size = max(0, size or 0)
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self._ids = {}
+        self._results = {}
+
+    def intern(self, key):
+        """Return the small integer standing for a structural key."""
+        return self._ids.setdefault(key, len(self._ids))
+
+    def satisfies(self, check, key, a, b, strict):
+        """Return ``check(a, b, strict)``, memoized on ``key(a)`` and
+        ``key(b)``."""
+        key_a, key_b = key(a), key(b)
+        k = (check, self.intern(key_a), self.intern(key_b), strict)
+        try:
+            result = self._results[k]
+            self.hits += 1
+            return result
+        except KeyError:
+            pass
+
+        self.misses += 1
+        result = check(a, b, strict)
+
+        if len(self._results) >= self.size:
+            self.clear()
+            self.flushes += 1
+            k = (check, self.intern(key_a), self.intern(key_b), strict)
+        self._results[k] = result
+        return result
+
+    def clear(self):
+        """Forget all the results and interned keys."""
+        self._ids.clear()
+        self._results.clear()
+
+    def __len__(self):
+        return len(self._results)
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return ('%d hits, %d misses (%.1f%% hit rate), %d entries, '
+                '%d flushes' % (self.hits, self.misses, rate,
+                                len(self), self.flushes))
+
+
+def cache():
+    """The process-wide :class:`SatisfiesCache`.
+
+    ``config:satisfies_cache`` is only read the first time this is
+    called; use :func:`reset` to read it again.
+    """
+    global _cache
+    if _cache is None:
+        import spack.config
+        _cache = SatisfiesCache(spack.config.get('config:satisfies_cache', 0))
+    return _cache
+
+
+def reset():
+    """Drop the process-wide cache and its statistics."""
+    global _cache
+    _cache = None
+
+
+def cached_satisfies(check, key, a, b, strict):
+    """Return ``check(a, b, strict)``, using the cache if it is enabled.
+
+    Args:
+        check (function): function doing the actual comparison
+        key (function): function returning the structural key of an
+            operand. It must capture everything ``check`` looks at.
+        a: object that should satisfy ``b``
+        b: constraint
+        strict (bool): whether the comparison is strict
+    """
+    c = _cache if _cache is not None else cache()
+    if not c.size:
+        return check(a, b, strict)
+    return c.satisfies(check, key, a, b, strict)
+
+
+def report():
+    """Print the statistics of the cache in debug mode, if it was used."""
+    if _cache is not None and (_cache.hits or _cache.misses):
+        tty.debug('satisfies cache: %s' % _cache)
+
+
+def version_list_key(versions):
+    """Structural key of a ``VersionList``."""
+    return tuple(versions.versions)
+
+
+def spec_node_key(spec):
+    """Structural key of a spec node, excluding its dependencies."""
+    arch = spec.architecture
+    compiler = spec.compiler
+    return (
+        spec.name,
+        spec.namespace,
+        tuple(spec.versions.versions),
+        tuple(sorted((name, type(v).__name__, v.value)
+                     for name, v in spec.variants.items())),
+        None if arch is None else (arch.platform, arch.os, arch.target),
+        None if compiler is None else (
+            compiler.name, tuple(compiler.versions.versions)),
+        spec.compiler_flags._cmp_key(),
+        spec._concrete,
+    )
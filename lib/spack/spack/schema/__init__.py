@@ -11,7 +11,6 @@ import re
 import six
 
 import llnl.util.lang
-import spack.spec
 
 
 # jsonschema is imported lazily as it is heavy to import
@@ -61,6 +60,7 @@ def _make_validator():
     def _validate_spec(validator, is_spec, instance, schema):
         """Check if the attributes on instance are valid specs."""
         import jsonschema
+        import spack.spec
         if not validator.is_type(instance, "object"):
             return
 
@@ -45,6 +45,17 @@ properties = {
             'source_cache': {'type': 'string'},
             'misc_cache': {'type': 'string'},
             'verify_ssl': {'type': 'boolean'},
+            'fetch_retries': {'type': 'integer', 'minimum': 0},
+            'fetch_jobs': {'type': 'integer', 'minimum': 1},
+            'fetch_host_connections': {'type': 'integer', 'minimum': 1},
+            'fetch_bandwidth': {
+                'anyOf': [
+                    {'type': 'integer', 'minimum': 0},
+                    {'type': 'string', 'pattern': r'^\d+[kKmMgG]?$'}
+                ],
+            },
+            'install_prefetch': {'type': 'boolean'},
+            'relocation_manifest': {'type': 'boolean'},
             'install_missing_compilers': {'type': 'boolean'},
             'debug': {'type': 'boolean'},
             'checksum': {'type': 'boolean'},
@@ -52,8 +63,23 @@ properties = {
             'dirty': {'type': 'boolean'},
             'build_language': {'type': 'string'},
             'build_jobs': {'type': 'integer', 'minimum': 1},
+            'install_jobs': {'type': 'integer', 'minimum': 1},
             'ccache': {'type': 'boolean'},
             'db_lock_timeout': {'type': 'integer', 'minimum': 1},
+            'db_storage': {
+                'type': 'string',
+                'enum': ['json', 'journal'],
+            },
+            'satisfies_cache': {'type': 'integer', 'minimum': 0},
+            'view_update': {
+                'type': 'string',
+                'enum': ['incremental', 'staged'],
+            },
+            'view_jobs': {'type': 'integer', 'minimum': 1},
+            'view_link_type': {
+                'type': 'string',
+                'enum': ['symlink', 'hardlink', 'copy'],
+            },
             'package_lock_timeout': {
                 'anyOf': [
                     {'type': 'integer', 'minimum': 1},
@@ -99,10 +99,11 @@ import llnl.util.tty as tty
 import spack.paths
 import spack.architecture
 import spack.compiler
-import spack.compilers as compilers
+import spack.compilers
 import spack.error
 import spack.parse
 import spack.repo
+import spack.satisfies_cache
 import spack.store
 import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
@@ -636,6 +637,32 @@ class DependencyMap(HashableMap):
         return "{deps: %s}" % ', '.join(str(d) for d in sorted(self.values()))
 
 
+class LazyDependencyMap(DependencyMap):
+    """A DependencyMap filled the first time it is read, by calling
+    ``load``. Adding or removing entries does not load it.
+
+    The database uses it for the dependents of the specs it reads, which
+    are only built when asked for.
+    """
+
+    def __init__(self, load=None):
+        self._dict = {}
+        self._load = load
+
+    @property
+    def dict(self):
+        if self._load is not None:
+            load, self._load = self._load, None
+            load()
+        return self._dict
+
+    def __setitem__(self, key, value):
+        self._dict[key] = value
+
+    def __delitem__(self, key):
+        del self._dict[key]
+
+
 def _command_default_handler(descriptor, spec, cls):
     """Default handler when looking for the 'command' attribute.
 
@@ -1300,8 +1327,7 @@ class Spec(object):
         if self._hash:
             return self._hash[:length]
         else:
-            yaml_text = syaml.dump(
-                self.to_node_dict(), default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(self.to_node_dict())
             sha = hashlib.sha1(yaml_text.encode('utf-8'))
 
             b32_hash = base64.b32encode(sha.digest()).lower()
@@ -1321,9 +1347,8 @@ class Spec(object):
             raise SpecError("Spec is not concrete: " + str(self))
 
         if not self._full_hash:
-            yaml_text = syaml.dump(
-                self.to_node_dict(hash_function=lambda s: s.full_hash()),
-                default_flow_style=True, width=maxint)
+            yaml_text = syaml.dump_flow(
+                self.to_node_dict(hash_function=lambda s: s.full_hash()))
             package_hash = self.package.content_hash()
             sha = hashlib.sha1(yaml_text.encode('utf-8') + package_hash)
 
@@ -2387,7 +2412,7 @@ class Spec(object):
 
             # validate compiler in addition to the package name.
             if spec.compiler:
-                if not compilers.supported(spec.compiler):
+                if not spack.compilers.supported(spec.compiler):
                     raise UnsupportedCompilerError(spec.compiler.name)
 
             # Ensure correctness of variants (if the spec is not virtual)
@@ -2589,7 +2614,26 @@ class Spec(object):
                             return True
             return False
 
-        # Otherwise, first thing we care about is whether the name matches
+        # Compare everything but dependencies (memoized if enabled)
+        if not spack.satisfies_cache.cached_satisfies(
+                Spec._satisfies_node, spack.satisfies_cache.spec_node_key,
+                self, other, strict):
+            return False
+
+        # If we need to descend into dependencies, do it, otherwise we're done.
+        if deps:
+            deps_strict = strict
+            if self._concrete and not other.name:
+                # We're dealing with existing specs
+                deps_strict = True
+            return self.satisfies_dependencies(other, strict=deps_strict)
+        else:
+            return True
+
+    def _satisfies_node(self, other, strict):
+        """Whether the constraints on this node, ignoring dependencies,
+        satisfy those of other."""
+        # First thing we care about is whether the name matches
         if self.name != other.name and self.name and other.name:
             return False
 
@@ -2630,15 +2674,7 @@ class Spec(object):
                 strict=strict):
             return False
 
-        # If we need to descend into dependencies, do it, otherwise we're done.
-        if deps:
-            deps_strict = strict
-            if self._concrete and not other.name:
-                # We're dealing with existing specs
-                deps_strict = True
-            return self.satisfies_dependencies(other, strict=deps_strict)
-        else:
-            return True
+        return True
 
     def satisfies_dependencies(self, other, strict=False):
         """
@@ -69,14 +69,22 @@ class Context(six.with_metaclass(ContextMeta, object)):
 
 
 def make_environment(dirs=None):
-    """Returns an configured environment for template rendering."""
+    """Returns an configured environment for template rendering.
+
+    Environments are shared by all callers that look for templates in the
+    same directories, so that each template is only compiled once.
+    """
     if dirs is None:
         # Default directories where to search for templates
         builtins = spack.config.get('config:template_dirs')
         extensions = spack.extensions.get_template_dirs()
         dirs = [canonicalize_path(d)
                 for d in itertools.chain(builtins, extensions)]
+    return _make_environment(tuple(dirs))
+
 
+@llnl.util.lang.memoized
+def _make_environment(dirs):
     # Loader for the templates
     loader = jinja2.FileSystemLoader(dirs)
     # Environment of the template engine
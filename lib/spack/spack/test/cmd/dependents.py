@@ -43,7 +43,7 @@ def test_immediate_installed_dependents(mock_packages, database):
                     for s in ['dyninst', 'libdwarf']])
 
     libelf = spack.store.db.query_one('libelf')
-    expected = set([d.dag_hash(7) for d in libelf.dependents()])
+    assert expected == set([d.dag_hash(7) for d in libelf.dependents()])
 
     assert expected == hashes
 
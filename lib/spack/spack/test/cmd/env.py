@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import errno
 import os
 from six import StringIO
 
@@ -10,9 +11,13 @@ import pytest
 
 import llnl.util.filesystem as fs
 
+import spack.config
+import spack.error
 import spack.modules
 import spack.environment as ev
+import spack.store
 from spack.cmd.env import _env_create
+from spack.filesystem_view import YamlFilesystemView
 from spack.spec import Spec
 from spack.main import SpackCommand
 
@@ -92,6 +97,56 @@ def test_concretize():
     assert any(x.name == 'mpileaks' for x in env_specs)
 
 
+def test_concretize_in_parallel():
+    user_specs = ['mpileaks', 'libelf', 'dyninst', 'callpath ^zmpi']
+
+    serial = ev.create('serial')
+    parallel = ev.create('parallel')
+    for s in user_specs:
+        serial.add(s)
+        parallel.add(s)
+    serial.concretize()
+    parallel.concretize(jobs=3)
+
+    assert parallel.concretized_user_specs == serial.concretized_user_specs
+    assert parallel.concretized_order == serial.concretized_order
+    assert parallel._to_lockfile_dict() == serial._to_lockfile_dict()
+    assert all(s.concrete for s in parallel.specs_by_hash.values())
+
+    # nothing had to be concretized again in this process
+    results = ev._concretize_in_parallel(
+        [Spec(s) for s in user_specs], 2)
+    assert [c.dag_hash() for _, c in results] == serial.concretized_order
+
+    # workers get the user specs whole, not as strings
+    user_spec = Spec('callpath ^zmpi')
+    dag_hash, _ = ev._concretize_worker(user_spec.to_json())
+    assert dag_hash == user_spec.concretized().dag_hash()
+
+
+def test_concretize_in_parallel_error():
+    e = ev.create('test')
+    e.add('libelf')
+    e.add('conflict%clang')
+
+    with pytest.raises(spack.error.SpackError) as serial_error:
+        Spec('conflict%clang').concretized()
+    with pytest.raises(type(serial_error.value)):
+        e.concretize(jobs=2)
+
+
+def test_concretize_jobs_option():
+    env('create', 'test')
+    e = ev.read('test')
+    with e:
+        add('mpileaks')
+        add('libelf')
+        concretize('-j', '2')
+
+    e = ev.read('test')
+    assert [s.name for s in e.concretized_user_specs] == ['mpileaks', 'libelf']
+
+
 def test_env_install_all(install_mockery, mock_fetch):
     e = ev.create('test')
     e.add('cmake-client')
@@ -692,6 +747,16 @@ def test_env_updates_view_add_concretize(
     assert os.path.exists(str(view_dir.join('.spack/libdwarf')))
 
 
+def check_viewdir_removal(viewdir):
+    """Check that the uninstall/removal worked for the view"""
+    assert (not os.path.exists(str(viewdir.join('.spack'))) or
+            sorted(os.listdir(str(viewdir.join('.spack')))) ==
+            ['manifest', 'projections.yaml'])
+    # the manifest of the view is empty as well
+    assert not YamlFilesystemView(
+        str(viewdir), spack.store.layout).get_all_specs()
+
+
 def test_env_updates_view_uninstall(
     tmpdir, mock_stage, mock_fetch, install_mockery
 ):
@@ -707,8 +772,87 @@ def test_env_updates_view_uninstall(
     with ev.read('test'):
         uninstall('-ay')
 
-    assert (not os.path.exists(str(view_dir.join('.spack'))) or
-            os.listdir(str(view_dir.join('.spack'))) == ['projections.yaml'])
+    check_viewdir_removal(view_dir)
+
+
+def test_env_staged_view(tmpdir, mock_stage, mock_fetch, install_mockery):
+    spack.config.set('config:view_update', 'staged', scope='overrides')
+    spack.config.set('config:view_jobs', 4, scope='overrides')
+    parent = tmpdir.mkdir('views')
+    view_dir = parent.mkdir('view')
+    env('create', '--with-view=%s' % view_dir, 'test')
+    with ev.read('test'):
+        install('--fake', 'mpileaks')
+
+    # The view is a link to the directory it was built in, next to it
+    assert os.path.islink(str(view_dir))
+    staged = os.readlink(str(view_dir))
+    assert os.path.dirname(staged) == ''
+    assert os.path.exists(str(view_dir.join('.spack/mpileaks')))
+    assert os.path.exists(str(view_dir.join('.spack/libdwarf')))
+    assert sorted(os.listdir(str(parent))) == sorted(['view', staged])
+
+    # Nothing changed: the view is left alone
+    ev.read('test').regenerate_view()
+    assert os.readlink(str(view_dir)) == staged
+
+    with ev.read('test'):
+        uninstall('-ay')
+    assert os.readlink(str(view_dir)) != staged
+    assert sorted(os.listdir(str(parent))) == sorted(
+        ['view', os.readlink(str(view_dir))])
+    check_viewdir_removal(view_dir)
+
+    ev.read('test').update_view(None)
+    assert os.listdir(str(parent)) == []
+
+
+def test_env_staged_view_restores_old_view(
+        tmpdir, mock_stage, mock_fetch, install_mockery, monkeypatch):
+    parent = tmpdir.mkdir('views')
+    view_dir = parent.mkdir('view')
+    env('create', '--with-view=%s' % view_dir, 'test')
+    with ev.read('test'):
+        install('--fake', 'libelf')
+    assert not os.path.islink(str(view_dir))
+
+    # Converting the view in place fails after it was moved away
+    spack.config.set('config:view_update', 'staged', scope='overrides')
+    rename = os.rename
+
+    def fail_link(src, dst):
+        if src.endswith('.link'):
+            raise OSError(errno.EACCES, 'Permission denied')
+        rename(src, dst)
+    monkeypatch.setattr(os, 'rename', fail_link)
+
+    with pytest.raises(OSError):
+        ev.read('test')._regenerate_view_staged(set())
+
+    assert not os.path.islink(str(view_dir))
+    assert os.path.exists(str(view_dir.join('.spack/libelf')))
+    assert os.listdir(str(parent)) == ['view']
+
+
+def test_env_view_link_type(
+    tmpdir, mock_stage, mock_archive, mock_fetch, install_mockery
+):
+    spack.config.set('config:view_link_type', 'hardlink', scope='overrides')
+    view_dir = tmpdir.mkdir('view')
+    env('create', '--with-view=%s' % view_dir, 'test')
+    with ev.read('test'):
+        install('libdwarf')
+
+    view_file = str(view_dir.join('libdwarf'))
+    prefix_file = os.path.join(Spec('libdwarf').concretized().prefix,
+                               'libdwarf')
+    assert not os.path.islink(view_file)
+    assert os.path.samefile(view_file, prefix_file)
+
+    with ev.read('test'):
+        uninstall('-ay')
+    check_viewdir_removal(view_dir)
+    assert not os.path.exists(view_file)
 
 
 def test_env_updates_view_uninstall_referenced_elsewhere(
@@ -728,8 +872,7 @@ def test_env_updates_view_uninstall_referenced_elsewhere(
     with ev.read('test'):
         uninstall('-ay')
 
-    assert (not os.path.exists(str(view_dir.join('.spack'))) or
-            os.listdir(str(view_dir.join('.spack'))) == ['projections.yaml'])
+    check_viewdir_removal(view_dir)
 
 
 def test_env_updates_view_remove_concretize(
@@ -750,8 +893,7 @@ def test_env_updates_view_remove_concretize(
         remove('mpileaks')
         concretize()
 
-    assert (not os.path.exists(str(view_dir.join('.spack'))) or
-            os.listdir(str(view_dir.join('.spack'))) == ['projections.yaml'])
+    check_viewdir_removal(view_dir)
 
 
 def test_env_updates_view_force_remove(
@@ -769,8 +911,7 @@ def test_env_updates_view_force_remove(
     with ev.read('test'):
         remove('-f', 'mpileaks')
 
-    assert (not os.path.exists(str(view_dir.join('.spack'))) or
-            os.listdir(str(view_dir.join('.spack'))) == ['projections.yaml'])
+    check_viewdir_removal(view_dir)
 
 
 def test_env_activate_view_fails(
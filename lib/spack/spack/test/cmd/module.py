@@ -9,6 +9,7 @@ import pytest
 
 import spack.main
 import spack.modules
+import spack.modules.common
 
 module = spack.main.SpackCommand('module')
 
@@ -83,6 +84,51 @@ def test_remove_and_add(database, module_type):
         assert os.path.exists(item)
 
 
+@pytest.mark.db
+def test_refresh_in_parallel(database, module_type, capfd):
+    """Tests that module files written by many processes are the same as
+    those written by one."""
+    if module_type == 'lmod':
+        # TODO: Testing this with lmod requires mocking
+        # TODO: the core compilers
+        return
+
+    specs = database.query('mpileaks')
+    writer_cls = spack.modules.module_types[module_type]
+    writers = [writer_cls(s) for s in specs]
+    root = writers[0].layout.dirname()
+
+    def contents():
+        result = {}
+        for w in writers:
+            # Skip the header, with the time the file was written
+            with open(w.layout.filename) as f:
+                result[w.layout.filename] = f.readlines()[2:]
+        with open(os.path.join(root, 'module-index.yaml')) as f:
+            result['index'] = f.read()
+        return result
+
+    module(module_type, 'refresh', '-y', '-j', '1', 'mpileaks')
+    serial = contents()
+
+    # Module files that are up to date are not written again
+    capfd.readouterr()
+    module(module_type, 'refresh', '-y', '-j', '2', 'mpileaks')
+    out, _ = capfd.readouterr()
+    assert 'Skipped {0} module files'.format(len(specs)) in out
+    assert contents() == serial
+
+    module(module_type, 'rm', '-y', 'mpileaks')
+    module(module_type, 'refresh', '-y', '-j', '2', 'mpileaks')
+    assert contents() == serial
+
+    index = spack.modules.common.read_module_index(root)
+    assert set(index) == set(s.dag_hash() for s in specs)
+
+    with pytest.raises(spack.main.SpackCommandError):
+        module(module_type, 'refresh', '-y', '-j', '0', 'mpileaks')
+
+
 @pytest.mark.db
 @pytest.mark.parametrize('cli_args', [
     ['libelf'],
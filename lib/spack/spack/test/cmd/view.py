@@ -8,6 +8,7 @@ import os.path
 import pytest
 
 import spack.util.spack_yaml as s_yaml
+from spack.spec import Spec
 
 activate = SpackCommand('activate')
 extensions = SpackCommand('extensions')
@@ -24,7 +25,8 @@ def create_projection_file(tmpdir, projection):
     return projection_file
 
 
-@pytest.mark.parametrize('cmd', ['hardlink', 'symlink', 'hard', 'add'])
+@pytest.mark.parametrize('cmd', ['hardlink', 'symlink', 'hard', 'add',
+                                 'copy', 'reflink'])
 def test_view_link_type(
         tmpdir, mock_packages, mock_archive, mock_fetch, config,
         install_mockery, cmd):
@@ -33,7 +35,33 @@ def test_view_link_type(
     view(cmd, viewpath, 'libdwarf')
     package_prefix = os.path.join(viewpath, 'libdwarf')
     assert os.path.exists(package_prefix)
-    assert os.path.islink(package_prefix) == (not cmd.startswith('hard'))
+    assert os.path.islink(package_prefix) == (cmd in ('symlink', 'add'))
+
+
+@pytest.mark.parametrize('cmd', ['hardlink', 'copy'])
+def test_view_remove_link_type(
+        tmpdir, mock_packages, mock_archive, mock_fetch, config,
+        install_mockery, cmd):
+    install('libdwarf')
+    viewpath = str(tmpdir.mkdir('view_{0}'.format(cmd)))
+    view(cmd, viewpath, 'libdwarf')
+
+    view_file = os.path.join(viewpath, 'libdwarf')
+    prefix_file = os.path.join(Spec('libdwarf').concretized().prefix,
+                               'libdwarf')
+    assert os.path.samefile(view_file, prefix_file) == (cmd == 'hardlink')
+
+    view('remove', viewpath, 'libdwarf')
+    assert not os.path.exists(view_file)
+    assert not os.path.exists(os.path.join(viewpath, '.spack', 'libdwarf'))
+
+    # Files of the view that are not from the package are left alone
+    view(cmd, viewpath, 'libdwarf')
+    os.remove(view_file)
+    with open(view_file, 'w') as f:
+        f.write('not from libdwarf')
+    view('remove', viewpath, 'libdwarf')
+    assert os.path.exists(view_file)
 
 
 @pytest.mark.parametrize('cmd', ['hardlink', 'symlink', 'hard', 'add'])
@@ -30,6 +30,7 @@ import spack.platforms.test
 import spack.repo
 import spack.stage
 import spack.util.executable
+from spack.util.file_cache import FileCache
 from spack.util.pattern import Bunch
 from spack.dependency import Dependency
 from spack.package import PackageBase
@@ -231,6 +232,58 @@ def mutable_mock_packages(mock_packages, repo_path):
         yield
 
 
+_package_template = """\
+from spack import *
+
+
+class {0}(Package):
+    \"\"\"A package for testing.\"\"\"
+    homepage = "http://www.example.com"
+    url = "http://www.example.com/{1}-1.0.tar.gz"
+
+{2}
+"""
+
+
+@pytest.fixture()
+def tmp_misc_cache(tmpdir, monkeypatch):
+    """Use an empty misc cache, to check how indexes are built."""
+    monkeypatch.setattr(
+        spack.caches, 'misc_cache', FileCache(str(tmpdir.join('cache'))))
+
+
+@pytest.fixture()
+def editable_repo(tmpdir, tmp_misc_cache):
+    """A repository whose package files can be edited.
+
+    Yields a function to write a package and one to make a new ``Repo``
+    object, which sees the packages as they are at that point.
+    """
+    repo_dir = tmpdir.join('repo')
+    repo_dir.ensure('packages', dir=True)
+    repo_dir.join('repo.yaml').write(
+        'repo:\n  namespace: editable_test_repo\n')
+
+    def write_package(name, body, mtime=None):
+        pkg_file = repo_dir.join('packages', name, 'package.py')
+        pkg_file.write(
+            _package_template.format(name.capitalize(), name, body),
+            ensure=True)
+        if mtime is not None:
+            os.utime(str(pkg_file), (mtime, mtime))
+
+    def make_repo():
+        packages_path = str(repo_dir.join('packages'))
+        spack.repo.FastPackageChecker._paths_cache.pop(packages_path, None)
+        return spack.repo.Repo(str(repo_dir))
+
+    write_package('foo', "    version('1.0', 'abcdef')")
+    yield write_package, make_repo
+
+    spack.repo.FastPackageChecker._paths_cache.pop(
+        str(repo_dir.join('packages')), None)
+
+
 @pytest.fixture(scope='session')
 def linux_os():
     """Returns a named tuple with attributes 'name' and 'version'
@@ -273,6 +326,10 @@ def configuration_dir(tmpdir_factory, linux_os):
     content = ''.join(compilers_yaml.read()).format(linux_os)
     t = tmpdir.join('site', 'compilers.yaml')
     t.write(content)
+
+    # Generate module files on install, as with the default configuration
+    tmpdir.join('site', 'modules.yaml').write(
+        'modules:\n  enable:\n    - tcl\n    - dotkit\n')
     return tmpdir
 
 
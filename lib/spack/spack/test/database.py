@@ -646,3 +646,228 @@ def test_old_external_entries_prefix(mutable_database):
     assert record.path is None
     assert record.spec._prefix is None
     assert record.spec.prefix == record.spec.external_path
+
+
+@pytest.mark.parametrize('query', [
+    'mpileaks', 'mpi', 'callpath ^mpich', '%gcc', 'libelf%gcc@4.5.0',
+    'arch=test-debian6-x86_64', 'platform=test', 'mpileaks+debug',
+    'mpileaks~debug', 'mpileaks@2.3', 'dyninst foo=bar'
+])
+def test_query_index_narrows_without_losing_matches(database, query):
+    query_spec = spack.spec.Spec(query)
+    index = spack.database.QueryIndex(database._data)
+    candidates = index.candidates(query_spec)
+
+    expected = [
+        key for key, rec in database._data.items()
+        if rec.spec.satisfies(query_spec)]
+
+    if candidates is not None:
+        assert set(expected) <= candidates
+
+    # results come in database order, as without the index
+    with database.read_transaction():
+        assert [s.dag_hash() for s in database._query(
+            query, installed=any)] == expected
+
+
+def test_query_index_by_name(database):
+    index = spack.database.QueryIndex(database._data)
+
+    assert len(index.candidates(spack.spec.Spec('mpileaks'))) == 3
+    assert index.candidates(spack.spec.Spec('nonexistent')) == set()
+
+    # virtual specs are satisfied by their providers, so don't narrow
+    assert index.candidates(spack.spec.Spec('mpi')) is None
+
+
+def test_query_index_follows_add_and_remove(database):
+    # build the index, then modify the database
+    assert len(database.query('mpileaks')) == 3
+
+    rec = database.get_record('mpileaks ^mpich')
+    database.remove('mpileaks ^mpich')
+    assert len(database.query('mpileaks', installed=any)) == 2
+    assert rec.spec.dag_hash() not in \
+        database._query_index.candidates(spack.spec.Spec('mpileaks'))
+
+    database.add(rec.spec, spack.store.layout)
+    assert len(database.query('mpileaks')) == 3
+
+
+@pytest.fixture()
+def journal_db(tmpdir_factory, config):
+    with spack.config.override('config:db_storage', 'journal'):
+        db = spack.database.Database(str(tmpdir_factory.mktemp('journal')))
+    with open(db._index_path, 'w') as db_file:
+        db._write_to_file(db_file)
+    yield db
+
+
+def _journal_mock_repo():
+    default = ('build', 'link')
+    z = MockPackage('z', [], [])
+    y = MockPackage('y', [z], [default])
+    x = MockPackage('x', [], [])
+    return MockPackageMultiRepo([x, y, z])
+
+
+def test_journal_appends_instead_of_rewriting(journal_db, gen_mock_layout):
+    layout = gen_mock_layout('/j/')
+    with open(journal_db._index_path) as f:
+        index_before = f.read()
+
+    with spack.repo.swap(_journal_mock_repo()):
+        y = spack.spec.Spec('y').concretized()
+        x = spack.spec.Spec('x').concretized()
+        journal_db.add(y, layout)
+        journal_db.add(x, layout, explicit=True)
+        journal_db.remove(x)
+
+        # index.json is untouched, the changes are in the journal
+        with open(journal_db._index_path) as f:
+            assert f.read() == index_before
+        with open(journal_db._journal_path) as f:
+            ops = [json.loads(line).get('op') for line in f][1:]
+        assert ops == ['add', 'add', 'add', 'remove']
+
+        # a fresh database sees the same records
+        with spack.config.override('config:db_storage', 'journal'):
+            other = spack.database.Database(journal_db.root)
+        assert [s.name for s in other.query(installed=any)] == ['y', 'z']
+        assert other.get_record('z').ref_count == 1
+        other._check_ref_counts()
+
+
+def test_journal_compaction(journal_db, gen_mock_layout, monkeypatch):
+    monkeypatch.setattr(spack.database, '_journal_compaction_threshold', 2)
+    layout = gen_mock_layout('/j/')
+
+    with spack.repo.swap(_journal_mock_repo()):
+        journal_db.add(spack.spec.Spec('x').concretized(), layout)
+        assert os.path.exists(journal_db._journal_path)
+
+        # y and z would make the journal grow past the threshold
+        journal_db.add(spack.spec.Spec('y').concretized(), layout)
+        assert not os.path.exists(journal_db._journal_path)
+
+        with open(journal_db._index_path) as f:
+            installs = json.load(f)['database']['installs']
+        assert len(installs) == 3
+
+        other = spack.database.Database(journal_db.root)
+        assert len(other.query()) == 3
+
+
+def test_journal_ignores_partial_entries(journal_db, gen_mock_layout):
+    layout = gen_mock_layout('/j/')
+
+    with spack.repo.swap(_journal_mock_repo()):
+        journal_db.add(spack.spec.Spec('x').concretized(), layout)
+        with open(journal_db._journal_path, 'a') as f:
+            f.write('{"op": "add", "hash": "abc')
+
+        with spack.config.override('config:db_storage', 'journal'):
+            other = spack.database.Database(journal_db.root)
+        assert [s.name for s in other.query()] == ['x']
+
+
+def test_journal_storage_switch(journal_db, gen_mock_layout):
+    layout = gen_mock_layout('/j/')
+
+    def open_db(storage):
+        with spack.config.override('config:db_storage', storage):
+            return spack.database.Database(journal_db.root)
+
+    with spack.repo.swap(_journal_mock_repo()):
+        x = spack.spec.Spec('x').concretized()
+        y = spack.spec.Spec('y').concretized()
+        journal_db.add(x, layout)
+        journal_db.add(y, layout)
+
+        # Only the records that changed are written to the journal
+        with open(journal_db._journal_path) as f:
+            size = len(f.readlines())
+        with journal_db.write_transaction():
+            journal_db.get_record(x).explicit = True
+        with open(journal_db._journal_path) as f:
+            lines = f.readlines()
+        assert len(lines) == size + 1
+        assert json.loads(lines[-1])['op'] == 'update'
+
+        # Databases writing json read the journal, and fold it into
+        # the index when they write
+        with open(journal_db._journal_path) as f:
+            journal = f.read()
+        json_db = open_db('json')
+        assert sorted(s.name for s in json_db.query()) == ['x', 'y', 'z']
+        assert json_db.get_record(x).explicit
+        json_db.remove(x)
+        assert not os.path.exists(journal_db._journal_path)
+
+        # A journal that was not removed after the index was rewritten
+        # does not bring removed records back
+        with open(journal_db._journal_path, 'w') as f:
+            f.write(journal)
+        for storage in ('json', 'journal'):
+            assert sorted(s.name for s in open_db(storage).query()) == \
+                ['y', 'z']
+
+        # ... and the next journal write starts a new one
+        journal_db.add(x, layout)
+        with open(journal_db._journal_path) as f:
+            assert [json.loads(line).get('op') for line in f] == \
+                [None, 'add']
+        assert sorted(s.name for s in open_db('json').query()) == \
+            ['x', 'y', 'z']
+
+
+def test_records_are_built_lazily(mutable_database):
+    with mutable_database.read_transaction():
+        data = mutable_database._data
+        assert not any(rec.materialized for rec in data.values())
+
+        # hash lookups don't build specs
+        libelf_hash = next(
+            k for k, rec in data.items() if rec.name == 'libelf')
+        upstream, rec = mutable_database.query_by_spec_hash(libelf_hash)
+        assert not rec.materialized
+
+        # queries only build the specs they match, and their dependencies
+        libdwarf = mutable_database.query_one('libdwarf')
+        built = set(k for k, rec in data.items() if rec.materialized)
+        assert built == set(s.dag_hash() for s in libdwarf.traverse())
+
+        # dependencies are shared with the other records
+        assert libdwarf.dependencies() == [data[libelf_hash].spec]
+        assert libdwarf.dependencies()[0] is data[libelf_hash].spec
+        assert libdwarf.concrete
+
+        # dependents are built the first time they are asked for
+        libelf = data[libelf_hash].spec
+        dependents = libelf.dependents()
+        assert sorted(s.name for s in dependents) == ['dyninst', 'libdwarf']
+        assert all(data[s.dag_hash()].materialized for s in dependents)
+        assert libdwarf in dependents
+
+
+def test_lazy_records_index_like_built_ones(mutable_database):
+    with mutable_database.read_transaction():
+        data = mutable_database._data
+        lazy = spack.database.QueryIndex(data)
+        for rec in data.values():
+            rec.spec
+        built = spack.database.QueryIndex(data)
+
+    assert lazy._index == built._index
+
+
+def test_lazy_records_write_back_unchanged(mutable_database):
+    with mutable_database.read_transaction():
+        lazy = dict((k, rec.to_dict()['spec'])
+                    for k, rec in mutable_database._data.items())
+        built = dict((k, rec.spec.to_node_dict())
+                     for k, rec in mutable_database._data.items())
+
+    assert json.dumps(lazy, sort_keys=True) == json.dumps(
+        built, sort_keys=True)
@@ -0,0 +1,148 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import threading
+import time
+
+import pytest
+
+import spack.config
+import spack.fetch_scheduler
+import spack.fetch_strategy
+from spack.fetch_scheduler import FetchScheduler
+from spack.spec import Spec
+
+
+@pytest.mark.parametrize('value,rate', [
+    (0, None), (None, None), ('0', None), (512, 512), ('512', 512),
+    ('10k', 10 * 1024), ('2M', 2 * 1024 ** 2), ('1G', 1024 ** 3)])
+def test_parse_bandwidth(value, rate):
+    assert spack.fetch_scheduler.parse_bandwidth(value) == rate
+
+
+def test_parse_bandwidth_invalid():
+    with pytest.raises(ValueError):
+        spack.fetch_scheduler.parse_bandwidth('fast')
+
+
+def test_throttle():
+    throttle = spack.fetch_scheduler.Throttle(100000)
+    start = time.time()
+    for _ in range(5):
+        throttle.consume(10000)
+    assert time.time() - start >= 0.45
+    assert throttle.total == 50000
+
+    throttle.rate = None
+    start = time.time()
+    throttle.consume(10 ** 9)
+    assert time.time() - start < 0.1
+
+
+def test_host_connection(mutable_config):
+    spack.config.set('config:fetch_host_connections', 2)
+    lock = threading.Lock()
+    active = {'a.org': 0, 'b.org': 0}
+    most = {'a.org': 0, 'b.org': 0}
+
+    def download(host):
+        with spack.fetch_scheduler.host_connection('https://%s/x' % host):
+            with lock:
+                active[host] += 1
+                most[host] = max(most[host], active[host])
+            time.sleep(0.05)
+            with lock:
+                active[host] -= 1
+
+    threads = [threading.Thread(target=download, args=(host,))
+               for host in ['a.org', 'b.org'] * 4]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert most == {'a.org': 2, 'b.org': 2}
+
+
+def test_fetch_scheduler(mutable_config, mock_packages):
+    spack.config.set('config:checksum', False)
+    spec = Spec('mpileaks').concretized()
+    packages = [s.package for s in spec.traverse(order='post')]
+
+    lock = threading.Lock()
+    state = {'active': 0, 'most': 0, 'workers': set()}
+    fetched = []
+    done = []
+
+    def fetch(pkg):
+        with lock:
+            state['active'] += 1
+            state['most'] = max(state['most'], state['active'])
+            state['workers'].add(spack.fetch_scheduler.in_worker())
+        time.sleep(0.05)
+        with lock:
+            state['active'] -= 1
+            fetched.append(pkg.name)
+        if pkg.name == 'callpath':
+            raise spack.fetch_strategy.FetchError('no callpath here')
+
+    # Packages with the same DAG hash are fetched once
+    errors = FetchScheduler(jobs=3).fetch(
+        packages + packages, fetch, lambda pkg, e: done.append((pkg, e)))
+
+    assert sorted(fetched) == sorted(p.name for p in packages)
+    assert 1 < state['most'] <= 3
+    assert state['workers'] == set([True])
+    assert [(p.name, str(e)) for p, e in errors] == [
+        ('callpath', 'no callpath here')]
+    assert len(done) == len(packages)
+    assert not spack.fetch_scheduler.in_worker()
+
+
+def test_fetch_scheduler_serial(mutable_config, mock_packages):
+    spack.config.set('config:checksum', False)
+    spec = Spec('mpileaks').concretized()
+    packages = [s.package for s in spec.traverse(order='post')]
+
+    fetched = []
+    FetchScheduler(jobs=1).fetch(
+        packages, lambda pkg: fetched.append(
+            (pkg.name, spack.fetch_scheduler.in_worker())))
+    assert fetched == [(p.name, False) for p in packages]
+
+
+def test_no_checksum_fetched_serially(mutable_config, mock_packages):
+    # Fetching without a checksum may ask the user whether to go on
+    spack.config.set('config:checksum', True)
+    spec = Spec('mpileaks@9.9').concretized()
+    pkg = spec.package
+    assert not spack.fetch_scheduler.fetches_in_thread(pkg)
+    spack.config.set('config:checksum', False)
+    assert spack.fetch_scheduler.fetches_in_thread(pkg)
+
+
+def test_install_prefetch(install_mockery, mock_fetch, monkeypatch):
+    # install_mockery overrides the configuration until the test ends
+    spack.config.set('config:install_prefetch', True, scope='overrides')
+    spec = Spec('libdwarf').concretized()
+
+    waited = []
+    wait = spack.fetch_scheduler.Prefetcher.wait
+
+    def wait_and_check(self, s):
+        wait(self, s)
+        # The sources are there before the build starts
+        assert s.package.stage.archive_file
+        waited.append(s.name)
+    monkeypatch.setattr(
+        spack.fetch_scheduler.Prefetcher, 'wait', wait_and_check)
+
+    spec.package.do_install()
+    assert spec.package.installed
+    assert waited[-1] == 'libdwarf'
+    assert 'libelf' in waited
+    assert spack.fetch_scheduler._prefetcher is None
+
+    spec.package.do_uninstall(force=True)
+    spec['libelf'].package.do_uninstall(force=True)
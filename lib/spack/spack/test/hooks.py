@@ -0,0 +1,23 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import spack.hooks
+
+
+def test_module_hooks_match_hook_modules():
+    hook_names = [name for name, value in vars(spack.hooks).items()
+                  if isinstance(value, spack.hooks.HookRunner)]
+
+    for module in spack.hooks.all_hook_modules():
+        name = module.__name__.split('.')[-1]
+        defined = set(hook for hook in hook_names
+                      if callable(getattr(module, hook, None)))
+        assert set(spack.hooks.module_hooks[name]) == defined
+
+
+def test_hook_modules_are_loaded_for_their_hooks():
+    pre_run = spack.hooks.hook_modules('pre_run')
+    assert [m.__name__ for m in pre_run] == [
+        'spack.hooks.yaml_version_check']
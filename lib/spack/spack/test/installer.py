@@ -0,0 +1,124 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import multiprocessing
+import time
+
+import pytest
+
+import spack.config
+import spack.error
+import spack.installer
+import spack.repo
+from spack.spec import Spec
+
+
+def test_install_jobs_from_config_and_kwargs(config):
+    assert spack.installer.install_jobs() == 1
+    assert spack.installer.install_jobs({'install_jobs': 4}) == 4
+    assert spack.installer.install_jobs({'install_jobs': None}) == 1
+
+    with spack.config.override('config:install_jobs', 3):
+        assert spack.installer.install_jobs() == 3
+        assert spack.installer.install_jobs({'install_jobs': 2}) == 2
+
+
+@pytest.mark.parametrize('make_jobs,install_jobs,expected', [
+    (16, 4, 4),
+    (16, 3, 5),
+    (2, 8, 1),
+    (8, 1, 8),
+])
+def test_make_jobs_share(make_jobs, install_jobs, expected):
+    assert spack.installer.make_jobs_share(
+        make_jobs, install_jobs) == expected
+
+
+def test_make_jobs_share_default(config):
+    with spack.config.override('config:build_jobs', 12):
+        assert spack.installer.make_jobs_share(None, 4) == 3
+
+
+def test_schedule_is_topological(mock_packages):
+    spec = Spec('dt-diamond').concretized()
+    installer = spack.installer.DagInstaller(spec, 2)
+
+    assert 'dt-diamond' not in [s.name for s in installer.specs.values()]
+    names = lambda hashes: [installer.specs[h].name for h in hashes]
+
+    assert names(installer.ready()) == ['dt-diamond-bottom']
+    installer._done(spec['dt-diamond-bottom'].dag_hash())
+    assert names(installer.ready()) == ['dt-diamond-left', 'dt-diamond-right']
+
+
+def test_failure_skips_dependents(mock_packages):
+    spec = Spec('mpileaks ^mpich').concretized()
+    installer = spack.installer.DagInstaller(spec, 2)
+
+    installer._fail(spec['mpich'].dag_hash(), 'error')
+    skipped = set(installer.specs[h].name for h in installer.skipped)
+    assert skipped == set(['callpath'])
+    assert set(installer.specs[h].name for h in installer.ready()) == set(
+        ['libelf'])
+
+
+def test_parallel_install(install_mockery, mock_fetch):
+    spec = Spec('dt-diamond').concretized()
+    spec.package.do_install(install_jobs=2, fake=True)
+
+    for s in spec.traverse():
+        assert s.package.installed
+
+
+@pytest.mark.disable_clean_stage_check
+def test_parallel_install_failure(install_mockery, mock_fetch, monkeypatch):
+    spec = Spec('dt-diamond').concretized()
+
+    def fail_install(self):
+        raise spack.error.SpackError('Intentional failure')
+
+    monkeypatch.setattr(
+        spack.repo.path.get_pkg_class('dt-diamond-left'), 'do_fake_install',
+        fail_install)
+
+    with pytest.raises(spack.installer.ParallelInstallError) as exc_info:
+        spec.package.do_install(install_jobs=2, fake=True)
+
+    failures = exc_info.value.failures
+    assert [s.name for s, _ in failures] == ['dt-diamond-left']
+    assert spec['dt-diamond-right'].package.installed
+    assert not spec.package.installed
+
+
+class _FakeTime(object):
+    @staticmethod
+    def sleep(seconds):
+        raise KeyboardInterrupt()
+
+
+def test_interrupt_stops_workers(mock_packages, monkeypatch):
+    spec = Spec('dt-diamond').concretized()
+    installer = spack.installer.DagInstaller(spec, 2)
+
+    started = []
+
+    class Process(multiprocessing.Process):
+        def start(self):
+            super(Process, self).start()
+            started.append(self)
+
+    def hang(spec, kwargs, conn):
+        time.sleep(60)
+
+    monkeypatch.setattr(multiprocessing, 'Process', Process)
+    monkeypatch.setattr(spack.installer, '_install_worker', hang)
+    monkeypatch.setattr(installer, '_needs_worker', lambda spec: True)
+    monkeypatch.setattr(spack.installer, 'time', _FakeTime)
+
+    with pytest.raises(KeyboardInterrupt):
+        installer.install()
+
+    assert [p.name for p in started]
+    assert not any(p.is_alive() for p in started)
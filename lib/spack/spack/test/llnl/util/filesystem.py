@@ -88,6 +88,47 @@ class TestInstall:
             check_added_exe_permissions('source/1', 'dest/1')
 
 
+class TestReflink:
+    """Tests for ``filesystem.reflink``"""
+
+    def test_file(self, tmpdir):
+        src = tmpdir.join('src')
+        src.write('data')
+        os.chmod(str(src), 0o750)
+        os.utime(str(src), (1000000000, 1000000000))
+        dest = str(tmpdir.join('dest'))
+
+        # shared or not, depending on the filesystem of tmpdir
+        fs.reflink(str(src), dest)
+        with open(dest) as f:
+            assert f.read() == 'data'
+        assert not os.path.samefile(str(src), dest)
+        assert stat.S_IMODE(os.stat(dest).st_mode) == 0o750
+        assert os.stat(dest).st_mtime == 1000000000
+
+    def test_fallback(self, tmpdir, monkeypatch):
+        import errno
+        import fcntl
+
+        def ioctl(fd, request, arg):
+            assert request == fs._FICLONE
+            raise IOError(errno.EOPNOTSUPP, 'Operation not supported')
+        monkeypatch.setattr(fcntl, 'ioctl', ioctl)
+
+        src = tmpdir.join('src')
+        src.write('data')
+        assert not fs.reflink(str(src), str(tmpdir.join('dest')))
+        assert tmpdir.join('dest').read() == 'data'
+
+    def test_link(self, tmpdir):
+        tmpdir.join('target').write('data')
+        os.symlink('target', str(tmpdir.join('src')))
+        dest = str(tmpdir.join('dest'))
+
+        assert not fs.reflink(str(tmpdir.join('src')), dest)
+        assert os.readlink(dest) == 'target'
+
+
 class TestCopyTree:
     """Tests for ``filesystem.copy_tree``"""
 
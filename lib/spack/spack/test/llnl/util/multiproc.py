@@ -0,0 +1,27 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import os
+
+import llnl.util.multiproc as mp
+
+
+def test_fork_map_takes_unpicklable_arguments():
+    offset = 10
+    elements = [lambda i=i: i for i in range(20)]
+    assert mp.fork_map(lambda f: f() + offset, elements, 4) == list(
+        range(10, 30))
+
+
+def test_fork_map_runs_in_workers():
+    pids = mp.fork_map(lambda x: os.getpid(), range(8), 2, chunksize=1)
+    assert os.getpid() not in pids
+
+
+def test_fork_map_calls_do_not_share_arguments():
+    first = mp.fork_map(str, range(5), 2)
+    second = mp.fork_map(lambda x: x * 2, ['a', 'b'], 2)
+    assert first == ['0', '1', '2', '3', '4']
+    assert second == ['aa', 'bb']
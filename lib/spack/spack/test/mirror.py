@@ -45,14 +45,14 @@ def set_up_package(name, repository, url_attr):
     pkg.versions[v][url_attr] = repository.url
 
 
-def check_mirror():
+def check_mirror(jobs=None):
     with Stage('spack-mirror-test') as stage:
         mirror_root = os.path.join(stage.path, 'test-mirror')
         # register mirror with spack config
         mirrors = {'spack-mirror-test': 'file://' + mirror_root}
         spack.config.set('mirrors', mirrors)
         with spack.config.override('config:checksum', False):
-            spack.mirror.create(mirror_root, repos)
+            spack.mirror.create(mirror_root, repos, jobs=jobs)
 
         # Stage directory exists
         assert os.path.isdir(mirror_root)
@@ -94,9 +94,10 @@ def check_mirror():
                         assert all(l in exclude for l in dcmp.left_only)
 
 
-def test_url_mirror(mock_archive):
+@pytest.mark.parametrize('jobs', [None, 2])
+def test_url_mirror(mock_archive, jobs):
     set_up_package('trivial-install-test-package', mock_archive, 'url')
-    check_mirror()
+    check_mirror(jobs)
     repos.clear()
 
 
@@ -137,7 +138,7 @@ def test_all_mirror(
     set_up_package('svn-test', mock_svn_repository, 'svn')
     set_up_package('hg-test', mock_hg_repository, 'hg')
     set_up_package('trivial-install-test-package', mock_archive, 'url')
-    check_mirror()
+    check_mirror(jobs=4)
     repos.clear()
 
 
@@ -30,7 +30,13 @@ def filename_dict(file_registry, monkeypatch):
     of disk.
     """
     @contextlib.contextmanager
-    def _mock(filename, mode):
+    def _mock(filename, mode='r'):
+        if mode == 'r':
+            # Module files are read to check if they are up to date
+            if filename not in file_registry:
+                raise IOError('no such file [stringio_open]')
+            yield StringIO(file_registry[filename])
+            return
         if not mode == 'w':
             raise RuntimeError('opening mode must be "w" [stringio_open]')
 
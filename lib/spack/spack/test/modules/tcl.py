@@ -310,3 +310,36 @@ class TestTcl(object):
         # Test the mpileaks that should NOT have the autoloaded dependencies
         content = modulefile_content('mpileaks ^mpich')
         assert len([x for x in content if 'is-loaded' in x]) == 0
+
+    def test_digest(
+            self, filename_dict, module_configuration, monkeypatch
+    ):
+        """Tests that module files are not written again while what they
+        are made from does not change."""
+
+        module_configuration('autoload_direct')
+        spec = spack.spec.Spec(mpileaks_spec_string).concretized()
+        writer = writer_cls(spec)
+        filename = writer.layout.filename
+
+        assert writer.write()
+        digest = spack.modules.common.read_digest(filename)
+        assert filename_dict[filename].endswith(
+            '# spack-module-digest: {0}\n'.format(digest))
+        assert not writer_cls(spec).write(overwrite=True)
+
+        # The rules that apply to the spec changed
+        module_configuration('autoload_all')
+        assert writer_cls(spec).write(overwrite=True)
+        digest = spack.modules.common.read_digest(filename)
+        assert digest
+
+        # The name of the module of a dependency changed
+        configuration = spack.modules.tcl.configuration
+        configuration['callpath'] = {'suffixes': {'callpath': 'new'}}
+        monkeypatch.setattr(spack.modules.tcl, 'configuration_registry', {})
+        assert writer_cls(spec).write(overwrite=True)
+        assert spack.modules.common.read_digest(filename) != digest
+        assert any('callpath' in x and '-new' in x
+                   for x in filename_dict[filename].split('\n')
+                   if 'module load' in x)
@@ -0,0 +1,92 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import time
+
+import pytest
+
+import spack.repo
+from spack.cmd.dependents import inverted_dependencies
+from spack.spec import Spec
+from spack.version import Version
+
+
+def test_metadata_matches_package_classes(mock_packages, tmp_misc_cache):
+    repo = spack.repo.path
+    for name in repo.all_package_names():
+        cls = repo.get_pkg_class(name)
+        pkg = repo.get_pkg_metadata(name)
+
+        assert pkg.name == cls.name
+        assert pkg.fullname == cls.fullname
+        assert pkg.__doc__ == cls.__doc__
+        assert pkg.url == getattr(cls, 'url', None)
+        assert pkg.versions == cls.versions
+        assert pkg.variants.keys() == cls.variants.keys()
+        for vname, variant in cls.variants.items():
+            assert pkg.variants[vname].default == variant.default
+        assert pkg.provided == cls.provided
+        assert pkg.conflicts == cls.conflicts
+        assert pkg.extendees.keys() == cls.extendees.keys()
+        assert pkg.patches == dict(
+            (when, [p.sha256 for p in patches])
+            for when, patches in cls.patches.items())
+
+        assert pkg.dependencies.keys() == cls.dependencies.keys()
+        for dep_name, conditions in cls.dependencies.items():
+            metadata_conditions = pkg.dependencies[dep_name]
+            assert metadata_conditions.keys() == conditions.keys()
+            for when, dep in conditions.items():
+                assert metadata_conditions[when].spec == dep.spec
+                assert metadata_conditions[when].type == dep.type
+
+
+def test_metadata_queries_do_not_import_packages(
+        mock_packages, tmp_misc_cache, monkeypatch):
+    expected = dict((k, set(v)) for k, v in inverted_dependencies().items())
+    spack.repo.path.get_pkg_metadata('mpileaks')
+
+    def no_import(*args, **kwargs):
+        raise AssertionError('package imported')
+    monkeypatch.setattr(spack.repo.Repo, 'get_pkg_class', no_import)
+    monkeypatch.setattr(spack.repo.Repo, 'get', no_import)
+
+    assert inverted_dependencies() == expected
+    pkg = spack.repo.path.get_pkg_metadata('builtin.mock.mpileaks')
+    assert set(pkg.dependencies_of_type('link')) == set(['mpi', 'callpath'])
+    assert Spec('mpileaks') in pkg.dependencies['callpath']
+
+
+def test_metadata_of_unknown_package(mock_packages, tmp_misc_cache):
+    with pytest.raises(spack.repo.UnknownPackageError):
+        spack.repo.path.get_pkg_metadata('nonexistentpackage')
+
+
+def test_metadata_is_updated_when_packages_change(editable_repo):
+    write_package, make_repo = editable_repo
+    write_package('bar', "    depends_on('foo')", mtime=time.time() - 60)
+
+    repo = make_repo()
+    assert Version('1.0') in repo.get_pkg_metadata('foo').versions
+    assert 'foo' in repo.get_pkg_metadata('bar').dependencies
+
+    # only packages newer than the index are imported again
+    write_package('foo', "    version('2.0', 'abcdef')",
+                  mtime=time.time() + 60)
+    imported = []
+    get_pkg_class = spack.repo.Repo.get_pkg_class
+
+    repo = make_repo()
+    repo.get_pkg_class = lambda name: (
+        imported.append(name) or get_pkg_class(repo, name))
+    assert Version('2.0') in repo.get_pkg_metadata('foo').versions
+    assert imported == ['editable_test_repo.foo']
+
+
+def test_metadata_index_is_stale_when_spack_changes(editable_repo):
+    _, make_repo = editable_repo
+    indexer = spack.repo.MetadataIndexer(make_repo())
+    assert indexer.is_stale(0)
+    assert not indexer.is_stale(time.time() + 60)
@@ -6,19 +6,27 @@
 """
 This test checks the binary packaging infrastructure
 """
+import errno
+import gzip
+import io
+import json
 import os
 import stat
 import sys
 import shutil
 import pytest
 import argparse
+import tarfile
+from contextlib import closing
 
 from llnl.util.filesystem import mkdirp
 
 import spack.repo
 import spack.store
 import spack.binary_distribution as bindist
+import spack.caches
 import spack.cmd.buildcache as buildcache
+import spack.util.spack_yaml as syaml
 from spack.spec import Spec
 from spack.paths import mock_gpg_keys_path
 from spack.fetch_strategy import URLFetchStrategy, FetchStrategyComposite
@@ -55,7 +63,7 @@ def fake_fetchify(url, pkg):
 
 
 @pytest.mark.usefixtures('install_mockery', 'testing_gpg_directory')
-def test_buildcache(mock_archive, tmpdir):
+def test_buildcache(mock_archive, tmpdir, monkeypatch):
     # tweak patchelf to only do a download
     spec = Spec("patchelf")
     spec.concretize()
@@ -206,6 +214,24 @@ echo $PATH"""
     assert(buildinfo['relocate_textfiles'] == ['dummy.txt'])
     assert(buildinfo['relocate_links'] == ['link_to_dummy.txt'])
 
+    # Install a content-addressed package, from the blobs of its files
+    os.remove(os.path.join(mirror_path, bindist.build_cache_relative_path(),
+                           bindist.tarball_path_name(spec, '.spack')))
+    monkeypatch.setattr(bindist, 'local_blobs_directory',
+                        lambda: str(tmpdir.join('blobs')))
+    args = parser.parse_args(['create', '-d', mirror_path, '-f', '-u',
+                              '--content-addressed', str(pkghash)])
+    buildcache.buildcache(parser, args)
+    pkg.do_uninstall(force=True)
+    args = parser.parse_args(['install', '-u', '--hardlink', str(spec)])
+    buildcache.install_tarball(spec, args)
+
+    files = os.listdir(spec.prefix)
+    assert 'link_to_dummy.txt' in files
+    assert 'dummy.txt' in files
+    with open(os.path.join(spec.prefix, 'dummy.txt')) as f:
+        assert f.read() == spec.prefix
+
     args = parser.parse_args(['list'])
     buildcache.buildcache(parser, args)
 
@@ -235,6 +261,383 @@ echo $PATH"""
     bindist._cached_specs = None
 
 
+def test_write_prefix_tarball(tmpdir):
+    prefix = tmpdir.mkdir('prefix')
+    prefix.ensure('bin', 'exe').write('original')
+    prefix.ensure('share', 'data').write('data')
+    prefix.join('lib').mksymlinkto(prefix.join('share'))
+
+    # Files in the work directory replace or add to those in the prefix
+    workdir = tmpdir.mkdir('work').join('prefix')
+    workdir.ensure('bin', 'exe').write('relocated')
+    workdir.ensure('.spack', 'binary_distribution').write('buildinfo')
+
+    tarball = str(tmpdir.join('prefix.tar.gz'))
+    checksum = bindist.write_prefix_tarball(
+        tarball, str(prefix), str(workdir), jobs=2)
+    assert checksum == bindist.checksum_tarball(tarball)
+
+    with closing(tarfile.open(tarball)) as tar:
+        assert sorted(tar.getnames()) == [
+            'prefix', 'prefix/.spack/binary_distribution', 'prefix/bin',
+            'prefix/bin/exe', 'prefix/lib', 'prefix/share',
+            'prefix/share/data']
+        assert tar.extractfile('prefix/bin/exe').read() == b'relocated'
+        assert tar.extractfile('prefix/share/data').read() == b'data'
+        assert tar.getmember('prefix/lib').issym()
+
+
+def test_extract_prefix_tarball(tmpdir):
+    old_root, new_root = '/old/spack/opt', '/new/spack/opt'
+    prefix = tmpdir.mkdir('prefix')
+    prefix.ensure('README').write(old_root)
+    prefix.ensure('bin', 'script').write('#!' + old_root + '/bin/sh')
+    prefix.ensure('share', 'data').write(old_root)
+    prefix.join('bin', 'script').chmod(0o700)
+    prefix.ensure('.spack', 'spec.yaml')
+
+    workdir = tmpdir.mkdir('work').join('prefix')
+    workdir.ensure('.spack', 'binary_distribution').write(syaml.dump({
+        'buildpath': old_root,
+        'relocate_textfiles': ['README', 'bin/script'],
+    }))
+    tarball = str(tmpdir.join('prefix.tar.gz'))
+    checksum = bindist.write_prefix_tarball(tarball, str(prefix), str(workdir))
+
+    extracted = tmpdir.mkdir('extracted')
+    with open(tarball, 'rb') as f:
+        reader = bindist._HashingReader(f)
+        buildinfo, textfiles = bindist.extract_prefix_tarball(
+            reader, str(extracted), new_root)
+        assert reader.hexdigest() == checksum
+
+    # Text files after the buildinfo file are relocated as they are written
+    assert buildinfo['buildpath'] == old_root
+    assert textfiles == ['README']
+    assert extracted.join('prefix', 'README').read() == old_root
+    assert extracted.join('prefix', 'bin', 'script').read() == \
+        '#!' + new_root + '/bin/sh'
+    assert extracted.join('prefix', 'share', 'data').read() == old_root
+    assert extracted.join('prefix', '.spack', 'binary_distribution').check()
+
+    # Permissions are those install_tree would give
+    mode = os.stat(str(extracted.join('prefix', 'bin', 'script'))).st_mode
+    assert stat.S_IMODE(mode) == 0o744
+
+
+def _unsafe_tarball(path, members):
+    """Write a gzipped tarball with (name, type, link target) members."""
+    with closing(tarfile.open(path, 'w:gz')) as tar:
+        for name, member_type, linkname in members:
+            info = tarfile.TarInfo(name)
+            info.type = member_type
+            info.linkname = linkname
+            tar.addfile(info, io.BytesIO(b''))
+
+
+@pytest.mark.parametrize('members', [
+    [('../evil', tarfile.REGTYPE, '')],
+    [('/tmp/evil', tarfile.REGTYPE, '')],
+    [('prefix/../../evil', tarfile.REGTYPE, '')],
+    [('prefix/lnk', tarfile.LNKTYPE, '../../etc/passwd')],
+    [('prefix/lib', tarfile.SYMTYPE, '../../outside')],
+    [('prefix/lib', tarfile.SYMTYPE, '{outside}'),
+     ('prefix/lib/evil', tarfile.REGTYPE, '')],
+])
+def test_extract_prefix_tarball_rejects_unsafe_members(tmpdir, members):
+    outside = tmpdir.mkdir('outside')
+    tarball = str(tmpdir.join('evil.tar.gz'))
+    _unsafe_tarball(tarball, [('prefix', tarfile.DIRTYPE, '')] + [
+        (n, t, l.format(outside=outside)) for n, t, l in members])
+
+    extracted = tmpdir.mkdir('extracted')
+    with open(tarball, 'rb') as f:
+        with pytest.raises(bindist.UnsafeArchiveError):
+            bindist.extract_prefix_tarball(f, str(extracted))
+    assert not outside.listdir()
+    assert not tmpdir.join('evil').check()
+
+
+def test_extract_tarballs_in_parallel(tmpdir, monkeypatch):
+    def fake_extract_tarball(spec, filename, **kwargs):
+        if spec.name == 'broken':
+            raise ValueError('cannot extract')
+        with open(filename, 'w') as f:
+            f.write(spec.name)
+    monkeypatch.setattr(bindist, 'extract_tarball', fake_extract_tarball)
+
+    tarballs = [(Spec(name), str(tmpdir.join(name)))
+                for name in ('a', 'broken', 'c')]
+    errors = bindist.extract_tarballs(tarballs, jobs=2)
+    assert errors[0] is None and errors[2] is None
+    assert 'cannot extract' in errors[1]
+    assert tmpdir.join('a').read() == 'a'
+    assert tmpdir.join('c').read() == 'c'
+
+
+def test_build_tarballs_in_parallel(tmpdir, monkeypatch):
+    def fake_build_tarball(spec, outdir, jobs=None, **kwargs):
+        if spec.name == 'broken':
+            raise ValueError('cannot build')
+        with open(os.path.join(outdir, spec.name), 'w') as f:
+            f.write(str(jobs))
+    monkeypatch.setattr(bindist, 'build_tarball', fake_build_tarball)
+
+    outdir = str(tmpdir)
+    mkdirp(bindist.build_cache_directory(outdir))
+    specs = [Spec('a'), Spec('b'), Spec('broken'), Spec('c')]
+    with pytest.raises(bindist.BuildTarballError) as e:
+        bindist.build_tarballs(specs, outdir, jobs=2, regenerate_index=True)
+
+    assert 'broken' in e.value.long_message
+    for name in 'abc':
+        assert os.path.exists(os.path.join(outdir, name))
+    assert os.path.exists(os.path.join(
+        bindist.build_cache_directory(outdir), 'index.json'))
+
+
+@pytest.mark.parametrize('content_addressed', [False, True])
+@pytest.mark.usefixtures('config', 'mock_packages')
+def test_build_tarball_refusal_leaves_no_directory(tmpdir, content_addressed):
+    spec = Spec('a').concretized()
+    build_cache_dir = bindist.build_cache_directory(str(tmpdir))
+    mkdirp(build_cache_dir)
+    with open(os.path.join(
+            build_cache_dir, bindist.tarball_name(spec, '.spec.yaml')), 'w'):
+        pass
+
+    with pytest.raises(bindist.NoOverwriteException):
+        bindist.build_tarball(spec, str(tmpdir), unsigned=True,
+                              content_addressed=content_addressed)
+    assert not os.path.exists(os.path.join(
+        build_cache_dir, bindist.tarball_directory_name(spec)))
+
+
+@pytest.mark.usefixtures('mutable_config')
+def test_content_addressed_packages(tmpdir, monkeypatch):
+    old_root, new_root = '/old/spack/opt', '/new/spack/opt'
+    build_cache_dir = bindist.build_cache_directory(str(tmpdir))
+    spack.config.set('mirrors', {'test': 'file://' + str(tmpdir)})
+    spack.config.set('config:source_cache', str(tmpdir.join('cache')))
+
+    def make_prefix(name, version):
+        prefix = tmpdir.mkdir(name)
+        prefix.ensure('bin', 'exe').write('#!' + old_root + '/bin/sh')
+        prefix.join('bin', 'exe').chmod(0o755)
+        prefix.ensure('share', 'data').write('shared data')
+        prefix.ensure('share', 'version').write(version)
+        prefix.join('lib').mksymlinkto('share')
+        prefix.join('share').chmod(0o750)
+        workdir = tmpdir.mkdir(name + '-work').join(name)
+        workdir.ensure('.spack', 'binary_distribution').write(syaml.dump({
+            'buildpath': old_root,
+            'relocate_textfiles': ['bin/exe'],
+            'relocate_binaries': [],
+        }))
+        manifest_path = str(tmpdir.join(name + '.manifest.json'))
+        checksum = bindist.write_content_manifest(
+            manifest_path, build_cache_dir, str(prefix), str(workdir), jobs=2)
+        assert checksum == bindist.checksum_tarball(manifest_path)
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def blobs():
+        return sorted(os.listdir(os.path.join(build_cache_dir, 'blobs')))
+
+    first = make_prefix('first', '1.0')
+    n_blobs = len(blobs())
+    assert n_blobs == 4
+
+    # Only the files that differ add blobs
+    second = make_prefix('second', '2.0')
+    assert len(blobs()) == n_blobs + 1
+
+    extracted = str(tmpdir.join('extracted'))
+    buildinfo, textfiles = bindist.extract_blobs(
+        first, extracted, new_root, hardlink=True)
+    assert buildinfo['buildpath'] == old_root
+    assert textfiles == []
+    with open(os.path.join(extracted, 'bin', 'exe')) as f:
+        assert f.read() == '#!' + new_root + '/bin/sh'
+    assert os.readlink(os.path.join(extracted, 'lib')) == 'share'
+
+    # Relocated files are copies, others link to the local blobs
+    data = os.path.join(extracted, 'share', 'data')
+    assert os.stat(data).st_nlink == 2
+    assert stat.S_IMODE(os.stat(data).st_mode) == 0o444
+    exe = os.path.join(extracted, 'bin', 'exe')
+    assert os.stat(exe).st_nlink == 1
+    assert stat.S_IMODE(os.stat(exe).st_mode) == 0o755
+    # Directories get their recorded mode
+    assert stat.S_IMODE(
+        os.stat(os.path.join(extracted, 'share')).st_mode) == 0o750
+
+    # Blobs are gzipped, and don't depend on when they were written
+    blob_path = os.path.join(build_cache_dir, bindist.blob_path_name(
+        bindist._hash_file(data)))
+    with closing(gzip.GzipFile(blob_path, 'rb')) as f:
+        assert f.read() == b'shared data'
+    with open(blob_path, 'rb') as f:
+        assert f.read()[4:8] == b'\0\0\0\0'
+
+    # Only the blobs that are not available locally are downloaded
+    downloaded = []
+    download_blob = bindist._download_blob
+
+    def _download_blob(blob_hash, local_path):
+        downloaded.append(blob_hash)
+        download_blob(blob_hash, local_path)
+    monkeypatch.setattr(bindist, '_download_blob', _download_blob)
+
+    extracted = str(tmpdir.join('extracted-second'))
+    bindist.extract_blobs(second, extracted, new_root)
+    assert len(downloaded) == 1
+    with open(os.path.join(extracted, 'share', 'version')) as f:
+        assert f.read() == '2.0'
+    assert os.stat(os.path.join(extracted, 'share', 'data')).st_nlink == 1
+
+    # Blobs are checked against their hash
+    with pytest.raises(bindist.BlobFetchError):
+        bindist.fetch_blobs(['0' * 64])
+    blob_hash = next(e[3] for e in second['content_manifest']['entries']
+                     if e[0] == 'share/version')
+    blob_path = os.path.join(build_cache_dir, bindist.blob_path_name(
+        blob_hash))
+    os.chmod(blob_path, 0o644)
+    with closing(gzip.GzipFile(blob_path, 'wb')) as f:
+        f.write(b'corrupt')
+    with pytest.raises(bindist.NoChecksumException):
+        bindist._download_blob(blob_hash, str(tmpdir.join('blob')))
+    assert not os.path.exists(str(tmpdir.join('blob')))
+
+    # Files are copied when the blobs can't be linked to
+    def link(src, dest):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    monkeypatch.setattr(os, 'link', link)
+    copied = str(tmpdir.join('copied'))
+    bindist.extract_blobs(first, copied, new_root, hardlink=True)
+    data = os.path.join(copied, 'share', 'data')
+    assert os.stat(data).st_nlink == 1
+    with open(data) as f:
+        assert f.read() == 'shared data'
+
+
+def write_spec_yaml(build_cache_dir, spec):
+    """Write the spec.yaml that build_tarball would make for spec."""
+    spec_dict = spec.to_dict()
+    spec_dict['binary_cache_checksum'] = {
+        'hash_algorithm': 'sha256', 'hash': spec.dag_hash()}
+    spec_dict['full_hash'] = spec.full_hash()
+    path = os.path.join(build_cache_dir, bindist.tarball_name(
+        spec, '.spec.yaml'))
+    with open(path, 'w') as f:
+        f.write(syaml.dump(spec_dict))
+
+
+@pytest.mark.disable_clean_stage_check
+@pytest.mark.usefixtures('mutable_config', 'mock_packages', 'tmp_misc_cache')
+def test_buildcache_index(tmpdir):
+    mirror_url = 'file://' + str(tmpdir)
+    build_cache_dir = bindist.build_cache_directory(str(tmpdir))
+    mkdirp(build_cache_dir)
+
+    specs = [Spec('mpileaks').concretized(), Spec('libelf').concretized()]
+    for spec in specs:
+        write_spec_yaml(build_cache_dir, spec)
+    bindist.generate_package_index(build_cache_dir)
+
+    index = bindist.get_index(mirror_url)
+    assert sorted(e['full_hash'] for e in index['specs'].values()) == \
+        sorted(s.full_hash() for s in specs)
+
+    # libelf is shared by both specs, but stored only once
+    assert len(index['nodes']) == len(set(
+        d.dag_hash() for s in specs for d in s.traverse()))
+
+    from_index = bindist._specs_from_index(index)
+    assert sorted(s.dag_hash() for s in from_index) == \
+        sorted(s.dag_hash() for s in specs)
+    assert all(s.concrete for s in from_index)
+
+    # The cached index is used as long as the mirror's does not change
+    os.remove(os.path.join(build_cache_dir, 'index.json.hash'))
+    assert bindist.get_index(mirror_url) == index
+
+    # A changed index is read again, and checked against its checksum
+    index_json = os.path.join(build_cache_dir, 'index.json')
+    os.utime(index_json, (0, 0))
+    with pytest.raises(IOError):
+        bindist._read_index(mirror_url, {})
+    assert bindist.get_index(mirror_url) is None
+
+    with open(index_json + '.hash', 'w') as f:
+        f.write('0' * 64)
+    assert bindist.get_index(mirror_url) is None
+
+    bindist.generate_package_index(build_cache_dir)
+    assert bindist.get_index(mirror_url) == index
+
+    # Without an index, get_specs falls back to reading every spec.yaml
+    os.remove(index_json)
+    spack.config.set('mirrors', {'test': mirror_url})
+    bindist._cached_specs = None
+    try:
+        assert sorted(s.dag_hash() for s in bindist.get_specs()) == \
+            sorted(s.dag_hash() for s in specs)
+    finally:
+        bindist._cached_specs = None
+
+
+@pytest.mark.usefixtures('mutable_config', 'mock_packages', 'tmp_misc_cache')
+def test_needs_rebuilds(tmpdir, monkeypatch):
+    mirror_url = 'file://' + str(tmpdir)
+    build_cache_dir = bindist.build_cache_directory(str(tmpdir))
+    mkdirp(build_cache_dir)
+
+    built, changed, missing = specs = [
+        Spec(s).concretized() for s in ('mpileaks', 'libelf', 'libdwarf')]
+    write_spec_yaml(build_cache_dir, built)
+    write_spec_yaml(build_cache_dir, changed)
+    monkeypatch.setattr(changed, 'full_hash', lambda: 'x' * 32)
+
+    assert bindist.needs_rebuilds(specs, mirror_url, jobs=2) == \
+        [False, True, False]
+    assert bindist.needs_rebuilds(specs, mirror_url, True) == \
+        [False, True, True]
+    assert bindist.needs_rebuild(missing, mirror_url, True)
+
+    # Specs in the index of the mirror don't need their spec.yaml
+    bindist.generate_package_index(build_cache_dir)
+    built_yaml = os.path.join(build_cache_dir, bindist.tarball_name(
+        built, '.spec.yaml'))
+    os.rename(built_yaml, built_yaml + '.bak')
+    assert bindist.needs_rebuilds(specs, mirror_url, True) == \
+        [False, True, True]
+
+    # Binaries removed from the index need a rebuild, even if an earlier
+    # check found them
+    bindist.generate_package_index(build_cache_dir)
+    assert bindist.needs_rebuilds(specs, mirror_url, True) == \
+        [True, True, True]
+
+    # Without an index, full hashes found by earlier checks are not read
+    # again until they expire, or until the check is forced
+    os.remove(os.path.join(build_cache_dir, 'index.json'))
+    cache_file = spack.caches.misc_cache.cache_path(
+        bindist._full_hashes_cache_key(mirror_url))
+    os.utime(cache_file, (0, 0))
+    assert not bindist.needs_rebuild(built, mirror_url, True)
+    # ... and are written only when they change
+    assert os.stat(cache_file).st_mtime == 0
+
+    assert bindist.needs_rebuilds([built], mirror_url, True, force=True) == \
+        [True]
+    monkeypatch.setattr(bindist, '_known_full_hash_ttl', 0)
+    assert bindist.needs_rebuild(built, mirror_url, True)
+    os.rename(built_yaml + '.bak', built_yaml)
+    assert not bindist.needs_rebuild(built, mirror_url, True)
+
+
 def test_relocate_text(tmpdir):
     with tmpdir.as_cwd():
         # Validate the text path replacement
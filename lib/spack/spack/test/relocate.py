@@ -10,8 +10,11 @@ import shutil
 import pytest
 
 import llnl.util.filesystem
+import spack.config
+import spack.hooks
 import spack.paths
 import spack.relocate
+import spack.spec
 import spack.store
 import spack.tengine
 import spack.util.executable
@@ -93,3 +96,132 @@ def test_file_is_relocatable_errors(tmpdir):
         with pytest.raises(ValueError) as exc_info:
             spack.relocate.file_is_relocatable('delete.me')
         assert 'is not an absolute path' in str(exc_info.value)
+
+
+@pytest.mark.skipif(
+    platform.system().lower() != 'linux',
+    reason='ELF files are only relocated on linux'
+)
+def test_relocate_elf_without_patchelf(tmpdir, monkeypatch):
+    # Shorter RPATHs and file types don't need any external tool
+    def no_executable(*args, **kwargs):
+        raise AssertionError('should not run any executable')
+    monkeypatch.setattr(spack.relocate, 'Executable', no_executable)
+
+    binary = str(tmpdir.join('rpath'))
+    shutil.copy(os.path.join(
+        spack.paths.test_path, 'data', 'elf', 'rpath'), binary)
+
+    assert spack.relocate.is_binary(binary)
+    assert spack.relocate.get_existing_elf_rpaths(binary) == [
+        '/spack/opt/spack/pkg-a/lib']
+    assert spack.relocate.strings_contains_installroot(binary, '/spack/opt')
+
+    spack.relocate.modify_elf_object(binary, ['/opt/pkg-a/lib'])
+    assert spack.relocate.get_existing_elf_rpaths(binary) == [
+        '/opt/pkg-a/lib']
+    assert not spack.relocate.strings_contains_installroot(
+        binary, '/spack/opt')
+
+
+def test_strings_contains_installroot_across_blocks(tmpdir):
+    path = tmpdir.join('data')
+    path.write('x' * 10 + '/spack/root' + 'x' * 10)
+    for block_size in (4, 13, 16, 100):
+        assert spack.relocate.strings_contains_installroot(
+            str(path), '/spack/root', block_size=block_size)
+        assert not spack.relocate.strings_contains_installroot(
+            str(path), '/spack/other', block_size=block_size)
+
+
+def test_text_relocator(tmpdir):
+    relocator = spack.relocate.TextRelocator({
+        '/old/spack': '/new/spack',
+        '/old/spack/opt/zlib': '/zlib',
+        '/same': '/same',
+    })
+    # the longest old prefix wins, whatever the order of the dict
+    assert relocator.relocate_data(
+        b'/old/spack/bin:/old/spack/opt/zlib/lib:/same') == \
+        b'/new/spack/bin:/zlib/lib:/same'
+
+    files = []
+    for i in range(10):
+        f = tmpdir.join('file%d' % i)
+        f.write('#!/old/spack/bin/sh\n' if i % 2 else 'nothing to do\n')
+        os.utime(str(f), (0, 0))
+        files.append(str(f))
+    tmpdir.join('empty').write('')
+    files.append(str(tmpdir.join('empty')))
+
+    changed = relocator.relocate_files(files, jobs=4)
+    assert changed == files[1:10:2]
+    for i, f in enumerate(files[:10]):
+        if i % 2:
+            assert open(f).read() == '#!/new/spack/bin/sh\n'
+        else:
+            # files without any old prefix are not rewritten
+            assert os.stat(f).st_mtime == 0
+
+
+@pytest.mark.requires_executables('file')
+def test_relocation_manifest(tmpdir):
+    root = '/spack/opt/spack'
+    prefix = tmpdir.join('pkg')
+    prefix.ensure('.spack', dir=True)
+    shutil.copy(os.path.join(spack.paths.test_path, 'data', 'elf', 'rpath'),
+                str(prefix.ensure('bin', dir=True).join('exe')))
+    prefix.join('bin', 'script').write(
+        '#!/bin/sh\nexec %s/pkg-b/bin/b %s/pkg-c\n' % (root, root))
+    prefix.join('share', 'readme').write('no root here', ensure=True)
+    prefix.join('share', 'man', 'man1', 'a.1').write(root, ensure=True)
+    prefix.join('lib').mksymlinkto(root + '/pkg-a/lib')
+
+    manifest = spack.relocate.write_relocation_manifest(str(prefix), root)
+    assert manifest['binaries'] == ['bin/exe']
+    assert manifest['textfiles'] == ['bin/script']
+    assert manifest['links'] == ['lib']
+    assert spack.relocate.read_relocation_manifest(
+        str(prefix), root) == manifest
+
+    # Manifests are out of date for other install roots, and when files
+    # are added or modified
+    assert spack.relocate.read_relocation_manifest(
+        str(prefix), '/other/root') is None
+    prefix.join('share', 'new').write(root)
+    os.utime(str(prefix.join('share', 'new')), (0, 0))
+    assert spack.relocate.read_relocation_manifest(str(prefix), root) is None
+    prefix.join('share', 'new').remove()
+    assert spack.relocate.read_relocation_manifest(str(prefix), root)
+
+    # Files as old as the manifest are not newer than it
+    written = os.stat(spack.relocate.relocation_manifest_path(
+        str(prefix))).st_mtime
+    os.utime(str(prefix.join('share', 'readme')), (written, written))
+    assert spack.relocate.read_relocation_manifest(str(prefix), root)
+    os.utime(str(prefix.join('share', 'readme')), (2 ** 31, 2 ** 31))
+    assert spack.relocate.read_relocation_manifest(str(prefix), root) is None
+
+    # An out of date manifest is computed again, and recorded
+    os.utime(str(prefix.join('share', 'readme')), (0, 0))
+    prefix.join('share', 'new').write('no root here either')
+    os.utime(str(prefix.join('share', 'new')), (0, 0))
+    assert spack.relocate.read_relocation_manifest(str(prefix), root) is None
+    manifest = spack.relocate.relocation_manifest(str(prefix), root)
+    assert manifest['textfiles'] == ['bin/script']
+    assert spack.relocate.read_relocation_manifest(
+        str(prefix), root) == manifest
+
+
+def test_relocation_manifest_hook_is_opt_in(install_mockery, mock_fetch):
+    spec = spack.spec.Spec('trivial-install-test-package').concretized()
+    spec.package.do_install(fake=True)
+    manifest_path = spack.relocate.relocation_manifest_path(spec.prefix)
+    assert not os.path.exists(manifest_path)
+
+    # install_mockery already holds the 'overrides' scope
+    scope = spack.config.InternalConfigScope(
+        'relocation_manifest', {'config': {'relocation_manifest': True}})
+    with spack.config.override(scope):
+        spack.hooks.post_install(spec)
+    assert os.path.exists(manifest_path)
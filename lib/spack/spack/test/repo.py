@@ -3,8 +3,13 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import os
+import shutil
+import time
+
 import pytest
 
+import spack.caches
 import spack.repo
 import spack.paths
 
@@ -56,3 +61,129 @@ def test_repo_pkg_with_unknown_namespace(repo_for_test):
 def test_repo_unknown_pkg(repo_for_test):
     with pytest.raises(spack.repo.UnknownPackageError):
         repo_for_test.get('builtin.mock.nonexistentpackage')
+
+
+def age_indexes(seconds):
+    """Make all the cached indexes look older than they are."""
+    root = spack.caches.misc_cache.root
+    for dirpath, _, filenames in os.walk(root):
+        for f in filenames:
+            mtime = os.stat(os.path.join(dirpath, f)).st_mtime - seconds
+            os.utime(os.path.join(dirpath, f), (mtime, mtime))
+
+
+def test_index_update_only_writes_package_update(editable_repo):
+    write_package, make_repo = editable_repo
+    write_package('foo', "    tags = ['old']", mtime=time.time() - 120)
+    write_package('bar', "    provides('baz')", mtime=time.time() - 120)
+
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert repo.tag_index['old'] == ['foo']
+        assert repo.providers_for('baz')[0].name == 'bar'
+    age_indexes(90)
+
+    cache = spack.caches.misc_cache
+    base = cache.cache_path('tags/editable_test_repo-index.json')
+    updates = cache.cache_path('tags/editable_test_repo-updates')
+    with open(base) as f:
+        base_content = f.read()
+
+    write_package('foo', "    tags = ['new']", mtime=time.time() - 60)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert repo.tag_index['new'] == ['foo']
+        assert repo.tag_index['old'] == []
+        assert repo.providers_for('baz')[0].name == 'bar'
+
+    # the base index is left alone, and one update file is written
+    with open(base) as f:
+        assert f.read() == base_content
+    assert os.listdir(updates) == ['foo.json']
+
+    # updates are read back without importing packages again
+    repo = make_repo()
+    repo.get_pkg_class = None
+    assert repo.tag_index['new'] == ['foo']
+    assert 'baz' in repo.provider_index
+
+
+def test_index_updates_are_compacted(editable_repo, monkeypatch):
+    write_package, make_repo = editable_repo
+    write_package('foo', "    tags = ['old']", mtime=time.time() - 120)
+    write_package('bar', "    tags = ['old']", mtime=time.time() - 120)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        repo.tag_index
+    age_indexes(90)
+
+    monkeypatch.setattr(spack.repo.RepoIndex, 'max_updates', 1)
+    write_package('foo', "    tags = ['new']", mtime=time.time() - 60)
+    write_package('bar', "    tags = ['new']", mtime=time.time() - 60)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert sorted(repo.tag_index['new']) == ['bar', 'foo']
+
+    updates = spack.caches.misc_cache.cache_path(
+        'tags/editable_test_repo-updates')
+    assert os.listdir(updates) == []
+    assert sorted(make_repo().tag_index['new']) == ['bar', 'foo']
+
+    # the base is as recent as the newest package file it covers
+    base = spack.caches.misc_cache.cache_path(
+        'tags/editable_test_repo-index.json')
+    assert os.stat(base).st_mtime == os.stat(
+        os.path.join(repo.packages_path, 'bar', 'package.py')).st_mtime
+
+
+def test_index_drops_removed_packages(editable_repo):
+    write_package, make_repo = editable_repo
+    write_package('foo', "    tags = ['old']", mtime=time.time() - 120)
+    write_package('bar', "    tags = ['old']\n    provides('baz')",
+                  mtime=time.time() - 120)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert sorted(repo.tag_index['old']) == ['bar', 'foo']
+    age_indexes(90)
+
+    write_package('bar', "    tags = ['new']\n    provides('baz')",
+                  mtime=time.time() - 60)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert repo.tag_index['new'] == ['bar']
+    shutil.rmtree(os.path.join(repo.packages_path, 'bar'))
+
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert repo.tag_index['old'] == ['foo']
+        assert repo.tag_index['new'] == []
+        assert 'baz' not in repo.provider_index
+
+    # the removed package is gone from the base, with its update file
+    cache = spack.caches.misc_cache
+    assert os.listdir(cache.cache_path('tags/editable_test_repo-updates')) \
+        == []
+    with open(cache.cache_path('tags/editable_test_repo-index.json')) as f:
+        assert 'bar' not in f.read()
+
+
+def test_index_is_rebuilt_without_base(editable_repo):
+    write_package, make_repo = editable_repo
+    write_package('foo', "    tags = ['old']", mtime=time.time() - 120)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        repo.tag_index
+    age_indexes(90)
+
+    write_package('foo', "    tags = ['new']", mtime=time.time() - 60)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        repo.tag_index
+
+    # stale update files do not survive a full rebuild
+    spack.caches.misc_cache.remove('tags/editable_test_repo-index.json')
+    write_package('foo', "    tags = ['newer']", mtime=time.time() - 30)
+    repo = make_repo()
+    with spack.repo.swap(spack.repo.RepoPath(repo)):
+        assert repo.tag_index['newer'] == ['foo']
+        assert repo.tag_index['new'] == []
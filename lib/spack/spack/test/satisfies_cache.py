@@ -0,0 +1,107 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import pytest
+
+import llnl.util.tty as tty
+
+import spack.config
+import spack.satisfies_cache
+from spack.spec import Spec
+from spack.version import VersionList
+
+
+@pytest.fixture()
+def satisfies_cache(config):
+    spack.satisfies_cache.reset()
+    with spack.config.override('config:satisfies_cache', 1000):
+        cache = spack.satisfies_cache.cache()
+    yield cache
+    spack.satisfies_cache.reset()
+
+
+def test_disabled_by_default(config):
+    spack.satisfies_cache.reset()
+    cache = spack.satisfies_cache.cache()
+    assert not cache.size
+
+    assert Spec('libelf@0.8.13').satisfies('libelf@0.8:')
+    assert cache.hits == cache.misses == 0
+    spack.satisfies_cache.reset()
+
+
+def test_versions_are_memoized(satisfies_cache):
+    assert VersionList(['1.2.3']).satisfies(VersionList(['1.2:1.4']))
+    assert VersionList(['1.2.3']).satisfies(VersionList(['1.2:1.4']))
+    assert not VersionList(['1.5']).satisfies(VersionList(['1.2:1.4']))
+    assert satisfies_cache.hits == 1
+    assert satisfies_cache.misses == 2
+
+
+def test_node_constraints_are_memoized(satisfies_cache):
+    checks = [
+        ('libelf@0.8.13 %gcc@4.5 +debug', 'libelf@0.8:'),
+        ('libelf@0.8.13 %gcc@4.5 +debug', 'libelf %gcc'),
+        ('libelf@0.8.13 %gcc@4.5 +debug', 'libelf~debug'),
+        ('libelf@0.8.13 %gcc@4.5 +debug', 'libelf arch=linux-rhel6-x86_64'),
+        ('libelf cflags="-O2"', 'libelf cflags="-O3"'),
+    ]
+    expected = [Spec(s).satisfies(o) for s, o in checks]
+    hits = satisfies_cache.hits
+    assert [Spec(s).satisfies(o) for s, o in checks] == expected
+    assert expected == [True, True, False, True, False]
+    assert satisfies_cache.hits > hits
+
+
+def test_mutated_spec_is_not_stale(satisfies_cache):
+    spec = Spec('libelf')
+    assert spec.satisfies('libelf@0.8.13')
+    assert spec.satisfies('libelf@0.8.12')
+
+    # constraining the spec in place changes its key
+    spec.constrain('libelf@0.8.13')
+    assert spec.satisfies('libelf@0.8.13')
+    assert not spec.satisfies('libelf@0.8.12')
+
+    spec.variants.constrain(Spec('libelf~debug').variants)
+    assert not spec.satisfies('libelf+debug')
+
+
+def test_cache_is_bounded(config):
+    spack.satisfies_cache.reset()
+    with spack.config.override('config:satisfies_cache', 2):
+        cache = spack.satisfies_cache.cache()
+
+    for v in ['1.0', '1.1', '1.2', '1.3', '1.4']:
+        assert VersionList([v]).satisfies(VersionList(['1:']))
+    assert len(cache) <= 2
+    assert cache.flushes == 2
+    assert len(cache._ids) <= 2 * cache.size
+    spack.satisfies_cache.reset()
+
+
+def test_concretization_is_unchanged(mock_packages, config):
+    spack.satisfies_cache.reset()
+    expected = Spec('mpileaks ^mpich').concretized()
+
+    spack.satisfies_cache.reset()
+    with spack.config.override('config:satisfies_cache', 1000):
+        cache = spack.satisfies_cache.cache()
+    spec = Spec('mpileaks ^mpich').concretized()
+    spack.satisfies_cache.reset()
+
+    assert spec.dag_hash() == expected.dag_hash()
+    assert cache.hits > 0
+
+
+def test_report(satisfies_cache, capsys):
+    Spec('libelf@0.8.13').satisfies('libelf@0.8:')
+    debug = tty.is_debug()
+    tty.set_debug(True)
+    try:
+        spack.satisfies_cache.report()
+    finally:
+        tty.set_debug(debug)
+    assert 'satisfies cache: 0 hits, 2 misses' in capsys.readouterr()[1]
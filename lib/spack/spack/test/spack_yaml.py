@@ -89,3 +89,44 @@ def test_yaml_aliases():
 
     # ensure no YAML aliases appear in syaml dumps.
     assert '*id' not in string
+
+
+@pytest.mark.parametrize('value', [
+    'x86_64', '1.0', '1', 'yes', 'off', 'null', '~', '', ' ', 'a b', 'a: b',
+    '#x', 'x#y', '- a', '@1.2', '%gcc', '!x', '*a', '[a]', '{a}', 'a,b',
+    "it's", 'tab\tx', 'nl\nx', u'\xe9', '0x1F', '1e3', '.inf', '2001-12-14',
+    '12:30:00', '+1', '/path/to/x', '?x', '|', '>', '"q"', '\\', 'long ' * 40,
+    True, False, None, 0, -5, 10 ** 20, 1.5,
+    syaml.syaml_str('1.0'), syaml.syaml_int(3)
+])
+def test_dump_flow_matches_emitter(value):
+    key = value if isinstance(value, str) else 'key'
+    for data in [
+            {'k': value},
+            {key: {'z': [value, value], 'y': [], 'x': {}}},
+            syaml.syaml_dict([('b', value), ('a', syaml.syaml_list([value]))]),
+    ]:
+        expected = syaml.dump(data, default_flow_style=True, width=2 ** 31 - 1)
+        assert syaml.dump_flow(data) == expected
+
+
+def test_dump_flow_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(syaml, '_flow_scalars', {})
+    monkeypatch.setattr(syaml, '_flow_cache_size', 2)
+
+    data = {'k': ['a', 'b', 'c', 'd', 'x' * 100]}
+    expected = syaml.dump(data, default_flow_style=True, width=2 ** 31 - 1)
+    assert syaml.dump_flow(data) == expected
+    assert syaml.dump_flow(data) == expected
+    assert len(syaml._flow_scalars) == 2
+
+    # long strings are never cached
+    monkeypatch.setattr(syaml, '_flow_scalars', {})
+    syaml.dump_flow({'k': 'x' * 100})
+    assert syaml._flow_scalars == {}
+
+
+def test_dump_flow_falls_back_on_tagged_data():
+    data = {'a': (1, 2), 'b': set([1])}
+    expected = syaml.dump(data, default_flow_style=True, width=2 ** 31 - 1)
+    assert syaml.dump_flow(data) == expected
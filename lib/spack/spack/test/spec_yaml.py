@@ -8,14 +8,19 @@
 YAML format preserves DAG information in the spec.
 
 """
+import base64
+import hashlib
 import os
+import sys
+
+import pytest
 
 from collections import Iterable, Mapping
 
 import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 from spack import repo
-from spack.spec import Spec, save_dependency_spec_yamls
+from spack.spec import Spec, save_dependency_spec_yamls, maxint
 from spack.util.spack_yaml import syaml_dict
 from spack.test.conftest import MockPackage, MockPackageMultiRepo
 
@@ -237,3 +242,34 @@ def test_save_dependency_spec_yamls_subset(tmpdir, config):
 
         assert check_specs_equal(b_spec, os.path.join(output_path, 'b.yaml'))
         assert check_specs_equal(c_spec, os.path.join(output_path, 'c.yaml'))
+
+
+def _emitter_dag_hash(spec):
+    """DAG hash computed through the YAML emitter, as Spack used to."""
+    yaml_text = syaml.dump(
+        spec.to_node_dict(), default_flow_style=True, width=maxint)
+    sha = hashlib.sha1(yaml_text.encode('utf-8'))
+    b32_hash = base64.b32encode(sha.digest()).lower()
+    if sys.version_info[0] >= 3:
+        b32_hash = b32_hash.decode('utf-8')
+    return b32_hash
+
+
+@pytest.mark.parametrize('spec_str', [
+    'mpileaks ^mpich', 'mpileaks+debug ^zmpi', 'dttop', 'externaltool',
+    'multivalue_variant foo=bar,baz', 'patch-several-dependencies',
+    'dt-diamond', 'hypre'
+])
+def test_dag_hash_unchanged_without_emitter(config, mock_packages, spec_str):
+    spec = Spec(spec_str).concretized()
+    for node in spec.traverse():
+        assert node.dag_hash() == _emitter_dag_hash(node)
+
+
+def test_dump_flow_matches_emitter_on_specs(config, mock_packages):
+    for spec_str in ['mpileaks ^mpich', 'dttop', 'hypre', 'dt-diamond']:
+        spec = Spec(spec_str).concretized()
+        for node in spec.traverse():
+            d = node.to_node_dict()
+            assert syaml.dump_flow(d) == syaml.dump(
+                d, default_flow_style=True, width=maxint)
@@ -0,0 +1,70 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Guard the startup time of some commands that have to be fast.
+
+``spack --version`` is used by scripts, and ``spack commands`` by shell
+completion. They should not pay for importing the parts of Spack (or of
+its external dependencies) that they don't use.
+"""
+import sys
+
+import pytest
+
+import spack.paths
+from spack.util.executable import Executable
+
+
+#: Runs spack like bin/spack does, then prints the time it took, without
+#: the startup of the interpreter, and the modules it imported. Command
+#: output goes to stderr.
+script = """\
+import sys
+import time
+start = time.time()
+sys.path[:0] = [{external!r}, {lib!r}]
+sys.stdout, stdout = sys.stderr, sys.stdout
+import spack.main
+spack.main.main({argv!r})
+stdout.write('%f\\n' % (time.time() - start))
+stdout.write('\\n'.join(sorted(sys.modules)))
+"""
+
+#: Commands, the time they may take in seconds (including the command
+#: itself), and modules they should never import. The times leave a lot
+#: of slack: they catch a command importing much more than it needs, not
+#: small regressions.
+commands = [
+    (['--version'], 1.0,
+     ['spack.cmd', 'spack.config', 'spack.spec', 'spack.repo',
+      'spack.environment', 'ruamel.yaml', 'jsonschema', 'jinja2']),
+    (['commands'], 3.0,
+     ['spack.spec', 'spack.repo', 'spack.store', 'spack.environment',
+      'spack.modules', 'jinja2']),
+]
+
+
+def run(argv):
+    python = Executable(sys.executable)
+    output = python('-c', script.format(
+        external=spack.paths.external_path, lib=spack.paths.lib_path,
+        argv=argv), output=str, error=str)
+    lines = output.split('\n')
+    return float(lines[0]), set(lines[1:])
+
+
+@pytest.mark.parametrize('argv,max_time,forbidden', commands)
+def test_startup_imports(argv, max_time, forbidden):
+    _, modules = run(argv)
+    assert 'spack.main' in modules
+    assert not modules.intersection(forbidden)
+
+
+@pytest.mark.maybeslow
+@pytest.mark.parametrize('argv,max_time,forbidden', commands)
+def test_startup_time(argv, max_time, forbidden):
+    # best of three, to be robust to noise on busy machines
+    times = [run(argv)[0] for _ in range(3)]
+    assert min(times) < max_time
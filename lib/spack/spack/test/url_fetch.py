@@ -3,14 +3,20 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import hashlib
 import os
+import threading
+
 import pytest
+from six.moves import BaseHTTPServer
 
 from llnl.util.filesystem import working_dir, is_exe
 
 import spack.repo
 import spack.config
 from spack.fetch_strategy import from_list_url, URLFetchStrategy
+from spack.fetch_strategy import FailedDownloadError
+from spack.stage import Stage
 from spack.spec import Spec
 from spack.version import ver
 import spack.util.crypto as crypto
@@ -135,3 +141,135 @@ def test_hash_detection(checksum_type):
 def test_unknown_hash(checksum_type):
     with pytest.raises(ValueError):
         crypto.Checker('a')
+
+
+class RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serve the files of the server's root, with range requests if the
+    server supports them. The first ``drop`` responses stop after
+    ``drop_after`` bytes of the file."""
+
+    def do_GET(self):
+        server = self.server
+        server.ranges.append(self.headers.get('Range'))
+        path = os.path.join(server.root, self.path.lstrip('/'))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        start = 0
+        requested = self.headers.get('Range')
+        if requested and server.supports_ranges:
+            start = int(requested[len('bytes='):].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/x-gzip')
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+
+        if server.drop:
+            server.drop -= 1
+            self.wfile.write(data[start:start + server.drop_after])
+            self.close_connection = True
+        else:
+            self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server(tmpdir):
+    """A local HTTP server for the files in a temporary directory."""
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+    server.root = str(tmpdir.mkdir('served'))
+    server.ranges = []
+    server.supports_ranges = True
+    server.drop = 0
+    server.drop_after = 0
+    server.url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+@pytest.fixture()
+def served_archive(http_server):
+    """An archive on the HTTP server, and its sha256."""
+    data = os.urandom(100000)
+    with open(os.path.join(http_server.root, 'archive.tar.gz'), 'wb') as f:
+        f.write(data)
+    url = http_server.url + '/archive.tar.gz'
+    return url, hashlib.sha256(data).hexdigest()
+
+
+def test_fetch_resumes_interrupted_download(
+        http_server, served_archive, tmpdir, config, monkeypatch):
+    url, digest = served_archive
+    http_server.drop = 2
+    http_server.drop_after = 30000
+
+    # The archive is hashed as it is downloaded, not read again to check it
+    def fail(*args):
+        raise AssertionError('archive was read again')
+    monkeypatch.setattr(crypto.Checker, 'check', fail)
+
+    fetcher = URLFetchStrategy(url, digest)
+    with Stage(fetcher, path=str(tmpdir.join('stage'))) as stage:
+        fetcher.fetch()
+        assert http_server.ranges == [None, 'bytes=30000-', 'bytes=60000-']
+        assert os.path.getsize(stage.archive_file) == 100000
+        assert not os.path.exists(stage.save_filename + '.part')
+        fetcher.check()
+
+
+def test_fetch_keeps_partial_download(
+        http_server, served_archive, tmpdir, mutable_config):
+    url, digest = served_archive
+    http_server.drop = 3
+    http_server.drop_after = 20000
+    spack.config.set('config:fetch_retries', 1)
+
+    fetcher = URLFetchStrategy(url, digest)
+    with Stage(fetcher, path=str(tmpdir.join('stage'))) as stage:
+        partial_file = stage.save_filename + '.part'
+        with pytest.raises(FailedDownloadError):
+            fetcher.fetch()
+        assert os.path.getsize(partial_file) == 40000
+
+        # The next fetch continues the download
+        fetcher.fetch()
+        assert http_server.ranges[2:] == ['bytes=40000-', 'bytes=60000-']
+        assert not os.path.exists(partial_file)
+        fetcher.check()
+
+
+def test_fetch_restarts_without_range_support(
+        http_server, served_archive, tmpdir, config):
+    url, digest = served_archive
+    http_server.supports_ranges = False
+
+    fetcher = URLFetchStrategy(url, digest)
+    with Stage(fetcher, path=str(tmpdir.join('stage'))) as stage:
+        with open(stage.save_filename + '.part', 'wb') as f:
+            f.write(b'stale partial download')
+        fetcher.fetch()
+        assert http_server.ranges == ['bytes=22-', None]
+        fetcher.check()
+
+
+def test_fetch_not_found(http_server, tmpdir, config):
+    fetcher = URLFetchStrategy(http_server.url + '/missing.tar.gz', 'abc')
+    with Stage(fetcher, path=str(tmpdir.join('stage'))) as stage:
+        with pytest.raises(FailedDownloadError):
+            fetcher.fetch()
+        assert not os.path.exists(stage.save_filename + '.part')
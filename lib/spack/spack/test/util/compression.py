@@ -0,0 +1,26 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import gzip
+import os
+
+import pytest
+
+from spack.util.compression import ParallelGzipWriter
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+@pytest.mark.parametrize('size', [0, 10, 100000])
+def test_parallel_gzip_writer(tmpdir, jobs, size):
+    data = os.urandom(size // 2) + b'spack' * (size // 10)
+    path = str(tmpdir.join('data.gz'))
+    with open(path, 'wb') as f:
+        with ParallelGzipWriter(f, jobs=jobs, block_size=1000) as gz:
+            for i in range(0, len(data), 777):
+                gz.write(data[i:i + 777])
+
+    # Several gzip members are read back as one stream
+    with gzip.open(path, 'rb') as f:
+        assert f.read() == data
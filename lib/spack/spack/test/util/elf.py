@@ -0,0 +1,151 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import os
+import shutil
+import struct
+
+import pytest
+
+import spack.paths
+import spack.util.elf as elf
+from spack.util.executable import which
+
+#: Binaries built by gcc on x86_64 linux, stripped, with these RPATHs
+elf_fixtures = {
+    'runpath': ['/spack/opt/spack/pkg-a/lib', '/spack/opt/spack/pkg-b/lib'],
+    'rpath': ['/spack/opt/spack/pkg-a/lib'],
+    'libfoo.so': ['/spack/opt/spack/pkg-a/lib'],
+    'no-rpath': [],
+}
+
+
+@pytest.fixture()
+def elf_fixture(tmpdir):
+    """Copy an ELF file in the test data to a temporary directory."""
+    def _copy(name):
+        path = str(tmpdir.join(name))
+        shutil.copy(
+            os.path.join(spack.paths.test_path, 'data', 'elf', name), path)
+        return path
+    return _copy
+
+
+def make_elf(path, elf_class, byte_order, rpath):
+    """Write a minimal ELF file: a loaded segment with a dynamic section
+    pointing to an RPATH in a string table."""
+    prefix = '<' if byte_order == elf.ELFDATA2LSB else '>'
+    header_fmt, phdr_fmt, dyn_fmt = elf._formats[elf_class]
+    ehsize = 16 + struct.calcsize(prefix + header_fmt + 'IHHHHHH')
+    phentsize = struct.calcsize(prefix + phdr_fmt)
+
+    strtab = b'\0libc.so.6\0' + rpath + b'\0'
+    strtab_offset = ehsize + 2 * phentsize
+    dyn_offset = strtab_offset + len(strtab)
+    dynamic = b''.join(struct.pack(prefix + dyn_fmt, tag, value) for
+                       tag, value in [(elf.DT_STRTAB, 0x1000 + strtab_offset),
+                                      (elf.DT_STRSZ, len(strtab)),
+                                      (elf.DT_RUNPATH, 11),
+                                      (elf.DT_NULL, 0)])
+    size = dyn_offset + len(dynamic)
+
+    def phdr(p_type, offset, size):
+        if elf_class == elf.ELFCLASS32:
+            return struct.pack(prefix + phdr_fmt, p_type, offset,
+                               0x1000 + offset, 0, size, size, 0, 0)
+        return struct.pack(prefix + phdr_fmt, p_type, 0, offset,
+                           0x1000 + offset, 0, size, size, 0)
+
+    with open(path, 'wb') as f:
+        f.write(elf.ELF_MAGIC + bytearray([elf_class, byte_order, 1]) +
+                b'\0' * 9)
+        f.write(struct.pack(prefix + header_fmt + 'IHHHHHH',
+                            elf.ET_DYN, 0, 1, 0, ehsize, 0,
+                            0, ehsize, phentsize, 2, 0, 0, 0))
+        f.write(phdr(elf.PT_LOAD, 0, size))
+        f.write(phdr(elf.PT_DYNAMIC, dyn_offset, len(dynamic)))
+        f.write(strtab)
+        f.write(dynamic)
+
+
+@pytest.mark.parametrize('name,rpaths', sorted(elf_fixtures.items()))
+def test_get_rpaths(elf_fixture, name, rpaths):
+    path = elf_fixture(name)
+    assert elf.is_elf(path)
+    assert elf.get_rpaths(path) == rpaths
+
+
+@pytest.mark.parametrize('name', ['rpath', 'runpath', 'libfoo.so'])
+def test_set_rpaths_in_place(elf_fixture, name):
+    path = elf_fixture(name)
+    size = os.path.getsize(path)
+
+    assert elf.set_rpaths(path, ['$ORIGIN/../lib'])
+    assert elf.get_rpaths(path) == ['$ORIGIN/../lib']
+    assert os.path.getsize(path) == size
+
+    # The current RPATH is the longest that fits
+    assert not elf.set_rpaths(path, elf_fixtures[name])
+    assert elf.get_rpaths(path) == ['$ORIGIN/../lib']
+
+    path = elf_fixture(name)
+    placeholder = ['@' * len(p) for p in elf_fixtures[name]]
+    assert elf.set_rpaths(path, placeholder)
+    assert elf.get_rpaths(path) == placeholder
+    assert not elf.set_rpaths(path, placeholder + ['/lib'])
+
+    # RUNPATHs are turned into RPATHs, like patchelf --force-rpath does
+    with open(path, 'rb') as f:
+        assert elf.ElfFile(f).rpath_tag == elf.DT_RPATH
+
+
+@pytest.mark.skipif(not which('readelf'), reason='needs readelf')
+def test_set_rpaths_readelf(elf_fixture):
+    path = elf_fixture('runpath')
+    elf.set_rpaths(path, ['/new/lib'])
+
+    readelf = which('readelf')
+    output = readelf('-d', path, output=str)
+    assert 'Library rpath: [/new/lib]' in output
+    assert 'RUNPATH' not in output
+
+
+def test_no_rpath(elf_fixture):
+    path = elf_fixture('no-rpath')
+    assert not elf.set_rpaths(path, ['/lib'])
+    assert elf.get_rpaths(path) == []
+
+
+@pytest.mark.parametrize('elf_class', [elf.ELFCLASS32, elf.ELFCLASS64])
+@pytest.mark.parametrize('byte_order', [elf.ELFDATA2LSB, elf.ELFDATA2MSB])
+def test_elf_classes_and_byte_orders(tmpdir, elf_class, byte_order):
+    path = str(tmpdir.join('lib.so'))
+    make_elf(path, elf_class, byte_order, b'/spack/a:/spack/b')
+
+    assert elf.mime_subtype(path) == 'x-sharedlib'
+    assert elf.get_rpaths(path) == ['/spack/a', '/spack/b']
+    assert elf.set_rpaths(path, ['/a'])
+    assert elf.get_rpaths(path) == ['/a']
+
+
+def test_mime_subtype(elf_fixture, tmpdir):
+    assert elf.mime_subtype(elf_fixture('rpath')) == 'x-executable'
+    assert elf.mime_subtype(elf_fixture('libfoo.so')) == 'x-sharedlib'
+
+    text = tmpdir.join('text')
+    text.write('#!/bin/sh\n')
+    assert elf.mime_subtype(str(text)) is None
+    assert not elf.is_elf(str(text))
+
+
+def test_not_elf(tmpdir):
+    path = tmpdir.join('truncated')
+    path.write(elf.ELF_MAGIC + b'\x02\x01', mode='wb')
+    with pytest.raises(elf.ElfParsingError):
+        elf.get_rpaths(str(path))
+
+    path.write(b'not an ELF file', mode='wb')
+    with pytest.raises(elf.ElfParsingError):
+        elf.get_rpaths(str(path))
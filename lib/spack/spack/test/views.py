@@ -4,7 +4,15 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import os
+import shutil
 
+import pytest
+
+from llnl.util.filesystem import traverse_tree
+
+import spack.filesystem_view
+import spack.store
+from spack.filesystem_view import ViewManifest, YamlFilesystemView
 from spack.spec import Spec
 
 
@@ -27,3 +35,208 @@ def test_global_activation(install_mockery, mock_fetch):
         extendee_spec.prefix, '.spack', 'extensions.yaml')
     assert (view.extensions_layout.extension_file_path(extendee_spec) ==
             expected_path)
+
+
+@pytest.fixture()
+def libdwarf_view(tmpdir, install_mockery, mock_fetch):
+    """A view with libdwarf and its dependencies."""
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install()
+    view = YamlFilesystemView(str(tmpdir.join('view')), spack.store.layout)
+    view.add_specs(spec)
+    yield spec, view
+    spec.package.do_uninstall(force=True)
+    spec['libelf'].package.do_uninstall(force=True)
+
+
+def view_files(view):
+    """Files and links in view, outside of its metadata."""
+    files = set()
+    for root, dirs, names in os.walk(view._root):
+        dirs[:] = [d for d in dirs if d != '.spack']
+        files.update(os.path.relpath(os.path.join(root, n), view._root)
+                     for n in names)
+    return files
+
+
+def test_view_manifest(libdwarf_view, monkeypatch):
+    spec, view = libdwarf_view
+    files = view_files(view)
+    assert files
+
+    manifest = ViewManifest(view._root)
+    assert sorted(s.name for s in manifest.specs()) == ['libdwarf', 'libelf']
+    recorded = set()
+    for s in spec.traverse():
+        entry = manifest.entry(s.dag_hash())
+        assert entry['meta'] == '.spack/%s' % s.name
+        for rel, src in entry['files'].items():
+            assert os.readlink(os.path.join(view._root, rel)) == src
+        recorded.update(entry['files'])
+    assert recorded == files
+
+    # Removing a spec does not walk its prefix, nor the view
+    def fail(*args, **kwargs):
+        raise AssertionError('the file tree was walked')
+    monkeypatch.setattr(spack.filesystem_view, 'traverse_tree', fail)
+    monkeypatch.setattr(spack.filesystem_view.LinkTree, 'get_file_map', fail)
+    monkeypatch.setattr(os, 'walk', fail)
+
+    view.remove_specs(spec['libdwarf'])
+    assert [s.name for s in view.get_all_specs()] == ['libelf']
+    monkeypatch.undo()
+    assert view_files(view) == set(
+        manifest.entry(spec['libelf'].dag_hash())['files'])
+
+    view.remove_specs(spec['libelf'])
+    assert not view.get_all_specs()
+    assert not view_files(view)
+    assert os.listdir(view._root) == ['.spack']
+
+
+def test_view_manifest_from_existing_view(libdwarf_view):
+    spec, view = libdwarf_view
+    manifest_path = os.path.join(view._root, '.spack', 'manifest')
+    entries = dict((s.name, ViewManifest(view._root).entry(s.dag_hash()))
+                   for s in spec.traverse())
+
+    # A view made before views had a manifest gets one when it is read
+    shutil.rmtree(manifest_path)
+    view = YamlFilesystemView(view._root, spack.store.layout)
+    assert os.path.exists(os.path.join(manifest_path, 'index.json'))
+    assert set(view.get_all_specs()) == set(spec.traverse())
+    for s in spec.traverse():
+        entry = view.manifest.entry(s.dag_hash())
+        assert entry['files'] == entries[s.name]['files']
+        assert entry['meta'] == entries[s.name]['meta']
+
+    view.remove_specs(*spec.traverse())
+    assert os.listdir(view._root) == ['.spack']
+
+
+def test_view_manifest_interrupted(libdwarf_view):
+    spec, view = libdwarf_view
+    index_path = os.path.join(view._root, '.spack', 'manifest', 'index.json')
+    with open(index_path) as f:
+        index = f.read()
+
+    # The index was not saved after libdwarf was removed
+    view.remove_specs(spec)
+    with open(index_path, 'w') as f:
+        f.write(index)
+    view = YamlFilesystemView(view._root, spack.store.layout)
+    assert [s.name for s in view.get_all_specs()] == ['libelf']
+
+
+def test_view_clean_manifest(libdwarf_view):
+    spec, view = libdwarf_view
+    libdwarf_files = set(view.manifest.entry(spec.dag_hash())['files'])
+
+    # The prefix of libdwarf is gone: its links are broken
+    spec.package.do_uninstall(force=True)
+    view.clean()
+    assert [s.name for s in view.get_all_specs()] == ['libelf']
+    assert not view_files(view) & libdwarf_files
+    assert not os.path.exists(os.path.join(view._root, '.spack', 'libdwarf'))
+
+    spec.package.do_install()
+
+
+def test_view_clean_files_removed_from_prefix(libdwarf_view):
+    spec, view = libdwarf_view
+    files = view.manifest.entry(spec.dag_hash())['files']
+    rel, src = sorted(files.items())[0]
+
+    # The prefix is still there, but one of its files is gone
+    os.remove(src)
+    view.clean()
+    assert not os.path.lexists(os.path.join(view._root, rel))
+    assert rel not in view.manifest.entry(spec.dag_hash())['files']
+    assert set(view.get_all_specs()) == set(spec.traverse())
+
+
+def test_scan_tree(mock_archive):
+    source = mock_archive.path
+    ignore = lambda f: f.startswith('configure')  # noqa: E731
+    dirs, files = spack.filesystem_view.scan_tree(source, ignore)
+
+    walked_dirs, walked_files = [], []
+    for src, _ in traverse_tree(source, source, ignore=ignore):
+        rel = os.path.relpath(src, source)
+        if os.path.isdir(src):
+            walked_dirs.append('' if rel == '.' else rel)
+        else:
+            walked_files.append(rel)
+    assert sorted(dirs) == sorted(walked_dirs)
+    assert sorted(files) == sorted(walked_files)
+
+
+def test_add_specs_in_parallel(tmpdir, install_mockery, mock_fetch):
+    spec = Spec('mpileaks').concretized()
+    spec.package.do_install(fake=True)
+
+    views = {}
+    for jobs in (1, 4):
+        view = YamlFilesystemView(str(tmpdir.join('view%d' % jobs)),
+                                  spack.store.layout, ignore_conflicts=True)
+        view.add_specs(spec, jobs=jobs)
+        views[jobs] = view
+
+    serial, parallel = views[1], views[4]
+    assert view_files(parallel) == view_files(serial)
+    assert set(parallel.get_all_specs()) == set(spec.traverse())
+    for s in spec.traverse():
+        assert parallel.check_added(s)
+        serial_entry = serial.manifest.entry(s.dag_hash())
+        parallel_entry = parallel.manifest.entry(s.dag_hash())
+        assert parallel_entry['files'] == serial_entry['files']
+        assert parallel_entry['dirs'] == serial_entry['dirs']
+
+    parallel.remove_specs(*spec.traverse())
+    assert os.listdir(parallel._root) == ['.spack']
+
+    for s in spec.traverse():
+        s.package.do_uninstall(force=True)
+
+
+@pytest.mark.parametrize('link_type', ['hardlink', 'copy'])
+def test_view_clean_link_type(tmpdir, install_mockery, mock_fetch,
+                              link_type):
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install()
+    view = YamlFilesystemView(str(tmpdir.join('view')), spack.store.layout,
+                              link_type=link_type)
+    view.add_specs(spec)
+    libdwarf_files = set(view.manifest.entry(spec.dag_hash())['files'])
+    libelf_files = set(view.manifest.entry(spec['libelf'].dag_hash())['files'])
+    assert not any(os.path.islink(os.path.join(view._root, f))
+                   for f in libdwarf_files)
+
+    # Files that are not links are removed with their spec all the same
+    spec.package.do_uninstall(force=True)
+    view.clean()
+    assert view_files(view) == libelf_files
+
+    spec['libelf'].package.do_uninstall(force=True)
+
+
+def test_remove_file_compares_content(tmpdir, config):
+    view = YamlFilesystemView(str(tmpdir.mkdir('view')), spack.store.layout)
+    src = tmpdir.join('src')
+    src.write('content')
+    linked = tmpdir.join('view', 'linked')
+    os.link(str(src), str(linked))
+    copied = tmpdir.join('view', 'copied')
+    copied.write('content')
+
+    # a file that only looks the same is left alone
+    other = tmpdir.join('view', 'other')
+    other.write('CONTENT')
+    mtime = os.stat(str(src)).st_mtime
+    os.utime(str(other), (mtime, mtime))
+
+    for f in (linked, copied, other):
+        view.remove_file(str(src), str(f))
+    assert not linked.check()
+    assert not copied.check()
+    assert other.check()
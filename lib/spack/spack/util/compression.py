@@ -5,6 +5,10 @@
 
 import re
 import os
+import collections
+import multiprocessing
+import multiprocessing.pool
+import zlib
 from itertools import product
 from spack.util.executable import which
 
@@ -60,3 +64,86 @@ def extension(path):
         if re.search(suffix, path):
             return t
     return None
+
+
+def _gzip_member(data, level):
+    """Compress data to a complete gzip member (header, data, trailer)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object that gzips its data with several threads.
+
+    Data is cut in blocks that are compressed independently, and written
+    to ``fileobj`` as consecutive gzip members.  ``gzip``, ``tar`` and
+    Python's ``gzip`` module read these as a single stream.  zlib releases
+    the GIL while it compresses, so the threads do run in parallel.
+
+    Use it as a context manager, or call ``close()`` when done; this does
+    not close ``fileobj``.
+    """
+
+    def __init__(self, fileobj, jobs=None, level=6, block_size=1 << 20):
+        self.fileobj = fileobj
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.level = level
+        self.block_size = block_size
+
+        self._buffer = []
+        self._buffered = 0
+        self._members = 0
+        self._pending = collections.deque()
+        self._pool = None
+        if self.jobs > 1:
+            self._pool = multiprocessing.pool.ThreadPool(self.jobs)
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered < self.block_size:
+            return
+
+        data = b''.join(self._buffer)
+        end = len(data) - len(data) % self.block_size
+        for start in range(0, end, self.block_size):
+            self._compress(data[start:start + self.block_size])
+        self._buffer = [data[end:]]
+        self._buffered = len(data) - end
+
+    def _compress(self, block):
+        self._members += 1
+
+        if self._pool is None:
+            self.fileobj.write(_gzip_member(block, self.level))
+            return
+
+        self._pending.append(
+            self._pool.apply_async(_gzip_member, (block, self.level)))
+
+        # Don't keep more than a few blocks per thread in memory
+        while len(self._pending) > 2 * self.jobs:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def close(self):
+        # An empty input still needs one (empty) gzip member
+        if self._buffered or not self._members:
+            self._compress(b''.join(self._buffer))
+            self._buffer, self._buffered = [], 0
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().get())
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,224 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Read and rewrite the RPATH of ELF files without external tools.
+
+Only what relocation needs is supported: finding the ``DT_RPATH`` or
+``DT_RUNPATH`` entry of the dynamic section, and overwriting its string in
+place.  A longer RPATH needs the dynamic string table to grow, which is
+left to ``patchelf``.
+"""
+import struct
+import sys
+
+from spack.error import SpackError
+
+ELF_MAGIC = b'\x7fELF'
+
+# e_ident[EI_CLASS] and e_ident[EI_DATA]
+ELFCLASS32, ELFCLASS64 = 1, 2
+ELFDATA2LSB, ELFDATA2MSB = 1, 2
+
+# e_type
+ET_REL, ET_EXEC, ET_DYN, ET_CORE = 1, 2, 3, 4
+
+# p_type
+PT_LOAD, PT_DYNAMIC = 1, 2
+
+# d_tag
+DT_NULL, DT_STRTAB, DT_STRSZ, DT_RPATH, DT_RUNPATH = 0, 5, 10, 15, 29
+
+#: Mime subtypes that ``file --mime-type`` gives to each ELF type
+mime_subtypes = {
+    ET_REL: 'x-object',
+    ET_EXEC: 'x-executable',
+    ET_DYN: 'x-sharedlib',
+    ET_CORE: 'x-coredump',
+}
+
+#: struct formats of the parts of ELF files we read, per ELF class:
+#: (e_type .. e_shoff in the header, a program header, a dynamic entry)
+_formats = {
+    ELFCLASS32: ('HHIIII', 'IIIIIIII', 'iI'),
+    ELFCLASS64: ('HHIQQQ', 'IIQQQQQQ', 'qQ'),
+}
+
+
+class ElfParsingError(SpackError):
+    """Raised when a file is not an ELF file we can read."""
+
+
+def is_elf(path):
+    """Whether the file at path starts with the ELF magic bytes."""
+    with open(path, 'rb') as f:
+        return f.read(4) == ELF_MAGIC
+
+
+class ElfFile(object):
+    """What relocation needs to know about an ELF file.
+
+    Attributes:
+        elf_type (int): the ``e_type`` of the file (e.g. ``ET_DYN``)
+        rpath (bytes or None): value of the RPATH or RUNPATH, if any
+        rpath_offset (int): offset of the RPATH string in the file
+        rpath_tag_offset (int): offset of the tag of the RPATH entry
+        rpath_tag (int): ``DT_RPATH`` or ``DT_RUNPATH``
+    """
+
+    def __init__(self, f):
+        """Read the ELF file open in binary mode as ``f``."""
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+            raise ElfParsingError('Not an ELF file')
+
+        elf_class, byte_order = bytearray(ident[4:6])
+        if elf_class not in _formats or \
+                byte_order not in (ELFDATA2LSB, ELFDATA2MSB):
+            raise ElfParsingError('Unknown ELF class or byte order')
+        self.elf_class = elf_class
+        self._prefix = '<' if byte_order == ELFDATA2LSB else '>'
+        header_fmt, phdr_fmt, dyn_fmt = _formats[elf_class]
+
+        (self.elf_type, _, _, _, phoff, _) = self._read(f, header_fmt)
+        # e_flags, e_ehsize, e_phentsize, e_phnum
+        _, _, phentsize, phnum = self._read(f, 'IHHH')
+
+        # program headers, as (p_type, p_offset, p_vaddr, p_filesz)
+        segments = []
+        for i in range(phnum):
+            f.seek(phoff + i * phentsize)
+            phdr = self._read(f, phdr_fmt)
+            if elf_class == ELFCLASS32:
+                p_type, p_offset, p_vaddr, _, p_filesz = phdr[:5]
+            else:
+                p_type, _, p_offset, p_vaddr, _, p_filesz = phdr[:6]
+            segments.append((p_type, p_offset, p_vaddr, p_filesz))
+
+        self.rpath = None
+        self.rpath_offset = None
+        self.rpath_tag = None
+        self.rpath_tag_offset = None
+
+        dynamic = [s for s in segments if s[0] == PT_DYNAMIC]
+        if not dynamic:
+            return
+
+        # dynamic entries we need
+        _, dyn_offset, _, dyn_size = dynamic[0]
+        dyn_entsize = struct.calcsize(self._prefix + dyn_fmt)
+        strtab = strsz = None
+        rpath = None
+        f.seek(dyn_offset)
+        for i in range(dyn_size // dyn_entsize):
+            tag, value = self._read(f, dyn_fmt)
+            if tag == DT_NULL:
+                break
+            elif tag == DT_STRTAB:
+                strtab = value
+            elif tag == DT_STRSZ:
+                strsz = value
+            elif tag in (DT_RPATH, DT_RUNPATH) and rpath is None:
+                rpath = value
+                self.rpath_tag = tag
+                self.rpath_tag_offset = dyn_offset + i * dyn_entsize
+
+        if rpath is None:
+            return
+        if strtab is None or strsz is None or rpath >= strsz:
+            raise ElfParsingError('RPATH is not in the string table')
+
+        # the string table is given as an address: find it in the file
+        for p_type, p_offset, p_vaddr, p_filesz in segments:
+            if p_type == PT_LOAD and p_vaddr <= strtab < p_vaddr + p_filesz:
+                self.rpath_offset = strtab - p_vaddr + p_offset + rpath
+                break
+        else:
+            raise ElfParsingError('String table is not in a loaded segment')
+
+        f.seek(self.rpath_offset)
+        self.rpath = _read_string(f)
+
+    def _read(self, f, fmt):
+        fmt = self._prefix + fmt
+        data = f.read(struct.calcsize(fmt))
+        if len(data) < struct.calcsize(fmt):
+            raise ElfParsingError('Truncated ELF file')
+        return struct.unpack(fmt, data)
+
+
+def _read_string(f, block_size=256):
+    """Read a NUL-terminated string at the current position of f."""
+    chunks = []
+    while True:
+        block = f.read(block_size)
+        if not block:
+            raise ElfParsingError('Unterminated string')
+        end = block.find(b'\0')
+        if end >= 0:
+            chunks.append(block[:end])
+            return b''.join(chunks)
+        chunks.append(block)
+
+
+def get_rpaths(path):
+    """Directories in the RPATH (or RUNPATH) of an ELF file.
+
+    Returns:
+        (list): the directories, or an empty list if there is no RPATH
+
+    Raises:
+        ElfParsingError: if path is not an ELF file that can be read
+    """
+    with open(path, 'rb') as f:
+        rpath = ElfFile(f).rpath
+    if not rpath:
+        return []
+    if sys.version_info[0] >= 3:
+        rpath = rpath.decode('utf-8')
+    return rpath.split(':')
+
+
+def set_rpaths(path, rpaths):
+    """Replace the RPATH of an ELF file in place, if the new one fits.
+
+    Like ``patchelf --force-rpath``, this turns a ``DT_RUNPATH`` entry
+    into a ``DT_RPATH`` one.
+
+    Returns:
+        (bool): whether the RPATH was replaced; it is not when the file
+            has no RPATH, or when the new one is longer than the old one
+
+    Raises:
+        ElfParsingError: if path is not an ELF file that can be read
+    """
+    new_rpath = ':'.join(rpaths).encode('utf-8')
+    with open(path, 'rb+') as f:
+        elf = ElfFile(f)
+        if elf.rpath is None or len(new_rpath) > len(elf.rpath):
+            return False
+
+        f.seek(elf.rpath_offset)
+        f.write(new_rpath + b'\0' * (len(elf.rpath) - len(new_rpath)))
+        if elf.rpath_tag == DT_RUNPATH:
+            tag_fmt = elf._prefix + _formats[elf.elf_class][2][0]
+            f.seek(elf.rpath_tag_offset)
+            f.write(struct.pack(tag_fmt, DT_RPATH))
+    return True
+
+
+def mime_subtype(path):
+    """The subtype that ``file --mime-type`` gives to an ELF file.
+
+    Returns:
+        (str): e.g. ``x-sharedlib``, or None if path is not an ELF file
+    """
+    with open(path, 'rb') as f:
+        ident = f.read(18)
+    if len(ident) < 18 or ident[:4] != ELF_MAGIC:
+        return None
+    byte_order = bytearray(ident[5:6])[0]
+    elf_type, = struct.unpack(
+        '<H' if byte_order == ELFDATA2LSB else '>H', ident[16:18])
+    return mime_subtypes.get(elf_type)
@@ -11,7 +11,13 @@
 - ``Our load methods use ``OrderedDict`` class instead of YAML's
   default unorderd dict.
 
+- ``dump_flow()`` renders data in YAML flow style, byte for byte like
+  ``dump(..., default_flow_style=True)``, without going through the
+  YAML emitter. This is what Spack hashes specs with.
+
 """
+import ctypes
+
 from ordereddict_backport import OrderedDict
 from six import string_types, StringIO
 
@@ -359,6 +365,134 @@ def dump_annotated(data, stream=None, *args, **kwargs):
         return getvalue()
 
 
+#: Width that never wraps lines (the largest C int, as in spack.spec)
+_no_wrap_width = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
+
+#: (type, value) -> flow style representation of a scalar
+_flow_scalars = {}
+
+#: (type, key) -> flow style representation of a mapping key
+_flow_keys = {}
+
+#: Most entries kept in each of the caches above; once full, new values
+#: are rendered by the emitter every time
+_flow_cache_size = 4096
+
+#: Longest string cached: longer ones (paths, flags...) rarely repeat
+_flow_cache_max_length = 64
+
+
+def _flow_cache(cache, value, rep):
+    """Remember rep for value in cache, if it is small enough."""
+    if len(cache) >= _flow_cache_size:
+        return
+    if isinstance(value, string_types) and \
+            len(value) > _flow_cache_max_length:
+        return
+    cache[type(value), value] = rep
+
+
+class _NoFastFlowDump(Exception):
+    """Raised when ``dump_flow()`` must fall back to the YAML emitter."""
+
+
+def _flow_dump_with_emitter(data):
+    return dump(data, default_flow_style=True, width=_no_wrap_width)
+
+
+def _flow_scalar(value):
+    """Representation of a scalar inside a flow collection.
+
+    Whether a scalar needs quotes, and which ones, is decided by the
+    emitter. Asking it once per distinct value and caching the answer
+    keeps the output identical while avoiding the emitter on the hot
+    path, since specs are made of few distinct scalars.
+    """
+    try:
+        return _flow_scalars[type(value), value]
+    except KeyError:
+        text = _flow_dump_with_emitter([value])
+        if not (text.startswith('[') and text.endswith(']\n')):
+            raise _NoFastFlowDump()
+        rep = text[1:-2]
+        if '\n' in rep:
+            raise _NoFastFlowDump()
+        _flow_cache(_flow_scalars, value, rep)
+        return rep
+    except TypeError:
+        # unhashable scalar-like object
+        raise _NoFastFlowDump()
+
+
+def _flow_key(key):
+    """Representation of a key inside a flow mapping."""
+    try:
+        return _flow_keys[type(key), key]
+    except KeyError:
+        text = _flow_dump_with_emitter({key: None})
+        if not (text.startswith('{') and text.endswith(': null}\n')):
+            raise _NoFastFlowDump()
+        rep = text[1:-len(': null}\n')]
+        if '\n' in rep:
+            raise _NoFastFlowDump()
+        _flow_cache(_flow_keys, key, rep)
+        return rep
+    except TypeError:
+        raise _NoFastFlowDump()
+
+
+def _flow_write(data, out):
+    """Append the flow style representation of data to the list out."""
+    if isinstance(data, syaml_dict) or type(data) is dict:
+        items = list(data.items())
+        if not isinstance(data, syaml_dict):
+            items.sort()
+        out.append('{')
+        for i, (key, value) in enumerate(items):
+            if i:
+                out.append(', ')
+            out.append(_flow_key(key))
+            out.append(': ')
+            _flow_write(value, out)
+        out.append('}')
+
+    elif isinstance(data, syaml_list) or type(data) is list:
+        out.append('[')
+        for i, value in enumerate(data):
+            if i:
+                out.append(', ')
+            _flow_write(value, out)
+        out.append(']')
+
+    elif isinstance(data, (dict, list, tuple, set)):
+        # other containers get tagged by the emitter
+        raise _NoFastFlowDump()
+
+    else:
+        out.append(_flow_scalar(data))
+
+
+def dump_flow(data):
+    """Render a mapping in flow style on a single line.
+
+    The result is identical to ``dump(data, default_flow_style=True,
+    width=<largest int>)``, but is computed without the YAML emitter
+    whenever data only contains dicts, lists and scalars. Anything else
+    goes through the emitter.
+    """
+    if not (isinstance(data, syaml_dict) or type(data) is dict):
+        return _flow_dump_with_emitter(data)
+
+    out = []
+    try:
+        _flow_write(data, out)
+    except _NoFastFlowDump:
+        return _flow_dump_with_emitter(data)
+
+    out.append('\n')
+    return ''.join(out)
+
+
 class SpackYAMLError(spack.error.SpackError):
     """Raised when there are issues with YAML parsing."""
     def __init__(self, msg, yaml_error):
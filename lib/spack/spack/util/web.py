@@ -13,7 +13,7 @@ import traceback
 import hashlib
 
 from six.moves.urllib.request import urlopen, Request
-from six.moves.urllib.error import URLError
+from six.moves.urllib.error import URLError, HTTPError
 from six.moves.urllib.parse import urljoin
 import multiprocessing.pool
 
@@ -86,7 +86,8 @@ else:
             super(NonDaemonPool, self).__init__(*args, **kwargs)
 
 
-def _read_from_url(url, accept_content_type=None):
+def _ssl_context():
+    """SSL context for urlopen, or None if Python can't verify certs."""
     context = None
     verify_ssl = spack.config.get('config:verify_ssl')
     pyver = sys.version_info
@@ -101,7 +102,11 @@ def _read_from_url(url, accept_content_type=None):
         context = ssl.create_default_context()
     else:
         context = ssl._create_unverified_context()
+    return context
+
 
+def _read_from_url(url, accept_content_type=None):
+    context = _ssl_context()
     req = Request(url)
 
     if accept_content_type:
@@ -138,6 +143,42 @@ def read_from_url(url, accept_content_type=None):
     return contents
 
 
+def open_url(url):
+    """Open a URL for reading, and return the response as a binary file
+    object."""
+    return _urlopen(Request(url), timeout=_timeout, context=_ssl_context())
+
+
+def read_from_url_if_modified(url, etag=None, last_modified=None):
+    """Read a URL, unless it did not change since it was last read.
+
+    The ``etag`` and ``last_modified`` values returned by a previous call
+    are sent as ``If-None-Match`` and ``If-Modified-Since`` headers, so
+    that the server can skip sending the contents again.
+
+    Returns:
+        None if the server answered that the page is not modified, or a
+        tuple ``(contents, etag, last_modified)`` where the last two are
+        the validators to pass on the next call (or None).
+    """
+    req = Request(url)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    if last_modified:
+        req.add_header('If-Modified-Since', last_modified)
+
+    try:
+        response = _urlopen(req, timeout=_timeout, context=_ssl_context())
+    except HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+
+    contents = response.read().decode('utf-8')
+    headers = response.info()
+    return (contents, headers.get('ETag'), headers.get('Last-Modified'))
+
+
 def _spider(url, visited, root, depth, max_depth, raise_on_error):
     """Fetches URL and any pages it links to up to max_depth.
 
@@ -30,6 +30,7 @@ from bisect import bisect_left
 from functools import wraps
 from six import string_types
 
+import spack.satisfies_cache
 from spack.util.spack_yaml import syaml_dict
 
 
@@ -718,6 +719,11 @@ class VersionList(object):
            If strict is specified, this version list must lie entirely
            *within* the other in order to satisfy it.
         """
+        return spack.satisfies_cache.cached_satisfies(
+            VersionList._satisfies, spack.satisfies_cache.version_list_key,
+            self, other, strict)
+
+    def _satisfies(self, other, strict):
         if not other or not self:
             return False
 
@@ -174,7 +174,8 @@ function _spack_buildcache_create {
     if $list_options
     then
         compgen -W "-h --help -r --rel -f --force -u --unsigned -a --allow-root
-                    -k --key -d --directory" -- "$cur"
+                    -k --key -d --directory -j --jobs
+                    --content-addressed" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -184,7 +185,7 @@ function _spack_buildcache_install {
     if $list_options
     then
         compgen -W "-h --help -f --force -m --multiple -a --allow-root -u
-                    --unsigned" -- "$cur"
+                    --unsigned -j --jobs --hardlink" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -300,7 +301,7 @@ function _spack_compilers {
 }
 
 function _spack_concretize {
-    compgen -W "-h --help -f --force" -- "$cur"
+    compgen -W "-h --help -f --force -j --jobs" -- "$cur"
 }
 
 function _spack_config {
@@ -511,7 +512,7 @@ function _spack_fetch {
     if $list_options
     then
         compgen -W "-h --help -n --no-checksum -m --missing
-                    -D --dependencies" -- "$cur"
+                    -D --dependencies -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -634,7 +635,7 @@ function _spack_install {
     if $list_options
     then
         compgen -W "-h --help --only -j --jobs -I --install-status
-                    --overwrite --keep-prefix --keep-stage --dont-restage
+                    --install-jobs --overwrite --keep-prefix --keep-stage --dont-restage
                     --use-cache --no-cache --show-log-on-error --source
                     -n --no-checksum -v --verbose --fake --only-concrete
                     -f --file --clean --dirty --test --log-format --log-file
@@ -719,7 +720,8 @@ function _spack_mirror_create {
     if $list_options
     then
         compgen -W "-h --help -d --directory -f --file
-                    -D --dependencies -n --versions-per-spec" -- "$cur"
+                    -D --dependencies -n --versions-per-spec
+                    -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi
@@ -785,7 +787,7 @@ function _spack_module_tcl_loads {
 function _spack_module_tcl_refresh {
     if $list_options
     then
-        compgen -W "-h --help --delete-tree -y --yes-to-all" -- "$cur"
+        compgen -W "-h --help --delete-tree -y --yes-to-all -j --jobs" -- "$cur"
     else
         compgen -W "$(_installed_packages)" -- "$cur"
     fi
@@ -833,7 +835,7 @@ function _spack_module_dotkit_loads {
 function _spack_module_dotkit_refresh {
     if $list_options
     then
-        compgen -W "-h --help --delete-tree -y --yes-to-all" -- "$cur"
+        compgen -W "-h --help --delete-tree -y --yes-to-all -j --jobs" -- "$cur"
     else
         compgen -W "$(_installed_packages)" -- "$cur"
     fi
@@ -881,7 +883,7 @@ function _spack_module_lmod_loads {
 function _spack_module_lmod_refresh {
     if $list_options
     then
-        compgen -W "-h --help --delete-tree -y --yes-to-all" -- "$cur"
+        compgen -W "-h --help --delete-tree -y --yes-to-all -j --jobs" -- "$cur"
     else
         compgen -W "$(_installed_packages)" -- "$cur"
     fi
@@ -1193,8 +1195,8 @@ function _spack_view {
         compgen -W "-h --help -v --verbose -e --exclude
                     -d --dependencies" -- "$cur"
     else
-        compgen -W "add check hard hardlink remove rm soft
-                    statlink status symlink" -- "$cur"
+        compgen -W "add check copy hard hardlink reflink remove rm
+                    soft statlink status symlink" -- "$cur"
     fi
 }
 
@@ -1208,6 +1210,14 @@ function _spack_view_check {
     _spack_view_statlink
 }
 
+function _spack_view_copy {
+    if $list_options
+    then
+        compgen -W "-h --help --projection-file
+                    -i --ignore-conflicts" -- "$cur"
+    fi
+}
+
 function _spack_view_hard {
     # Alias for `spack view hardlink`
     _spack_view_hardlink
@@ -1220,6 +1230,11 @@ function _spack_view_hardlink {
     fi
 }
 
+function _spack_view_reflink {
+    # Alias for `spack view copy`
+    _spack_view_copy
+}
+
 function _spack_view_remove {
     if $list_options
     then